@@ -0,0 +1,145 @@
+"""Picks each camera's detection scale and recognition rate from measurements.
+
+A fixed scale and rate are only right for the machine they were tuned
+on. After every recognition pass the scheduler updates its estimate of
+what a pass costs on this machine and re-decides, per camera:
+
+- scale: just fine enough that the smallest face currently in view is
+  still `min_face_px` wide at detection scale (coarser when faces are
+  large and close, finer when they are small), `search_scale` while no
+  face is in view, and never so fine that a pass would exceed
+  `target_latency`;
+- rate (the camera's max_fps in the RecognitionPool): `target_fps`, or
+  the feed's own max_fps if lower, or less still if recognising that
+  often would keep the workers busy more than `max_busy` of the time.
+  dlib holds the GIL while it runs, so that headroom is what keeps
+  capture and display smooth.
+
+A pass costs roughly area, i.e. cost_per_unit_area * scale^2, which is
+the model used to predict the latency of a scale before trying it.
+"""
+import math
+import threading
+
+
+SCALE_STEP = 0.05     # scales are rounded to this, so tiny changes don't flap
+MIN_FPS = 0.5         # never recognise a camera less often than this
+
+
+class Decision:
+    """What the scheduler last chose for one camera, and why"""
+
+    __slots__ = ("scale", "max_fps", "latency", "face_px", "reason")
+
+    def __init__(self, scale, max_fps, latency=0.0, face_px=None, reason="start"):
+        self.scale = scale
+        self.max_fps = max_fps
+        self.latency = latency    # predicted seconds per pass at `scale`
+        self.face_px = face_px    # smallest face width in full-frame pixels
+        self.reason = reason
+
+    def __repr__(self):
+        return (f"Decision(scale={self.scale:.2f}, max_fps={self.max_fps:.1f}, "
+                f"latency={self.latency * 1000:.0f}ms, reason={self.reason!r})")
+
+
+class AdaptiveScheduler:
+    """Re-decides scale and max_fps of RecognitionPool feeds after each pass"""
+
+    def __init__(self, target_latency=0.15, target_fps=8.0, max_busy=0.7,
+                 min_face_px=80, min_scale=0.25, max_scale=1.0, search_scale=0.5,
+                 smoothing=0.2, verbose=False, metrics=None):
+        self.target_latency = target_latency
+        self.target_fps = target_fps
+        self.max_busy = max_busy
+        self.min_face_px = min_face_px
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.search_scale = search_scale
+        self.smoothing = smoothing
+        self.verbose = verbose
+        self.metrics = metrics
+        self.workers = 1
+        self.lock = threading.Lock()
+        self.feeds = []
+        self._decisions = {}
+        self._cost = {}   # seconds per pass per unit scale^2, per camera
+        self._target_fps = {}
+
+    def attach(self, feeds, workers=1):
+        """Start every feed at the search scale and the target rate; a
+        max_fps already set on a feed stays an upper limit"""
+        self.feeds = list(feeds)
+        self.workers = max(1, workers)
+        for feed in self.feeds:
+            target = self.target_fps
+            if feed.max_fps:
+                target = min(target, feed.max_fps)
+            self._target_fps[feed.name] = target
+            self._apply(feed, Decision(self._round(self.search_scale), target))
+
+    def _round(self, scale):
+        scale = round(scale / SCALE_STEP) * SCALE_STEP
+        return min(self.max_scale, max(self.min_scale, scale))
+
+    def _apply(self, feed, decision):
+        feed.recognizer.resize_scale = decision.scale
+        feed.max_fps = decision.max_fps
+        with self.lock:
+            previous = self._decisions.get(feed.name)
+            self._decisions[feed.name] = decision
+        changed = previous is None or (previous.scale, previous.reason) != \
+            (decision.scale, decision.reason)
+        if changed and previous is not None:
+            if self.metrics is not None:
+                self.metrics.count("scheduler_changes")
+            if self.verbose:
+                print(f"[SCHED] {feed.name}: {decision}")
+
+    def observe(self, feed, duration, detections):
+        """Re-decide `feed` after a pass that took `duration` seconds at
+        the feed's current scale and found `detections`"""
+        recognizer = feed.recognizer
+        scale = recognizer.resize_scale
+        # Passes the motion gate skipped say nothing about detection cost
+        if not getattr(recognizer, "last_pass_skipped", False) and duration > 0:
+            sample = duration / (scale * scale)
+            previous = self._cost.get(feed.name)
+            self._cost[feed.name] = sample if previous is None else \
+                previous + self.smoothing * (sample - previous)
+        cost = self._cost.get(feed.name)
+        if cost is None:
+            return
+
+        widths = [det.box[1] - det.box[3] for det in detections]
+        face_px = min(widths) if widths else None
+        if face_px:
+            wanted, reason = self.min_face_px / face_px, "faces"
+        else:
+            wanted, reason = self.search_scale, "search"
+        budget = math.sqrt(self.target_latency / cost)
+        if budget < wanted:
+            wanted, reason = budget, "latency"
+        scale = self._round(wanted)
+        latency = cost * scale * scale
+
+        # The workers' time is shared by every camera
+        capacity = self.workers * self.max_busy / (max(latency, 1e-3) * len(self.feeds))
+        target = self._target_fps.get(feed.name, self.target_fps)
+        max_fps = min(target, capacity)
+        if max_fps < target:
+            reason += ", busy"
+        max_fps = max(MIN_FPS, max_fps)
+
+        self._apply(feed, Decision(scale, max_fps, latency, face_px, reason))
+
+    def decisions(self):
+        """{camera name: Decision}, for status displays and debugging"""
+        with self.lock:
+            return dict(self._decisions)
+
+    def summary(self):
+        return " | ".join(
+            f"{name} x{d.scale:.2f} @{d.max_fps:.1f}/s ({d.reason})"
+            for name, d in sorted(self.decisions().items())
+        )
@@ -0,0 +1,145 @@
+"""Inverted-file (IVF) index for galleries too large to scan per face.
+
+Gallery rows are clustered with k-means into `n_lists` lists. A query
+only looks at the rows of the `nprobe` lists whose centroids are nearest
+to it, and ranks those rows by their exact distance, so the cost per
+face is roughly nprobe / n_lists of a full scan. nprobe is the
+recall/latency knob: more lists, higher recall, slower queries.
+
+The index is stored next to the gallery (face_gallery.ivf.npz) and tied
+to it by build id. Rows appended to the gallery after the index was
+built (same build id, more rows) are scanned exactly until the next
+rebuild, so hot-reloaded captures are found straight away.
+"""
+import os
+
+import numpy as np
+
+
+INDEX_VERSION = 1
+DEFAULT_NPROBE = 8
+TRAIN_POINTS_PER_LIST = 64     # k-means sample size per list
+CHUNK_ELEMENTS = 1 << 22       # row x list distances held per block when assigning
+
+
+def index_path(gallery_path):
+    return os.path.splitext(gallery_path)[0] + ".ivf.npz"
+
+
+def default_lists(n_rows):
+    return max(1, min(n_rows, int(4 * np.sqrt(n_rows))))
+
+
+def _nearest_centroid(data, centroids):
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(data), dtype=np.int32)
+    # Fewer rows per block the more lists there are: 16 MB of distances
+    chunk = max(1, CHUNK_ELEMENTS // len(centroids))
+    for start in range(0, len(data), chunk):
+        block = np.asarray(data[start:start + chunk], dtype=np.float32)
+        # |x|^2 is the same for every centroid, so it can be left out
+        d = block @ centroids.T
+        d *= -2.0
+        d += c_sq[None, :]
+        out[start:start + len(block)] = d.argmin(axis=1)
+    return out
+
+
+def kmeans(data, k, iterations=10, seed=0):
+    """Lloyd's k-means; returns float32 centroids (k, dim)"""
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroid(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+
+        # Re-seed lists that lost all their points
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Centroids plus, per list, the gallery rows assigned to it"""
+
+    def __init__(self, centroids, offsets, rows, build_id, n_rows):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.build_id = bytes(build_id)
+        self.n_rows = int(n_rows)
+        self.c_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, build_id, n_lists=None, iterations=10, seed=0):
+        n = len(embeddings)
+        n_lists = min(n_lists or default_lists(n), n)
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, n_lists * TRAIN_POINTS_PER_LIST)
+        sample = embeddings[np.sort(rng.choice(n, sample_size, replace=False))]
+        centroids = kmeans(sample, n_lists, iterations, seed)
+
+        assign = _nearest_centroid(embeddings, centroids)
+        # Rows stay ascending within a list, so gathers walk memory forwards
+        rows = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        return cls(centroids, offsets, rows, build_id, n)
+
+    def candidates(self, probe, nprobe, total_rows):
+        """Gallery rows to rank exactly for one probe"""
+        d = self.c_sq - 2.0 * (self.centroids @ probe)
+        nprobe = min(nprobe, self.n_lists)
+        lists = np.argpartition(d, nprobe - 1)[:nprobe] if nprobe < self.n_lists \
+            else np.arange(self.n_lists)
+        parts = [self.rows[self.offsets[l]:self.offsets[l + 1]] for l in lists]
+        if total_rows > self.n_rows:
+            # Rows appended since the index was built
+            parts.append(np.arange(self.n_rows, total_rows, dtype=np.int32))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+
+    def covers(self, gallery):
+        """Usable for `gallery`: same build, and only rows appended since"""
+        return (gallery.build_id == self.build_id and len(gallery) >= self.n_rows
+                and gallery.dim == self.centroids.shape[1])
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, version=np.int64(INDEX_VERSION),
+                 build_id=np.frombuffer(self.build_id, dtype=np.uint8),
+                 n_rows=np.int64(self.n_rows), centroids=self.centroids,
+                 offsets=self.offsets, rows=self.rows)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"{path}: unsupported index version")
+            return cls(data["centroids"], data["offsets"], data["rows"],
+                       data["build_id"].tobytes(), int(data["n_rows"]))
+
+
+def load_for(gallery, path):
+    """The index at `path` if it matches `gallery`, else None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        index = IVFIndex.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARN] Ignoring unreadable ANN index: {e}")
+        return None
+    if not index.covers(gallery):
+        print("[WARN] ANN index is for a different gallery build - using a full scan")
+        return None
+    return index
@@ -0,0 +1,177 @@
+"""Buffered, crash-safe attendance log.
+
+Rows go to attendance/attendance_YYYY-MM-DD.csv, the same files the app
+has always written, but through one persistent append handle owned by a
+background writer. The writer batches rows and flushes + fsyncs every
+`flush_interval` seconds and on close. Who has already been marked is
+rebuilt from today's file at startup, so a restart does not mark
+everyone again.
+"""
+import os
+import csv
+import queue
+import threading
+from datetime import datetime
+
+
+HEADER = ["Name", "Date", "Time"]
+
+
+def attendance_path(attendance_dir, date):
+    return os.path.join(attendance_dir, f"attendance_{date}.csv")
+
+
+def read_rows(path):
+    """Rows of an attendance CSV, skipping the header and any torn last line"""
+    rows = []
+    if not os.path.exists(path):
+        return rows
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if len(row) != len(HEADER) or row == HEADER:
+                continue
+            rows.append(tuple(row))
+    return rows
+
+
+class AttendanceStore:
+    def __init__(self, attendance_dir, flush_interval=1.0, batch_size=256):
+        self.attendance_dir = attendance_dir
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        os.makedirs(attendance_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.date = datetime.now().strftime("%Y-%m-%d")
+        self.marked_names = set()
+        self.new_rows = []
+        # Every row this store marked, by date: the writer may not have
+        # written them yet when marking switches back to that date
+        self._marked_rows = {}
+
+        # Pick up where a previous run (or crash) left off today
+        self.today_rows = read_rows(attendance_path(attendance_dir, self.date))
+        self.marked_names.update(row[0] for row in self.today_rows)
+
+        self._pending = queue.Queue()
+        self._file = None
+        self._file_date = None
+        self._stop_event = threading.Event()
+        self._writer = threading.Thread(
+            target=self._run, name="AttendanceWriter", daemon=True
+        )
+        self._writer.start()
+
+    # ---------- PRODUCERS (any thread) ----------
+    def mark(self, name, when=None):
+        """Record `name` once per day; returns the new row or None if already marked"""
+        when = when or datetime.now()
+        date = when.strftime("%Y-%m-%d")
+        with self.lock:
+            if date != self.date:
+                # Day rolled over (or back-dated rows from recorded footage)
+                self.date = date
+                file_rows = read_rows(attendance_path(self.attendance_dir, date))
+                written = set(file_rows)
+                self.today_rows = file_rows + [
+                    row for row in self._marked_rows.get(date, []) if row not in written
+                ]
+                self.marked_names = {row[0] for row in self.today_rows}
+            if name in self.marked_names:
+                return None
+            self.marked_names.add(name)
+            row = (name, date, when.strftime("%H:%M:%S"))
+            self.today_rows.append(row)
+            self.new_rows.append(row)
+            self._marked_rows.setdefault(date, []).append(row)
+        self._pending.put(row)
+        return row
+
+    def is_marked(self, name):
+        with self.lock:
+            return name in self.marked_names
+
+    def take_new_rows(self):
+        """Rows marked since the last call, for batched UI updates"""
+        with self.lock:
+            rows, self.new_rows = self.new_rows, []
+        return rows
+
+    # ---------- WRITER ----------
+    def _open(self, date):
+        if self._file is not None and self._file_date == date:
+            return self._file
+        if self._file is not None:
+            self._file.close()
+
+        path = attendance_path(self.attendance_dir, date)
+        needs_header = not os.path.exists(path) or os.path.getsize(path) == 0
+        needs_newline = False
+        if not needs_header:
+            # A crash mid-write can leave the last line without its newline
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+
+        self._file = open(path, "a", newline="")
+        self._file_date = date
+        if needs_newline:
+            self._file.write("\r\n")
+        if needs_header:
+            csv.writer(self._file).writerow(HEADER)
+        return self._file
+
+    def _write_batch(self, rows):
+        by_date = {}
+        for row in rows:
+            by_date.setdefault(row[1], []).append(row)
+        for date, date_rows in by_date.items():
+            f = self._open(date)
+            csv.writer(f).writerows(date_rows)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _drain(self, block):
+        rows = []
+        try:
+            if block:
+                rows.append(self._pending.get(timeout=self.flush_interval))
+            while len(rows) < self.batch_size:
+                rows.append(self._pending.get_nowait())
+        except queue.Empty:
+            pass
+        return rows
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            rows = self._drain(block=True)
+            if rows:
+                self._write_with_retry(rows)
+                # Let a burst accumulate instead of fsyncing once per person
+                self._stop_event.wait(self.flush_interval)
+
+        while True:
+            rows = self._drain(block=False)
+            if not rows or not self._write_with_retry(rows):
+                break
+
+    def _write_with_retry(self, rows):
+        try:
+            self._write_batch(rows)
+            return True
+        except OSError as e:
+            print(f"[WARN] Attendance write failed, will retry: {e}")
+            for row in rows:
+                self._pending.put(row)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return False
+
+    def close(self):
+        """Flush everything still buffered and close the file"""
+        self._stop_event.set()
+        self._writer.join(timeout=5.0)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
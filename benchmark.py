@@ -0,0 +1,420 @@
+"""Reproducible offline benchmarks for enrollment and recognition.
+
+    python benchmark.py run -o results.json [--dataset face_dataset] [--clip door.mp4]
+    python benchmark.py compare baseline.json results.json [--threshold 0.10]
+
+`run` times each stage that works without a camera and writes
+machine-readable JSON with environment info. Every result is keyed by
+"stage/variant" and has "median_s" (seconds per operation, lower is
+better), which is what `compare` checks. Synthetic inputs are generated
+from a fixed seed; on noise images the detectors find no faces, so pass
+--dataset / --clip with real faces to measure the full encode path.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+
+import cv2
+import numpy as np
+
+
+STAGES = ("enroll", "detect", "encode", "match", "ann", "e2e")
+DEFAULT_SCALES = (0.25, 0.5, 0.75, 1.0)
+DEFAULT_GALLERY_SIZES = (100, 1000, 10000, 100000)
+DEFAULT_ANN_SIZES = (10000, 100000)   # 1000000 is opt-in, see --ann-sizes
+DEFAULT_NPROBES = (1, 4, 8, 16, 32)
+SEED = 1234
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def time_it(fn, repeat=20, warmup=2):
+    """Timing summary of `repeat` calls to fn()"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples = np.asarray(samples)
+    return {
+        "n": int(len(samples)),
+        "median_s": float(np.median(samples)),
+        "p95_s": float(np.percentile(samples, 95)),
+        "mean_s": float(samples.mean()),
+        "min_s": float(samples.min()),
+    }
+
+
+def environment():
+    env = {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    for module in ("dlib", "face_recognition"):
+        try:
+            env[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            env[module] = None
+    try:
+        env["git_commit"] = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        env["git_commit"] = None
+    return env
+
+
+def synthetic_frames(count=5, size=(1280, 720)):
+    rng = np.random.default_rng(SEED)
+    frames = []
+    for _ in range(count):
+        frame = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        frames.append(cv2.GaussianBlur(frame, (9, 9), 0))
+    return frames
+
+
+def clip_frames(path, count=30):
+    from recognize_offline import iter_frames
+    frames = []
+    for _, _, frame in iter_frames(path):
+        frames.append(frame)
+        if len(frames) >= count:
+            break
+    return frames
+
+
+def synthetic_dataset(root, people=5, images_per_person=10):
+    rng = np.random.default_rng(SEED)
+    for p in range(people):
+        person_dir = os.path.join(root, f"person_{p}")
+        os.makedirs(person_dir, exist_ok=True)
+        for i in range(images_per_person):
+            image = rng.integers(0, 256, (200, 200, 3), dtype=np.uint8)
+            cv2.imwrite(os.path.join(person_dir, f"person_{p}_{i + 1}.jpg"), image)
+
+
+def log(message):
+    print(f"[BENCH] {message}", file=sys.stderr)
+
+
+# -----------------------------
+# Stages
+# -----------------------------
+def bench_enroll(args, results):
+    import encode_faces
+
+    tmp_dir = None
+    dataset = args.dataset
+    if dataset is None:
+        tmp_dir = tempfile.mkdtemp(prefix="bench_dataset_")
+        synthetic_dataset(tmp_dir)
+        dataset = tmp_dir
+
+    try:
+        tasks = [(rel, os.path.join(dataset, rel))
+                 for rel, _ in encode_faces.list_dataset_images(dataset)]
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            encodings, _ = encode_faces.encode_images(tasks, workers)
+            elapsed = time.perf_counter() - start
+            encoded = sum(1 for e in encodings.values() if e is not None)
+            results[f"enroll/workers={workers}"] = {
+                "n": len(tasks),
+                "median_s": elapsed / max(1, len(tasks)),
+                "per_s": len(tasks) / elapsed if elapsed else 0.0,
+                "encoded": encoded,
+            }
+            log(f"enroll workers={workers}: {len(tasks) / elapsed:.2f} images/s "
+                f"({encoded}/{len(tasks)} encoded)")
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def bench_detect(args, frames, results):
+    from face_detectors import DlibDetector, HaarDetector
+
+    detectors = {"haar": HaarDetector(), "hog": DlibDetector("hog")}
+    for scale in args.scales:
+        rgbs = [
+            cv2.cvtColor(cv2.resize(f, (0, 0), fx=scale, fy=scale), cv2.COLOR_BGR2RGB)
+            for f in frames
+        ]
+        for name, detector in detectors.items():
+            state = {"i": 0}
+
+            def run():
+                detector.detect(rgbs[state["i"] % len(rgbs)])
+                state["i"] += 1
+
+            stats = time_it(run, repeat=args.repeat)
+            faces = sum(len(detector.detect(rgb)) for rgb in rgbs)
+            stats["faces_per_frame"] = faces / len(rgbs)
+            results[f"detect/{name}/scale={scale}"] = stats
+            log(f"detect {name} scale={scale}: {stats['median_s'] * 1000:.1f} ms")
+
+
+def bench_encode(args, frames, results):
+    import face_recognition
+
+    rgb = cv2.cvtColor(cv2.resize(frames[0], (0, 0), fx=0.5, fy=0.5), cv2.COLOR_BGR2RGB)
+    h, w = rgb.shape[:2]
+    size = min(h, w) // 3
+    # Fixed boxes: encoding cost does not depend on whether a face is there
+    boxes = [(y, x + size, y + size, x)
+             for y in (0, h - size) for x in (0, w - size)]
+    for count in (1, 4):
+        stats = time_it(lambda: face_recognition.face_encodings(rgb, boxes[:count]),
+                        repeat=args.repeat)
+        stats["median_per_face_s"] = stats["median_s"] / count
+        results[f"encode/faces={count}"] = stats
+        log(f"encode {count} face(s): {stats['median_per_face_s'] * 1000:.1f} ms/face")
+
+
+def bench_match(args, results):
+    from face_matcher import GalleryMatcher
+
+    rng = np.random.default_rng(SEED)
+    for size in args.gallery_sizes:
+        embeddings = rng.normal(0, 0.1, (size, 128)).astype(np.float32)
+        labels = np.arange(size, dtype=np.int32) // 10
+        names = [f"person_{i}" for i in range(labels[-1] + 1)]
+        matcher = GalleryMatcher(embeddings, labels, names)
+        for probes in (1, 4):
+            queries = embeddings[rng.integers(0, size, probes)] + 0.01
+            stats = time_it(lambda: matcher.match(queries), repeat=args.repeat)
+            results[f"match/gallery={size}/probes={probes}"] = stats
+            log(f"match gallery={size} probes={probes}: {stats['median_s'] * 1000:.2f} ms")
+
+
+def synthetic_gallery(size, per_person=5, dim=128):
+    """Clustered encodings: people ~1.1 apart, their samples ~0.3 apart,
+    roughly the geometry of real face embeddings"""
+    rng = np.random.default_rng(SEED)
+    people = max(1, size // per_person)
+    centers = rng.normal(0, 0.07, (people, dim)).astype(np.float32)
+    labels = np.arange(size, dtype=np.int32) % people
+    embeddings = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, 65536):
+        block = labels[start:start + 65536]
+        embeddings[start:start + len(block)] = centers[block] + rng.normal(
+            0, 0.02, (len(block), dim)).astype(np.float32)
+    return embeddings, labels, centers
+
+
+def bench_ann(args, results):
+    from ann_index import IVFIndex
+    from face_matcher import GalleryMatcher
+
+    rng = np.random.default_rng(SEED + 1)
+    for size in args.ann_sizes:
+        embeddings, labels, centers = synthetic_gallery(size)
+        names = [f"person_{i}" for i in range(len(centers))]
+        exact = GalleryMatcher(embeddings, labels, names)
+
+        start = time.perf_counter()
+        index = IVFIndex.build(embeddings, b"\0" * 8)
+        build_s = time.perf_counter() - start
+        results[f"ann/gallery={size}/build"] = {"n": 1, "median_s": build_s,
+                                                "lists": index.n_lists}
+        log(f"ann gallery={size}: built {index.n_lists} lists in {build_s:.1f}s")
+
+        # Unseen samples of enrolled people
+        who = rng.integers(0, len(centers), 200)
+        queries = centers[who] + rng.normal(0, 0.02, (len(who), 128)).astype(np.float32)
+        truth = [exact.distances(q)[0].argmin() for q in queries]
+
+        stats = time_it(lambda: exact.match(queries[:1]), repeat=args.repeat)
+        results[f"ann/gallery={size}/exact"] = stats
+        log(f"ann gallery={size} exact: {stats['median_s'] * 1000:.2f} ms")
+
+        for nprobe in args.nprobes:
+            matcher = GalleryMatcher(embeddings, labels, names, sq_norms=exact.sq_norms,
+                                     index=index, nprobe=nprobe)
+            hits = 0
+            for q, t in zip(queries, truth):
+                rows = index.candidates(q, nprobe, size)
+                d = exact.sq_norms[rows] - 2.0 * (embeddings[rows] @ q)
+                hits += int(rows[d.argmin()] == t)
+            state = {"i": 0}
+
+            def run():
+                matcher.match(queries[state["i"] % len(queries)][None, :])
+                state["i"] += 1
+
+            stats = time_it(run, repeat=args.repeat)
+            stats["recall_at_1"] = hits / len(queries)
+            stats["speedup"] = results[f"ann/gallery={size}/exact"]["median_s"] / stats["median_s"]
+            results[f"ann/gallery={size}/nprobe={nprobe}"] = stats
+            log(f"ann gallery={size} nprobe={nprobe}: {stats['median_s'] * 1000:.2f} ms, "
+                f"recall@1 {stats['recall_at_1']:.3f}, {stats['speedup']:.1f}x")
+
+
+def bench_e2e(args, results):
+    from face_detectors import make_detector
+    from face_matcher import GalleryMatcher
+    from face_tracker import FaceTracker
+    from gallery import open_gallery
+    from recognition import FaceRecognizer
+    from recognize_offline import GALLERY_PATH, LEGACY_ENCODINGS_PATH, iter_frames
+
+    if not args.clip:
+        log("e2e: skipped (no --clip)")
+        return
+
+    gallery = open_gallery(args.gallery or GALLERY_PATH, LEGACY_ENCODINGS_PATH)
+    matcher = GalleryMatcher.from_gallery(gallery)
+    for backend in ("hog", "haar+hog"):
+        for tracking in (False, True):
+            recognizer = FaceRecognizer(
+                matcher, resize_scale=0.5, detector=make_detector(backend),
+                tracker=FaceTracker() if tracking else None,
+            )
+            frames = 0
+            start = time.perf_counter()
+            for _, time_s, frame in iter_frames(args.clip):
+                recognizer.recognize(frame, time_s)
+                frames += 1
+            elapsed = time.perf_counter() - start
+            key = f"e2e/{backend}/tracking={'on' if tracking else 'off'}"
+            results[key] = {
+                "n": frames,
+                "median_s": elapsed / max(1, frames),
+                "per_s": frames / elapsed if elapsed else 0.0,
+                "counters": recognizer.metrics.snapshot()["counters"],
+            }
+            log(f"{key}: {results[key]['per_s']:.1f} frames/s")
+
+
+# -----------------------------
+# Commands
+# -----------------------------
+def cmd_run(args):
+    stages = args.stages or STAGES
+    results = {}
+
+    frames = None
+    if {"detect", "encode"} & set(stages):
+        frames = clip_frames(args.clip) if args.clip else synthetic_frames()
+
+    if "enroll" in stages:
+        bench_enroll(args, results)
+    if "detect" in stages:
+        bench_detect(args, frames, results)
+    if "encode" in stages:
+        bench_encode(args, frames, results)
+    if "match" in stages:
+        bench_match(args, results)
+    if "ann" in stages:
+        bench_ann(args, results)
+    if "e2e" in stages:
+        bench_e2e(args, results)
+
+    report = {
+        "environment": environment(),
+        "config": {
+            "stages": list(stages),
+            "repeat": args.repeat,
+            "scales": list(args.scales),
+            "gallery_sizes": list(args.gallery_sizes),
+            "ann_sizes": list(args.ann_sizes),
+            "nprobes": list(args.nprobes),
+            "dataset": args.dataset,
+            "clip": args.clip,
+            "seed": SEED,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    log(f"wrote {len(results)} results to {args.output}")
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'benchmark':<40} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for key in sorted(set(baseline) | set(candidate)):
+        if key not in baseline or key not in candidate:
+            side = "baseline" if key in baseline else "candidate"
+            print(f"{key:<40} {'(only in ' + side + ')':>35}")
+            continue
+        old = baseline[key]["median_s"]
+        new = candidate[key]["median_s"]
+        change = (new - old) / old if old > 0 else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "  faster"
+        print(f"{key:<40} {old * 1000:>10.3f}ms {new * 1000:>10.3f}ms "
+              f"{change * 100:>+8.1f}%{flag}")
+
+    if regressions:
+        print(f"\n{regressions} regression(s) over {args.threshold * 100:.0f}%")
+        return 1
+    return 0
+
+
+def _float_list(text):
+    return [float(x) for x in text.split(",") if x]
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="run benchmarks and write a JSON report")
+    p.add_argument("-o", "--output", default="bench_results.json")
+    p.add_argument("--stages", nargs="+", choices=STAGES)
+    p.add_argument("--dataset", help="face_dataset-style folder for enroll")
+    p.add_argument("--clip", help="recorded video for detect/encode/e2e")
+    p.add_argument("--gallery", help="gallery for e2e (default: encodings/)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                   help="also time enrollment with this many workers")
+    p.add_argument("--scales", type=_float_list, default=list(DEFAULT_SCALES))
+    p.add_argument("--gallery-sizes", type=_int_list, default=list(DEFAULT_GALLERY_SIZES))
+    p.add_argument("--ann-sizes", type=_int_list, default=list(DEFAULT_ANN_SIZES),
+                   help="1000000 needs several GB of RAM")
+    p.add_argument("--nprobes", type=_int_list, default=list(DEFAULT_NPROBES))
+    p.add_argument("--repeat", type=int, default=20)
+
+    p = sub.add_parser("compare", help="flag regressions between two reports")
+    p.add_argument("baseline")
+    p.add_argument("candidate")
+    p.add_argument("--threshold", type=float, default=0.10,
+                   help="relative slowdown that counts as a regression")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return cmd_run(args)
+    return cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
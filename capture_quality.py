@@ -0,0 +1,166 @@
+"""Pick fewer, better enrollment samples from the capture stream.
+
+Every frame with a face is scored; within each capture window only the
+best candidate is kept, and only if it is sharp enough, large enough,
+roughly frontal and not a near-duplicate of a sample already taken.
+If the thresholds are still not met after `max_evaluated` faces (a dim
+room, a camera mounted off-axis), the best rejected candidates are used
+instead, so a capture session always ends with samples.
+"""
+import cv2
+import numpy as np
+
+
+NORM_SIZE = 96          # faces are compared at this size, whatever their distance
+
+
+class Candidate:
+    """One face crop and its quality measures"""
+
+    __slots__ = ("frame", "rect", "sharpness", "size", "symmetry", "score", "dhash")
+
+    def __init__(self, frame, rect, sharpness, size, symmetry, score, dhash):
+        self.frame = frame
+        self.rect = rect
+        self.sharpness = sharpness
+        self.size = size
+        self.symmetry = symmetry
+        self.score = score
+        self.dhash = dhash
+
+
+def dhash(gray, hash_size=8):
+    """64-bit difference hash: near-identical crops differ in few bits"""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def score_face(frame, gray, rect):
+    """Candidate for the Haar (x, y, w, h) face `rect` of a BGR frame.
+
+    sharpness: variance of the Laplacian of the size-normalised face
+    size:      face width as a fraction of the frame width
+    symmetry:  1 - mean |left half - mirrored right half|, a frontal-pose proxy
+    """
+    x, y, w, h = rect
+    face = cv2.resize(gray[y:y + h, x:x + w], (NORM_SIZE, NORM_SIZE),
+                      interpolation=cv2.INTER_AREA)
+
+    sharpness = float(cv2.Laplacian(face, cv2.CV_64F).var())
+    size = w / float(frame.shape[1])
+
+    half = NORM_SIZE // 2
+    left = face[:, :half].astype(np.int16)
+    right = np.fliplr(face[:, NORM_SIZE - half:]).astype(np.int16)
+    symmetry = 1.0 - float(np.abs(left - right).mean()) / 255.0
+
+    # Sharpness saturates: past "clearly in focus" it stops mattering
+    score = min(sharpness / 300.0, 1.0) + min(size / 0.3, 1.0) + symmetry
+    return Candidate(frame, rect, sharpness, size, symmetry, score, dhash(face))
+
+
+class SampleSelector:
+    """Keeps the best face of each window and rejects weak or repeated ones"""
+
+    def __init__(self, target=10, min_sharpness=60.0, min_size=0.12,
+                 min_symmetry=0.8, min_hash_distance=10, max_evaluated=300):
+        self.target = target
+        self.min_sharpness = min_sharpness
+        self.min_size = min_size
+        self.min_symmetry = min_symmetry
+        self.min_hash_distance = min_hash_distance
+        self.max_evaluated = max_evaluated
+
+        self.evaluated = 0
+        self.kept = []
+        self.rejected = {"blurry": 0, "small": 0, "pose": 0, "duplicate": 0}
+        self.last_rejection = None
+        self.below_threshold = 0     # kept by fallback()
+        self._best = None
+        self._runners_up = []    # best window candidates that missed a threshold
+
+    @property
+    def done(self):
+        return len(self.kept) >= self.target
+
+    @property
+    def exhausted(self):
+        """Enough faces evaluated without reaching the target: use fallback()"""
+        return not self.done and self.evaluated >= self.max_evaluated
+
+    def offer(self, frame, gray, rect):
+        """Score a face; returns the candidate (the window's best is kept)"""
+        self.evaluated += 1
+        candidate = score_face(frame, gray, rect)
+        if self._best is None or candidate.score > self._best.score:
+            self._best = candidate
+        return candidate
+
+    def _is_duplicate(self, candidate, samples):
+        return any(hamming(candidate.dhash, k.dhash) < self.min_hash_distance
+                   for k in samples)
+
+    def _reject_reason(self, candidate):
+        if candidate.sharpness < self.min_sharpness:
+            return "blurry"
+        if candidate.size < self.min_size:
+            return "small"
+        if candidate.symmetry < self.min_symmetry:
+            return "pose"
+        if self._is_duplicate(candidate, self.kept):
+            return "duplicate"
+        return None
+
+    def _describe(self, reason, candidate):
+        if reason == "blurry":
+            return f"blurry: sharpness {candidate.sharpness:.0f} < {self.min_sharpness:.0f}"
+        if reason == "small":
+            return f"small: size {candidate.size:.2f} < {self.min_size:.2f}"
+        if reason == "pose":
+            return f"pose: symmetry {candidate.symmetry:.2f} < {self.min_symmetry:.2f}"
+        return "duplicate of a kept sample"
+
+    def take(self):
+        """End the window: the best candidate if it qualifies, else None"""
+        candidate, self._best = self._best, None
+        if candidate is None:
+            return None
+        reason = self._reject_reason(candidate)
+        if reason is not None:
+            self.rejected[reason] += 1
+            self.last_rejection = self._describe(reason, candidate)
+            if reason != "duplicate":
+                self._runners_up.append(candidate)
+                self._runners_up.sort(key=lambda c: c.score, reverse=True)
+                # Only the best few can ever be needed; drop the rest's frames
+                del self._runners_up[self.target:]
+            return None
+        self.kept.append(candidate)
+        return candidate
+
+    def fallback(self):
+        """Fill up to the target with the best rejected, non-repeating
+        candidates seen so far; returns the ones added"""
+        added = []
+        for candidate in self._runners_up:
+            if self.done:
+                break
+            if self._is_duplicate(candidate, self.kept):
+                continue
+            self.kept.append(candidate)
+            added.append(candidate)
+        self.below_threshold += len(added)
+        self._runners_up = []
+        return added
+
+    def summary(self):
+        rejected = ", ".join(f"{reason} {count}" for reason, count in self.rejected.items()
+                             if count)
+        below = f", {self.below_threshold} below thresholds" if self.below_threshold else ""
+        return (f"evaluated {self.evaluated} faces, kept {len(self.kept)}{below}"
+                + (f" (rejected: {rejected})" if rejected else ""))
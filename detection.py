@@ -0,0 +1,19 @@
+class Detection:
+    """One recognised face, box in full-frame pixel coordinates.
+
+    Kept free of dlib/face_recognition imports so thin clients of the
+    recognition service can use it without loading the models.
+    """
+
+    __slots__ = ("box", "name", "label", "distance", "track_id")
+
+    def __init__(self, box, name, label=-1, distance=float("inf"), track_id=None):
+        self.box = box   # (top, right, bottom, left)
+        self.name = name
+        self.label = label
+        self.distance = distance
+        self.track_id = track_id
+
+    @property
+    def known(self):
+        return self.label >= 0
@@ -1,7 +1,19 @@
 import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
 import cv2
+import numpy as np
 import face_recognition
-import pickle
+
+import gallery as gallery_format
+from ann_index import IVFIndex, index_path, load_for
+from gallery_compaction import compact
+from quantization import PRECISIONS, dequantize, evaluate, quantize
+from face_sidecar import read_box, sidecar_signature
 
 # -----------------------------
 # Paths
@@ -9,65 +21,608 @@ import pickle
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATASET_DIR = os.path.join(BASE_DIR, "face_dataset")
 ENCODINGS_DIR = os.path.join(BASE_DIR, "encodings")
-ENCODINGS_FILE = os.path.join(ENCODINGS_DIR, "face_encodings.pickle")
+ENCODINGS_FILE = os.path.join(ENCODINGS_DIR, "face_gallery.fgal")
+
+# Manifest: per-image metadata (JSON) + one encoding row per image (.npy)
+MANIFEST_FILE = os.path.join(ENCODINGS_DIR, "face_manifest.json")
+MANIFEST_ENCODINGS_FILE = os.path.join(ENCODINGS_DIR, "face_manifest.npy")
+MANIFEST_VERSION = 1
+
+# Compaction settings stick between runs; see gallery_compaction.py
+COMPACTION_FILE = os.path.join(ENCODINGS_DIR, "compaction.json")
+COMPACTION_REPORT_FILE = os.path.join(ENCODINGS_DIR, "compaction_report.json")
+
+# Built with --ann and kept up to date while it exists
+ANN_INDEX_FILE = index_path(ENCODINGS_FILE)
+ANN_MAX_UNINDEXED = 0.1     # rebuild once this fraction of rows is appended after it
+
+PRECISION_REPORT_FILE = os.path.join(ENCODINGS_DIR, "precision_report.json")
+# --precision sticks between runs, so a guardrail fallback to float32 is
+# retried on the next run instead of becoming the "current" precision
+PRECISION_FILE = os.path.join(ENCODINGS_DIR, "precision.json")
+MAX_PRECISION_CHANGES = 0.001   # default --max-changes
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
 
-os.makedirs(ENCODINGS_DIR, exist_ok=True)
 
 # -----------------------------
-# Storage
+# Dataset scanning
 # -----------------------------
-known_encodings = []
-known_names = []
+def list_dataset_images(dataset_dir):
+    """Return sorted (relative_path, person_name) pairs for every image"""
+    images = []
+    for person_name in sorted(os.listdir(dataset_dir)):
+        person_path = os.path.join(dataset_dir, person_name)
+
+        if not os.path.isdir(person_path):
+            continue
+
+        for image_name in sorted(os.listdir(person_path)):
+            if not image_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            images.append((f"{person_name}/{image_name}", person_name))
+    return images
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-print("[INFO] Starting face encoding process...")
 
 # -----------------------------
-# Loop through each person
+# Encoding
 # -----------------------------
-for person_name in os.listdir(DATASET_DIR):
-    person_path = os.path.join(DATASET_DIR, person_name)
+def encode_image(image_path):
+    """Return the 128-d encoding of the single face in an image, or None"""
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
 
-    if not os.path.isdir(person_path):
-        continue
+    # Convert BGR to RGB
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
-    print(f"[INFO] Processing person: {person_name}")
+    # Captures from face_dataset_gui.py record where the face is
+    box = read_box(image_path, rgb.shape)
+    if box is not None:
+        return face_recognition.face_encodings(rgb, [box])[0]
 
-    for image_name in os.listdir(person_path):
-        image_path = os.path.join(person_path, image_name)
+    # Detect face locations
+    boxes = face_recognition.face_locations(rgb, model="hog")
 
-        # Load image
-        image = cv2.imread(image_path)
-        if image is None:
-            continue
+    # Enforce one-face-per-image rule
+    if len(boxes) != 1:
+        return None
 
-        # Convert BGR to RGB
-        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return face_recognition.face_encodings(rgb, boxes)[0]
 
-        # Detect face locations
-        boxes = face_recognition.face_locations(rgb, model="hog")
 
-        # Enforce one-face-per-image rule
-        if len(boxes) != 1:
-            continue
+def _init_worker():
+    # Each worker already holds the dlib models loaded by the
+    # face_recognition import; keep OpenCV from spawning its own
+    # thread pool on top of our processes
+    cv2.setNumThreads(1)
+
+
+def _encode_task(task):
+    relpath, image_path = task
+    start = time.perf_counter()
+    encoding = encode_image(image_path)
+    return relpath, encoding, os.getpid(), time.perf_counter() - start
+
+
+def encode_images(tasks, workers=1):
+    """Encode (relpath, image_path) tasks, optionally over a process pool.
+
+    Returns ({relpath: encoding or None}, {worker_pid: (images, busy_seconds)}).
+    Results are keyed by path, so the merge does not depend on the order
+    workers finish in.
+    """
+    results = {}
+    stats = {}
+    if not tasks:
+        return results, stats
 
-        # Compute encoding
-        encoding = face_recognition.face_encodings(rgb, boxes)[0]
+    if workers <= 1:
+        outputs = map(_encode_task, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        chunksize = max(1, min(16, len(tasks) // (workers * 4)))
+        outputs = pool.imap_unordered(_encode_task, tasks, chunksize=chunksize)
 
-        known_encodings.append(encoding)
-        known_names.append(person_name)
+    try:
+        for relpath, encoding, pid, elapsed in outputs:
+            results[relpath] = encoding
+            count, busy = stats.get(pid, (0, 0.0))
+            stats[pid] = (count + 1, busy + elapsed)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return results, stats
+
+
+def print_throughput(stats, wall_time):
+    total = sum(count for count, _ in stats.values())
+    if not total:
+        return
+    for pid in sorted(stats):
+        count, busy = stats[pid]
+        rate = count / busy if busy > 0 else 0.0
+        print(f"[INFO] Worker {pid}: {count} images, {rate:.2f} images/s")
+    rate = total / wall_time if wall_time > 0 else 0.0
+    print(f"[INFO] Overall: {total} images in {wall_time:.1f}s "
+          f"({rate:.2f} images/s, {len(stats)} worker(s))")
 
-print("[INFO] Encoding complete")
-print(f"[INFO] Total encodings: {len(known_encodings)}")
 
 # -----------------------------
-# Save encodings
+# Manifest
 # -----------------------------
-data = {
-    "encodings": known_encodings,
-    "names": known_names
-}
+def load_manifest():
+    """Return {relpath: entry} with each entry's encoding attached"""
+    if not (os.path.exists(MANIFEST_FILE) and os.path.exists(MANIFEST_ENCODINGS_FILE)):
+        return {}
+
+    try:
+        with open(MANIFEST_FILE, "r") as f:
+            data = json.load(f)
+        rows = np.load(MANIFEST_ENCODINGS_FILE, allow_pickle=False)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Ignoring unreadable manifest: {e}")
+        return {}
+
+    if data.get("version") != MANIFEST_VERSION:
+        print("[WARN] Manifest version mismatch - doing a full pass")
+        return {}
+
+    entries = {}
+    for relpath, entry in data["images"].items():
+        row = entry["row"]
+        if row is not None and row >= len(rows):
+            print("[WARN] Manifest and encodings are out of sync - doing a full pass")
+            return {}
+        entry["encoding"] = None if row is None else rows[row]
+        entries[relpath] = entry
+    return entries
+
+
+def save_manifest(entries, order):
+    """Write the manifest.
+
+    Encoding rows are stored in gallery `order` first, then the encodings
+    compaction left out of the gallery (marked "in_gallery": false).
+    """
+    in_gallery = set(order)
+    stored = list(order) + [relpath for relpath in sorted(entries)
+                            if relpath not in in_gallery
+                            and entries[relpath]["encoding"] is not None]
+    row_of = {relpath: row for row, relpath in enumerate(stored)}
+    images = {}
+    rows = [entries[relpath]["encoding"] for relpath in stored]
+    for relpath in sorted(entries):
+        entry = dict(entries[relpath])
+        entry.pop("encoding")
+        entry["row"] = row_of.get(relpath)
+        entry["in_gallery"] = relpath in in_gallery
+        images[relpath] = entry
+
+    matrix = np.asarray(rows, dtype=np.float64).reshape(len(rows), 128)
+
+    # Write both files next to the target and swap them in, so an interrupted
+    # run never leaves a half-written manifest behind
+    tmp_npy = MANIFEST_ENCODINGS_FILE + ".tmp.npy"
+    tmp_json = MANIFEST_FILE + ".tmp"
+    np.save(tmp_npy, matrix, allow_pickle=False)
+    with open(tmp_json, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "images": images}, f, indent=1)
+    os.replace(tmp_npy, MANIFEST_ENCODINGS_FILE)
+    os.replace(tmp_json, MANIFEST_FILE)
+
+
+# -----------------------------
+# Build
+# -----------------------------
+def build_manifest(dataset_dir, previous, workers=1):
+    """Encode new/changed images and reuse everything else from `previous`.
+
+    Returns (entries, report) where report lists what changed.
+    """
+    report = {"added": [], "updated": [], "removed": [], "unchanged": 0,
+              "removed_people": []}
+    entries = {}
+    tasks = []
+    current_people = set()
+
+    for relpath, person_name in list_dataset_images(dataset_dir):
+        image_path = os.path.join(dataset_dir, relpath)
+        st = os.stat(image_path)
+        current_people.add(person_name)
+
+        entry = {
+            "name": person_name,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sidecar": sidecar_signature(image_path),
+        }
+        prev = previous.get(relpath)
+        same_sidecar = prev is not None and prev.get("sidecar") == entry["sidecar"]
+
+        # Cheap check first: same size and mtime means same file
+        if (prev is not None and prev["name"] == person_name and same_sidecar
+                and prev["size"] == st.st_size
+                and prev["mtime_ns"] == st.st_mtime_ns):
+            entry["sha1"] = prev["sha1"]
+            entry["encoding"] = prev["encoding"]
+            entries[relpath] = entry
+            report["unchanged"] += 1
+            continue
+
+        entry["sha1"] = file_sha1(image_path)
+
+        # Touched but identical content - keep the stored encoding
+        if (prev is not None and prev["name"] == person_name and same_sidecar
+                and prev["sha1"] == entry["sha1"]):
+            entry["encoding"] = prev["encoding"]
+            entries[relpath] = entry
+            report["unchanged"] += 1
+            continue
+
+        entries[relpath] = entry
+        tasks.append((relpath, image_path))
+        report["updated" if prev is not None else "added"].append(relpath)
+
+    start = time.perf_counter()
+    encodings, stats = encode_images(tasks, workers)
+    for relpath, encoding in encodings.items():
+        entries[relpath]["encoding"] = encoding
+    print_throughput(stats, time.perf_counter() - start)
+
+    report["removed"] = sorted(set(previous) - set(entries))
+    previous_people = {entry["name"] for entry in previous.values()}
+    report["removed_people"] = sorted(previous_people - current_people)
+    return entries, report
+
+
+def print_report(report, entries):
+    print(f"[INFO] Added:     {len(report['added'])}")
+    for relpath in report["added"]:
+        print(f"         + {relpath}")
+    print(f"[INFO] Updated:   {len(report['updated'])}")
+    for relpath in report["updated"]:
+        print(f"         ~ {relpath}")
+    print(f"[INFO] Removed:   {len(report['removed'])}")
+    for relpath in report["removed"]:
+        print(f"         - {relpath}")
+    if report["removed_people"]:
+        print(f"[INFO] Removed people: {', '.join(report['removed_people'])}")
+    print(f"[INFO] Unchanged: {report['unchanged']}")
+
+    rejected = sum(1 for e in entries.values() if e["encoding"] is None)
+    if rejected:
+        print(f"[INFO] Skipped (not exactly one face): {rejected}")
+
+
+def gallery_rows(entries):
+    """Relpaths of a loaded manifest's gallery rows, in gallery order"""
+    kept = sorted((entry["row"], relpath) for relpath, entry in entries.items()
+                  if entry["row"] is not None and entry.get("in_gallery", True))
+    return [relpath for _, relpath in kept]
+
+
+def gallery_order(entries, previous, report):
+    """Row order for the gallery, and the previous order it extends (or None).
+
+    When a run only added images, the previous rows keep their positions
+    and the new ones go at the end, so a running app can pick up just the
+    new rows (see GalleryMatcher.is_prefix_of). Anything else re-sorts.
+    """
+    encoded = [relpath for relpath in sorted(entries)
+               if entries[relpath]["encoding"] is not None]
+    if not previous or report["updated"] or report["removed"]:
+        return encoded, None
+
+    previous_order = gallery_rows(previous)
+    existing = set(previous_order)
+    order = previous_order + [relpath for relpath in encoded if relpath not in existing]
+    return order, previous_order
+
+
+def load_compaction():
+    try:
+        with open(COMPACTION_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def compact_order(entries, order, settings):
+    """Apply compaction to a gallery order; returns (order, report)"""
+    if not order:
+        return order, None
+    labels, label_names = gallery_format.intern_names(
+        [entries[relpath]["name"] for relpath in order]
+    )
+    vectors = np.asarray([entries[relpath]["encoding"] for relpath in order])
+    keep, report = compact(
+        vectors, labels,
+        dedup_threshold=settings["dedup_threshold"],
+        prototypes=settings["prototypes"],
+        drop_outliers=settings["drop_outliers"],
+    )
+
+    # Report by name and image rather than by row
+    report["settings"] = settings
+    report["people"] = {label_names[label]: counts
+                        for label, counts in report["people"].items()}
+    report["outliers"] = [
+        {"image": order[row], "name": entries[order[row]]["name"],
+         "closest_other": label_names[other_label],
+         "own_distance": round(own, 4), "other_distance": round(other, 4)}
+        for row, own, other, other_label in report["outliers"]
+    ]
+    return [order[i] for i in keep], report
+
+
+def apply_compaction(entries, order, settings):
+    """compact_order, with the report printed and saved; returns the order"""
+    order, report = compact_order(entries, order, settings)
+    if report is not None:
+        print_compaction_report(report)
+        with open(COMPACTION_REPORT_FILE, "w") as f:
+            json.dump(report, f, indent=1)
+    return order
+
+
+def print_compaction_report(report):
+    print(f"[INFO] Compaction: {report['rows_before']} -> {report['rows_after']} rows")
+    for name, counts in sorted(report["people"].items()):
+        if counts["after"] != counts["before"]:
+            print(f"         {name}: {counts['before']} -> {counts['after']} "
+                  f"({counts['duplicates']} near-duplicates)")
+    for outlier in report["outliers"]:
+        print(f"[WARN] Outlier: {outlier['image']} is closer to "
+              f"{outlier['closest_other']} ({outlier['other_distance']:.3f}) "
+              f"than to {outlier['name']} ({outlier['own_distance']:.3f})")
+    if report["outliers"] and not report["outliers_dropped"]:
+        print("[INFO] Outliers were kept; check them or use --drop-outliers")
+
+
+def current_build_id(expected_rows):
+    """Build id of the gallery on disk, if it still has `expected_rows` rows"""
+    try:
+        gallery = gallery_format.load_gallery(ENCODINGS_FILE)
+    except (OSError, ValueError):
+        return None
+    build_id = gallery.build_id if len(gallery) == expected_rows else None
+    gallery.close()
+    return build_id
+
+
+def current_precision():
+    """(precision, int8 scales) of the gallery on disk; float32 if there is none"""
+    try:
+        gallery = gallery_format.load_gallery(ENCODINGS_FILE)
+    except (OSError, ValueError):
+        return "float32", None
+    precision = gallery.precision
+    scales = None if gallery.scales is None else np.array(gallery.scales)
+    gallery.close()
+    return precision, scales
+
+
+def load_requested_precision():
+    try:
+        with open(PRECISION_FILE) as f:
+            return json.load(f)["precision"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_encodings(entries, order, build_id=None, precision=None):
+    """Write the gallery; `precision` None keeps the current gallery's"""
+    known_encodings = [entries[relpath]["encoding"] for relpath in order]
+    known_names = [entries[relpath]["name"] for relpath in order]
+
+    gallery = gallery_format.from_encodings(known_encodings, known_names)
+    current, scales = current_precision()
+    precision = precision or current
+    if precision != current:
+        print(f"[INFO] Gallery precision: {current} -> {precision}")
+    if build_id is None or precision != current:
+        # Not extending the current rows: int8 scales are fitted afresh
+        build_id, scales = None, None
+    elif scales is not None and len(gallery) and \
+            np.abs(np.rint(gallery.embeddings / scales)).max() > 127:
+        # New rows outside the existing scales would be clipped
+        print("[INFO] New encodings exceed the gallery's int8 range - "
+              "refitting its scales (running apps reload it in full)")
+        build_id, scales = None, None
+    gallery.embeddings, gallery.scales = quantize(gallery.embeddings, precision, scales)
+    if build_id is not None:
+        gallery.build_id = build_id
+    gallery_format.save_gallery(ENCODINGS_FILE, gallery)
+
+    return len(gallery)
+
+
+def check_precision(entries, order, max_changes):
+    """Evaluate the saved reduced-precision gallery against float64.
+
+    Returns the report and whether it is within `max_changes` (fraction
+    of probes whose top-1 identity or accept/reject decision changed).
+    """
+    from face_matcher import GalleryMatcher, DEFAULT_TOLERANCE
+
+    gallery = gallery_format.load_gallery(ENCODINGS_FILE)
+    precision = gallery.precision
+    report = None
+    if precision != "float32":
+        reference = [entries[relpath]["encoding"] for relpath in order]
+        report = evaluate(reference, gallery.labels, GalleryMatcher.from_gallery(gallery),
+                          DEFAULT_TOLERANCE)
+    gallery.close()
+    if report is None:
+        return None, True
+    report["precision"] = precision
+    changed = max(report["top1_changed"], report["decisions_changed"])
+    return report, changed <= max_changes * report["queries"]
+
+
+def enforce_precision(entries, order, max_changes=MAX_PRECISION_CHANGES):
+    """Check the saved gallery with check_precision and rewrite it as
+    float32 if it is out of bounds; returns False when it had to.
+    Call with the gallery lock held."""
+    report, acceptable = check_precision(entries, order, max_changes)
+    if report is not None:
+        print_precision_report(report)
+        with open(PRECISION_REPORT_FILE, "w") as f:
+            json.dump(report, f, indent=1)
+    if not acceptable:
+        print("[WARN] Reduced precision changes recognition results - "
+              "saving float32 instead (the next encode_faces.py run tries "
+              "again)")
+        save_encodings(entries, order, None, "float32")
+    return acceptable
+
+
+def update_ann_index(n_lists=None, force=False):
+    """Build the ANN index for the saved gallery unless the current one still fits"""
+    gallery = gallery_format.load_gallery(ENCODINGS_FILE)
+    try:
+        if not force:
+            index = load_for(gallery, ANN_INDEX_FILE)
+            if index is not None and \
+                    len(gallery) - index.n_rows <= ANN_MAX_UNINDEXED * index.n_rows:
+                print(f"[INFO] ANN index still current ({len(gallery) - index.n_rows} "
+                      f"rows appended since it was built)")
+                return
+        if not len(gallery):
+            return
+        start = time.perf_counter()
+        index = IVFIndex.build(dequantize(gallery.embeddings, gallery.scales),
+                               gallery.build_id, n_lists)
+        index.save(ANN_INDEX_FILE)
+        print(f"[INFO] ANN index: {index.n_lists} lists over {index.n_rows} rows "
+              f"in {time.perf_counter() - start:.1f}s -> {ANN_INDEX_FILE}")
+    finally:
+        gallery.close()
+
+
+def print_precision_report(report):
+    q = report["queries"]
+    print(f"[INFO] {report['precision']} gallery, {report['bytes_per_row']} bytes/row "
+          f"(float64: 1024): over {q} probes, top-1 changed {report['top1_changed']}, "
+          f"decisions changed {report['decisions_changed']}, distance error "
+          f"mean {report['mean_abs_error']:.5f} max {report['max_abs_error']:.5f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encode the face dataset")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-encode new or changed images")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="encode in parallel over N processes "
+                             "(0 = one per CPU core)")
+    parser.add_argument("--compact", action="store_true",
+                        help="prune near-duplicate encodings (remembered for later runs)")
+    parser.add_argument("--no-compact", action="store_true",
+                        help="turn remembered compaction off again")
+    parser.add_argument("--dedup-threshold", type=float, default=0.2,
+                        help="drop encodings closer than this to a kept one")
+    parser.add_argument("--prototypes", type=int, default=0,
+                        help="keep at most this many medoids per person (0 = all)")
+    parser.add_argument("--drop-outliers", action="store_true",
+                        help="drop encodings closer to another person than their own")
+    parser.add_argument("--precision", choices=PRECISIONS,
+                        help="gallery storage: float16 halves it, int8 quarters it "
+                             "(remembered for later runs; default: the last one "
+                             "asked for, else the current gallery's)")
+    parser.add_argument("--max-changes", type=float, default=MAX_PRECISION_CHANGES,
+                        help="fall back to float32 if more than this fraction of "
+                             "evaluation probes change identity or decision")
+    parser.add_argument("--ann", action="store_true",
+                        help="build an approximate nearest-neighbour index for "
+                             "large galleries (kept up to date by later runs)")
+    parser.add_argument("--ann-lists", type=int, default=None,
+                        help="index lists (default: 4 * sqrt(rows))")
+    parser.add_argument("--no-ann", action="store_true",
+                        help="delete the index; matching goes back to a full scan")
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
+    os.makedirs(ENCODINGS_DIR, exist_ok=True)
+
+    print("[INFO] Starting face encoding process...")
+
+    previous = {}
+    if args.incremental:
+        previous = load_manifest()
+        if previous:
+            print(f"[INFO] Loaded manifest with {len(previous)} images")
+        else:
+            print("[INFO] No usable manifest - encoding everything")
+
+    entries, report = build_manifest(DATASET_DIR, previous, workers)
+    order, previous_order = gallery_order(entries, previous, report)
+
+    print("[INFO] Encoding complete")
+    print_report(report, entries)
+
+    compaction = load_compaction()
+    if args.compact:
+        compaction = {
+            "dedup_threshold": args.dedup_threshold,
+            "prototypes": args.prototypes,
+            "drop_outliers": args.drop_outliers,
+        }
+    elif args.no_compact:
+        compaction = None
+    if compaction is not None:
+        order = apply_compaction(entries, order, compaction)
+    append_only = (previous_order is not None
+                   and order[:len(previous_order)] == previous_order)
+
+    # -----------------------------
+    # Save encodings
+    # -----------------------------
+    # Captures may be appending to the gallery at the same time
+    with gallery_format.locked(ENCODINGS_DIR):
+        build_id = None
+        if append_only:
+            build_id = current_build_id(len(previous_order))
+        precision = args.precision or load_requested_precision()
+        total = save_encodings(entries, order, build_id, precision)
+        save_manifest(entries, order)
+
+        if not enforce_precision(entries, order, args.max_changes):
+            build_id = None
+        elif build_id is not None and current_build_id(len(order)) != build_id:
+            build_id = None     # int8 scales were refitted
+        if args.precision:
+            with open(PRECISION_FILE, "w") as f:
+                json.dump({"precision": args.precision}, f)
+
+        if args.compact:
+            with open(COMPACTION_FILE, "w") as f:
+                json.dump(compaction, f)
+        elif args.no_compact and os.path.exists(COMPACTION_FILE):
+            os.remove(COMPACTION_FILE)
+    print(f"[INFO] Total encodings: {total}")
+    if build_id is not None and len(order) > len(previous_order):
+        print("[INFO] Gallery extended in place (running apps load only new rows)")
+    print(f"[INFO] Encodings saved to: {ENCODINGS_FILE}")
+
+    if args.no_ann:
+        if os.path.exists(ANN_INDEX_FILE):
+            os.remove(ANN_INDEX_FILE)
+            print("[INFO] ANN index removed")
+    elif args.ann or os.path.exists(ANN_INDEX_FILE):
+        update_ann_index(args.ann_lists, force=args.ann)
 
-with open(ENCODINGS_FILE, "wb") as f:
-    pickle.dump(data, f)
 
-print(f"[INFO] Encodings saved to: {ENCODINGS_FILE}")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Enrollment straight from the capture tool.
+
+CaptureEncoder encodes faces on a background thread while
+face_dataset_gui.py is still capturing, and appends them to the gallery
+and manifest under the gallery lock. Rows are added after the existing
+ones with the same build id, so a running attendance app hot-reloads
+just the new rows and the person is recognised seconds after capture.
+
+Appends get the same checks as a full encode_faces.py run: remembered
+compaction settings are applied (dropping a near-duplicate capture, or
+re-ordering rows, which then costs running apps a full reload), and a
+reduced-precision gallery that no longer passes the guardrail is
+rewritten as float32, and an existing ANN index is kept up to date.
+"""
+import os
+import time
+import queue
+import threading
+
+import cv2
+import face_recognition
+
+import encode_faces
+import gallery as gallery_format
+from face_sidecar import sidecar_signature
+
+
+LEGACY_ENCODINGS_FILE = os.path.join(encode_faces.ENCODINGS_DIR, "face_encodings.pickle")
+
+
+class EnrollmentError(RuntimeError):
+    pass
+
+
+def append_encodings(new_entries):
+    """Add {relpath: manifest entry} to the manifest and gallery in one step.
+
+    Returns the gallery's row count. Raises EnrollmentError when the
+    existing gallery has no manifest to extend (a legacy pickle or a
+    gallery from an older encode_faces.py); run encode_faces.py once.
+    """
+    with gallery_format.locked(encode_faces.ENCODINGS_DIR):
+        entries = encode_faces.load_manifest()
+        if not entries and (os.path.exists(encode_faces.ENCODINGS_FILE)
+                            or os.path.exists(LEGACY_ENCODINGS_FILE)):
+            raise EnrollmentError(
+                "existing encodings have no manifest - run encode_faces.py once"
+            )
+
+        order = encode_faces.gallery_rows(entries)
+        existing = list(order)
+        # None when the gallery on disk no longer matches the manifest;
+        # it is then rewritten in full from the manifest
+        build_id = encode_faces.current_build_id(len(order))
+
+        for relpath, entry in new_entries.items():
+            if relpath in order:
+                # A re-capture overwrote an enrolled image: rows move, so
+                # running apps have to do a full reload
+                order.remove(relpath)
+                build_id = None
+            entries[relpath] = entry
+            if entry["encoding"] is not None:
+                order.append(relpath)
+
+        compaction = encode_faces.load_compaction()
+        if compaction is not None:
+            order = encode_faces.apply_compaction(entries, order, compaction)
+            if order[:len(existing)] != existing:
+                build_id = None
+
+        # Gallery first: if we stop in between, the manifest still
+        # describes a prefix of it and the next run rebuilds cleanly
+        total = encode_faces.save_encodings(entries, order, build_id)
+        encode_faces.save_manifest(entries, order)
+        encode_faces.enforce_precision(entries, order)
+        if os.path.exists(encode_faces.ANN_INDEX_FILE):
+            # Rebuilt when the gallery was rewritten or has outgrown it
+            encode_faces.update_ann_index()
+    return total
+
+
+class CaptureEncoder(threading.Thread):
+    """Encodes captured faces while capture continues and commits them in batches"""
+
+    def __init__(self, dataset_dir, commit_interval=1.0):
+        super().__init__(name="CaptureEncoder", daemon=True)
+        self.dataset_dir = dataset_dir
+        self.commit_interval = commit_interval
+        self.encoded = 0
+        self.failed = 0
+        self.committed = 0
+        self.error = None
+        self._pending = queue.Queue()
+        self._batch = {}
+
+    def submit(self, person_name, image_path, frame, frame_box):
+        """Queue one accepted capture.
+
+        `frame` is the BGR camera frame the crop at `image_path` was cut
+        from and `frame_box` the face in it; encoding uses the frame in
+        memory rather than re-reading the JPEG.
+        """
+        self._pending.put((person_name, image_path, frame, frame_box))
+
+    def run(self):
+        last_commit = time.monotonic()
+        while True:
+            try:
+                item = self._pending.get(timeout=self.commit_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                self._encode(*item)
+
+            # Commit once the backlog is drained, at most every interval
+            if (self._batch and self._pending.empty()
+                    and time.monotonic() - last_commit >= self.commit_interval):
+                self._commit()
+                last_commit = time.monotonic()
+        self._commit()
+
+    def _encode(self, person_name, image_path, frame, frame_box):
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        encodings = face_recognition.face_encodings(rgb, [frame_box])
+        st = os.stat(image_path)
+        relpath = os.path.relpath(image_path, self.dataset_dir).replace(os.sep, "/")
+        self._batch[relpath] = {
+            "name": person_name,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sidecar": sidecar_signature(image_path),
+            "sha1": encode_faces.file_sha1(image_path),
+            "encoding": encodings[0] if encodings else None,
+        }
+        if encodings:
+            self.encoded += 1
+        else:
+            self.failed += 1
+
+    def _commit(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, {}
+        try:
+            total = append_encodings(batch)
+        except (EnrollmentError, OSError, ValueError) as e:
+            self.error = str(e)
+            print(f"[WARN] Could not add captures to the gallery: {e}")
+            return
+        self.committed += sum(1 for entry in batch.values() if entry["encoding"] is not None)
+        print(f"[INFO] Added {len(batch)} capture(s) to the gallery ({total} encodings)")
+
+    def finish(self, timeout=None):
+        """Encode and commit everything still queued, then stop"""
+        self._pending.put(None)
+        self.join(timeout)
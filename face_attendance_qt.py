@@ -1,19 +1,34 @@
 import sys
 import cv2
-import pickle
 import os
-import csv
-from datetime import datetime
+import math
+import time
+import argparse
+
+import numpy as np
 
-import face_recognition
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel,
-    QPushButton, QVBoxLayout, QWidget,
+    QPushButton, QVBoxLayout, QGridLayout, QWidget,
     QTableWidget, QTableWidgetItem
 )
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtCore import QTimer, Qt, QCoreApplication
 from PyQt5.QtGui import QImage, QPixmap
 
+from adaptive_scheduler import AdaptiveScheduler
+from ann_index import index_path, load_for
+from attendance_store import AttendanceStore
+from face_matcher import GalleryMatcher
+from face_tracker import FaceTracker
+from frame_source import open_source
+from gallery import open_gallery
+from gallery_watcher import GalleryWatcher
+from motion_gate import MotionGate
+from process_pipeline import ProcessPipeline
+from recognition_client import RemoteRecognizer
+from stage_metrics import StageMetrics, MetricsFileWriter
+from video_pipeline import CameraFeed, FrameGrabber, RecognitionPool
+
 
 # ---------------- CONFIG ----------------
 
@@ -22,44 +37,215 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
-ENCODINGS_PATH = resource_path("encodings/face_encodings.pickle")
+GALLERY_PATH = resource_path("encodings/face_gallery.fgal")
+# Older installs only have the pickle; it is converted on first start
+LEGACY_ENCODINGS_PATH = resource_path("encodings/face_encodings.pickle")
 ATTENDANCE_DIR = resource_path("attendance")
 
 CAMERA_INDEX = 0
-RESIZE_SCALE = 0.5
+# Several cameras are tiled in the preview and share the recognition
+# threads, e.g. ["camera:0", "camera:1"]
+CAMERA_SOURCES = [f"camera:{CAMERA_INDEX}"]
+RECOGNITION_WORKERS = 1     # recognition threads shared by all cameras
+MAX_RECOGNITION_FPS = None  # per-camera cap on recognition passes per second
+RESIZE_SCALE = 0.5          # fixed detection scale; with ADAPTIVE_SCHEDULING, the
+                            # scale used while no face is in view
+MATCH_TOLERANCE = 0.6
 DISPLAY_WIDTH = 960
 DISPLAY_HEIGHT = 540
+DISPLAY_INTERVAL_MS = 15   # GUI poll rate; frames are shown as they arrive
+
+# Qt >= 5.14 can show BGR frames directly; older versions need one RGB conversion
+NATIVE_BGR = hasattr(QImage, "Format_BGR888")
+
+# "hog", "cnn", "haar" or "haar+hog" (Haar proposals, HOG inside their
+# ROIs: faster, but measure its recall on your cameras before switching)
+DETECTOR_BACKEND = "hog"
+FULL_SCAN_INTERVAL = 5.0    # seconds between full-frame HOG scans (haar+hog)
+
+# Track faces between recognition passes and reuse their identity
+TRACKING_ENABLED = True
+IDENTITY_HALF_LIFE = 10.0   # seconds until a cached identity is half as trusted
+
+# Skip detection while nothing moves in front of the camera
+MOTION_GATE_ENABLED = True
+MOTION_WIDTH = 160          # thumbnail width the gate works on
+MOTION_THRESHOLD = 25       # grey-level change that counts as motion
+MOTION_MIN_AREA = 0.002     # fraction of the thumbnail that must change
+MOTION_HOLD = 1.0           # seconds to keep detecting after motion stops
+
+# Latency readout and optional periodic metrics snapshots
+STATUS_INTERVAL = 0.5       # seconds between status bar refreshes
+METRICS_FILE = None         # e.g. "metrics.csv" or "metrics.prom"
+METRICS_FORMAT = "csv"      # "csv" or "prometheus"
+METRICS_INTERVAL = 10.0     # seconds between snapshots
+
+ATTENDANCE_FLUSH_INTERVAL = 1.0   # seconds between batched CSV writes
+
+# Pick up re-runs of encode_faces.py without restarting (None to disable)
+GALLERY_RELOAD_INTERVAL = 2.0     # seconds between checks of the gallery file
+
+# Used when encode_faces.py --ann has built an index next to the gallery
+ANN_INDEX_PATH = index_path(GALLERY_PATH)
+ANN_NPROBE = 8              # lists searched per face: higher = better recall, slower
+
+# Recognise on a shared recognition_service.py instead of in-process, e.g.
+# "http://127.0.0.1:8765"; the kiosk then loads no models and no gallery
+RECOGNITION_SERVICE_URL = None
+SERVICE_TIMEOUT = 2.0       # seconds per request before the frame is given up
+
+# Measure recognition latency and pick each camera's detection scale and
+# recognition rate to fit this budget, instead of a fixed RESIZE_SCALE
+ADAPTIVE_SCHEDULING = True
+TARGET_LATENCY = 0.15       # seconds per recognition pass
+TARGET_RECOGNITION_FPS = 8.0  # per camera, at most
+MAX_RECOGNITION_BUSY = 0.7  # share of recognition time; the rest keeps display smooth
+MIN_FACE_PIXELS = 80        # face width the detector needs at detection scale
+SCALE_RANGE = (0.25, 1.0)   # coarsest and finest detection scale
+SCHEDULER_LOG = False       # print every scheduling decision that changes
+
+# Capture and recognise in separate processes (one core each) sharing
+# frames through shared memory; 0 keeps everything in this process
+RECOGNITION_PROCESSES = 0
+FRAME_RING_SLOTS = 4        # frames in flight; the oldest unclaimed one is dropped
 
-FRAME_SKIP = 5   # 🔴 CRITICAL for macOS stability
+# ---------------------------------------
 
-os.makedirs(ATTENDANCE_DIR, exist_ok=True)
-today = datetime.now().strftime("%Y-%m-%d")
-attendance_file = os.path.join(
-    ATTENDANCE_DIR, f"attendance_{today}.csv"
-)
 
-# ---------------------------------------
+def process_options():
+    """The recogniser settings above, for recognition processes"""
+    return {
+        "gallery": GALLERY_PATH,
+        "legacy_gallery": LEGACY_ENCODINGS_PATH,
+        "index_path": ANN_INDEX_PATH,
+        "nprobe": ANN_NPROBE,
+        "tolerance": MATCH_TOLERANCE,
+        "resize_scale": RESIZE_SCALE,
+        "detector": DETECTOR_BACKEND,
+        "full_scan_interval": FULL_SCAN_INTERVAL,
+        "tracking": TRACKING_ENABLED,
+        "identity_half_life": IDENTITY_HALF_LIFE,
+        "motion_gate": {
+            "width": MOTION_WIDTH,
+            "threshold": MOTION_THRESHOLD,
+            "min_area": MOTION_MIN_AREA,
+            "hold_time": MOTION_HOLD,
+        } if MOTION_GATE_ENABLED else None,
+        "reload_interval": GALLERY_RELOAD_INTERVAL,
+    }
+
+
+def record_path_for(record_path, index):
+    """Recording file of camera `index`; the first camera keeps the name"""
+    if not record_path or index == 0:
+        return record_path
+    root, ext = os.path.splitext(record_path)
+    return f"{root}.cam{index}{ext}"
+
+
+def tile_size(count):
+    """(width, height, columns) of the preview grid for `count` cameras;
+    tiles keep the display's aspect ratio, and frames are letterboxed
+    into them (frame_pyramid.fit_size), never stretched"""
+    cols = math.ceil(math.sqrt(count))
+    return DISPLAY_WIDTH // cols, DISPLAY_HEIGHT // cols, cols
 
 
 class FaceAttendanceApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, sources=None, record_path=None, record_codec="zlib",
+                 replay_speed=1.0, lockstep=False, exit_on_end=False,
+                 service_url=RECOGNITION_SERVICE_URL, processes=RECOGNITION_PROCESSES,
+                 workers=RECOGNITION_WORKERS, max_fps=MAX_RECOGNITION_FPS):
         super().__init__()
+        self.sources = list(sources or CAMERA_SOURCES)
+        self.record_path = record_path
+        self.record_codec = record_codec
+        self.replay_speed = replay_speed
+        self.lockstep = lockstep
+        self.exit_on_end = exit_on_end
+        self.service_url = service_url
+        self.processes = 0 if service_url else processes
+        if self.processes and len(self.sources) > 1:
+            print("[WARN] --processes supports one camera; using the shared "
+                  "recognition threads instead")
+            self.processes = 0
+        self.workers = workers
+        # One cap for every camera, or one per camera
+        if isinstance(max_fps, (list, tuple)):
+            self.max_fps = list(max_fps) + [max_fps[-1]] * (len(self.sources) - len(max_fps))
+        else:
+            self.max_fps = [max_fps] * len(self.sources)
+
         self.setWindowTitle("Face Attendance System")
         self.resize(1000, 750)
 
-        # Load encodings
-        with open(ENCODINGS_PATH, "rb") as f:
-            data = pickle.load(f)
-        self.known_encodings = data["encodings"]
-        self.known_names = data["names"]
+        self.metrics = StageMetrics()
+        self.metrics_writer = None
+        if METRICS_FILE:
+            self.metrics_writer = MetricsFileWriter(
+                self.metrics, METRICS_FILE,
+                fmt=METRICS_FORMAT, interval=METRICS_INTERVAL
+            )
+            self.metrics_writer.start()
+
+        self.gallery = None
+        self.matcher = None
+        self.gallery_watcher = None
+        if not self.service_url and not self.processes:
+            self.load_local_gallery()
+        # One recogniser per camera: each keeps its own tracker and motion
+        # gate, while the gallery and models are shared. Recognition
+        # processes load their own.
+        self.recognizers = [] if self.processes else [
+            self.make_recognizer() for _ in self.sources
+        ]
+
+        # One store for every camera: a person is marked once, wherever seen
+        self.attendance = AttendanceStore(
+            ATTENDANCE_DIR, flush_interval=ATTENDANCE_FLUSH_INTERVAL
+        )
+
+        # Keeps its latency estimates across camera restarts. Lockstep
+        # replays stay at RESIZE_SCALE: decisions from wall-clock latency
+        # would differ from run to run.
+        self.scheduler = None
+        if ADAPTIVE_SCHEDULING and not self.lockstep:
+            self.scheduler = AdaptiveScheduler(
+                target_latency=TARGET_LATENCY,
+                target_fps=TARGET_RECOGNITION_FPS,
+                max_busy=MAX_RECOGNITION_BUSY,
+                min_face_px=MIN_FACE_PIXELS,
+                min_scale=SCALE_RANGE[0],
+                max_scale=SCALE_RANGE[1],
+                search_scale=RESIZE_SCALE,
+                verbose=SCHEDULER_LOG,
+                metrics=self.metrics
+            )
 
-        self.marked_names = set()
-        self.frame_count = 0
+        self.caps = []
+        self.feeds = []
+        self.pool = None
+        self.status_text = ""
+        self.last_status = 0.0
 
         # ---------- UI ----------
-        self.video_label = QLabel()
-        self.video_label.setFixedSize(DISPLAY_WIDTH, DISPLAY_HEIGHT)
-        self.video_label.setStyleSheet("background-color: black;")
+        self.tile_width, self.tile_height, cols = tile_size(len(self.sources))
+        grid = QGridLayout()
+        grid.setSpacing(0)
+        self.video_labels = []
+        self.display_bufs = []
+        for index in range(len(self.sources)):
+            label = QLabel()
+            label.setFixedSize(self.tile_width, self.tile_height)
+            label.setAlignment(Qt.AlignCenter)
+            label.setStyleSheet("background-color: black;")
+            grid.addWidget(label, index // cols, index % cols)
+            self.video_labels.append(label)
+            # Reused for every displayed frame: overlays are drawn here,
+            # never on the shared capture frame. Sized on the first frame,
+            # since a letterboxed frame may be smaller than its tile.
+            self.display_bufs.append(None)
+        self.shown_ids = [(0, 0)] * len(self.sources)
 
         self.status_label = QLabel("Status: Idle")
         self.status_label.setAlignment(Qt.AlignCenter)
@@ -77,7 +263,7 @@ class FaceAttendanceApp(QMainWindow):
         )
 
         layout = QVBoxLayout()
-        layout.addWidget(self.video_label)
+        layout.addLayout(grid)
         layout.addWidget(self.status_label)
         layout.addWidget(self.start_btn)
         layout.addWidget(self.stop_btn)
@@ -87,12 +273,66 @@ class FaceAttendanceApp(QMainWindow):
         container.setLayout(layout)
         self.setCentralWidget(container)
 
+        self.add_attendance_rows(self.attendance.today_rows)
+
         # ---------- Camera ----------
-        self.cap = None
         self.running = False
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
 
+    def load_local_gallery(self):
+        # Load encodings (memory-mapped, read-only)
+        self.gallery = open_gallery(GALLERY_PATH, LEGACY_ENCODINGS_PATH)
+        self.matcher = GalleryMatcher.from_gallery(
+            self.gallery, tolerance=MATCH_TOLERANCE,
+            index=load_for(self.gallery, ANN_INDEX_PATH), nprobe=ANN_NPROBE
+        )
+
+        if GALLERY_RELOAD_INTERVAL:
+            self.gallery_watcher = GalleryWatcher(
+                GALLERY_PATH, self.matcher, self.on_gallery_reload,
+                interval=GALLERY_RELOAD_INTERVAL, metrics=self.metrics,
+                index_path=ANN_INDEX_PATH
+            )
+            self.gallery_watcher.start()
+
+    def make_recognizer(self):
+        if self.service_url:
+            # Tracking and motion gating happen on the service, per camera
+            return RemoteRecognizer(
+                self.service_url, upload_scale=RESIZE_SCALE,
+                timeout=SERVICE_TIMEOUT, metrics=self.metrics
+            )
+
+        # dlib and face_recognition are only imported here, so a kiosk
+        # running against the recognition service never loads them
+        from face_detectors import make_detector
+        from recognition import FaceRecognizer
+
+        tracker = None
+        if TRACKING_ENABLED:
+            tracker = FaceTracker(
+                confidence_half_life=IDENTITY_HALF_LIFE,
+                tolerance=MATCH_TOLERANCE
+            )
+        motion_gate = None
+        if MOTION_GATE_ENABLED:
+            motion_gate = MotionGate(
+                width=MOTION_WIDTH,
+                threshold=MOTION_THRESHOLD,
+                min_area=MOTION_MIN_AREA,
+                hold_time=MOTION_HOLD
+            )
+        return FaceRecognizer(
+            self.matcher, resize_scale=RESIZE_SCALE,
+            detector=make_detector(
+                DETECTOR_BACKEND, full_scan_interval=FULL_SCAN_INTERVAL
+            ),
+            tracker=tracker,
+            motion_gate=motion_gate,
+            metrics=self.metrics
+        )
+
     # ---------- CAMERA CONTROL ----------
     def start_camera(self):
         if self.running:
@@ -100,149 +340,352 @@ class FaceAttendanceApp(QMainWindow):
 
         self.status_label.setText("Status: Opening camera...")
 
-        self.cap = cv2.VideoCapture(
-            CAMERA_INDEX,
-            cv2.CAP_AVFOUNDATION
-        )
-
-        if not self.cap.isOpened():
-            self.status_label.setText("Status: Camera access denied")
-            self.cap = None
+        started = self.start_processes() if self.processes else self.start_threads()
+        if not started:
             return
 
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-
         self.running = True
-        self.frame_count = 0
-        self.timer.start(30)
+        self.shown_ids = [(0, 0)] * len(self.sources)
+        self.timer.start(DISPLAY_INTERVAL_MS)
 
         self.status_label.setText("Status: Camera running")
+        self.status_text = ""
+
+    def start_threads(self):
+        for index, spec in enumerate(self.sources):
+            try:
+                cap = open_source(
+                    spec,
+                    replay_speed=self.replay_speed,
+                    record_path=record_path_for(self.record_path, index),
+                    record_codec=self.record_codec
+                )
+            except (OSError, ValueError) as e:
+                self.release_caps()
+                self.status_label.setText(f"Status: Could not open {spec}: {e}")
+                return False
+            if not cap.isOpened():
+                cap.release()
+                self.release_caps()
+                self.status_label.setText(f"Status: Camera access denied ({spec})")
+                return False
+            self.caps.append(cap)
+
+        for recognizer in self.recognizers:
+            if getattr(recognizer, "tracker", None) is not None:
+                recognizer.tracker.clear()
+            if getattr(recognizer, "motion_gate", None) is not None:
+                recognizer.motion_gate.reset()
+            if self.service_url:
+                recognizer.reset()
+
+        # Capture runs on one thread per camera; recognition on a pool of
+        # threads shared by all of them
+        self.feeds = [
+            CameraFeed(
+                f"cam{index}",
+                FrameGrabber(
+                    cap, metrics=self.metrics,
+                    display_size=(self.tile_width, self.tile_height),
+                    lockstep=self.lockstep
+                ),
+                recognizer,
+                max_fps=self.max_fps[index]
+            )
+            for index, (cap, recognizer) in enumerate(zip(self.caps, self.recognizers))
+        ]
+        self.pool = RecognitionPool(
+            self.feeds, workers=self.workers, on_result=self.on_pool_result,
+            scheduler=self.scheduler
+        )
+        for feed in self.feeds:
+            feed.grabber.start()
+        self.pool.start()
+        return True
+
+    def start_processes(self):
+        # One object plays both the grabber and the recognition pool
+        pipeline = ProcessPipeline(
+            {
+                "spec": self.sources[0],
+                "replay_speed": self.replay_speed,
+                "record_path": self.record_path,
+                "record_codec": self.record_codec,
+            },
+            process_options(),
+            workers=self.processes,
+            slots=FRAME_RING_SLOTS,
+            display_size=(self.tile_width, self.tile_height),
+            lossless=self.lockstep,
+            metrics=self.metrics,
+            on_result=self.on_recognition_result
+        )
+        try:
+            pipeline.start()
+        except OSError as e:
+            self.status_label.setText(f"Status: Could not open {self.sources[0]}: {e}")
+            return False
+        self.pool = pipeline
+        self.feeds = [CameraFeed("cam0", pipeline, None)]
+        return True
+
+    def release_caps(self):
+        for cap in self.caps:
+            cap.release()
+        self.caps = []
 
     def stop_camera(self):
         self.timer.stop()
         self.running = False
 
-        if self.cap:
-            self.cap.release()
-            self.cap = None
+        for thread in [self.pool] + [feed.grabber for feed in self.feeds]:
+            if thread is not None:
+                thread.stop()
+                thread.join(timeout=2.0)
+        self.pool = None
+        self.feeds = []
+        self.release_caps()
 
-        self.video_label.clear()
+        for label in self.video_labels:
+            label.clear()
         self.status_label.setText("Status: Camera stopped")
 
+    def closeEvent(self, event):
+        self.stop_camera()
+        if self.gallery_watcher is not None:
+            self.gallery_watcher.stop()
+        if self.service_url:
+            for recognizer in self.recognizers:
+                recognizer.close()
+        self.attendance.close()
+        if self.metrics_writer is not None:
+            self.metrics_writer.stop()
+            self.metrics_writer.join(timeout=2.0)
+        super().closeEvent(event)
+
     # ---------- MAIN LOOP ----------
+    def on_gallery_reload(self, gallery, matcher, appended):
+        # Called on the watcher thread; the recognisers swap matchers at the
+        # start of their next pass, so no frame is dropped or half-matched
+        for recognizer in self.recognizers:
+            recognizer.swap_matcher(matcher, labels_changed=appended is None)
+        old_gallery, self.gallery = self.gallery, gallery
+        self.matcher = matcher
+        old_gallery.close()
+
+    def on_pool_result(self, feed, frame_id, detections):
+        self.on_recognition_result(frame_id, detections)
+
+    def on_recognition_result(self, frame_id, detections):
+        # Called on a worker thread; the store is thread-safe and the GUI
+        # picks new rows up on its next tick
+        for det in detections:
+            if det.known and not self.attendance.is_marked(det.name):
+                with self.metrics.stage("attendance"):
+                    self.attendance.mark(det.name)
+
     def update_frame(self):
-        if not self.running or self.cap is None:
+        if not self.running or self.pool is None:
             return
 
-        ret, frame = self.cap.read()
-        if not ret:
+        if self.pool.ended:
             self.stop_camera()
+            if self.exit_on_end:
+                QCoreApplication.quit()
             return
 
-        self.frame_count += 1
+        new_rows = self.attendance.take_new_rows()
+        if new_rows:
+            with self.metrics.stage("table"):
+                self.add_attendance_rows(new_rows)
 
-        # 🔴 Only run face recognition every N frames
-        if self.frame_count % FRAME_SKIP == 0:
-            small = cv2.resize(
-                frame, (0, 0),
-                fx=RESIZE_SCALE,
-                fy=RESIZE_SCALE
-            )
+        for index, feed in enumerate(self.feeds):
+            self.update_tile(index, feed)
 
-            rgb_small = cv2.cvtColor(
-                small, cv2.COLOR_BGR2RGB
-            )
+        self.update_status()
 
-            locations = face_recognition.face_locations(rgb_small)
-            encodings = face_recognition.face_encodings(
-                rgb_small, locations
+    def update_tile(self, index, feed):
+        frame_id, pyramid, timestamp = feed.grabber.latest()
+        # Process mode publishes results on the pipeline itself
+        result_id, detections = (self.pool if self.processes else feed).results()
+        if pyramid is None or (frame_id, result_id) == self.shown_ids[index]:
+            return
+        self.shown_ids[index] = (frame_id, result_id)
+        display_buf = self.display_bufs[index]
+        if display_buf is None or display_buf.shape != pyramid.display.shape:
+            display_buf = np.empty(pyramid.display.shape, dtype=np.uint8)
+            self.display_bufs[index] = display_buf
+
+        # Copy (or convert, on old Qt) the display level into our buffer
+        with self.metrics.stage("compose"):
+            if NATIVE_BGR:
+                np.copyto(display_buf, pyramid.display)
+            else:
+                cv2.cvtColor(pyramid.display, cv2.COLOR_BGR2RGB, dst=display_buf)
+
+        draw_start = time.perf_counter()
+        tracker = getattr(feed.recognizer, "tracker", None)
+        if tracker is not None:
+            # Boxes follow each track on every frame, not just recognition ones
+            overlay = [
+                (box, name) for _, box, name, _ in tracker.predict(timestamp)
+            ]
+        else:
+            overlay = [(det.box, det.name) for det in detections]
+
+        # Overlays are drawn at display resolution
+        for box, name in overlay:
+            top, right, bottom, left = pyramid.to_display(box)
+
+            cv2.rectangle(
+                display_buf, (left, top),
+                (right, bottom), (0, 255, 0), 2
             )
 
-            for enc, (top, right, bottom, left) in zip(encodings, locations):
-                matches = face_recognition.compare_faces(
-                    self.known_encodings, enc
-                )
-
-                name = "Unknown"
-
-                if True in matches:
-                    idx = matches.index(True)
-                    name = self.known_names[idx]
-
-                    if name not in self.marked_names:
-                        self.mark_attendance(name)
-                        self.marked_names.add(name)
-
-                # Scale back
-                top = int(top / RESIZE_SCALE)
-                right = int(right / RESIZE_SCALE)
-                bottom = int(bottom / RESIZE_SCALE)
-                left = int(left / RESIZE_SCALE)
-
-                cv2.rectangle(
-                    frame, (left, top),
-                    (right, bottom), (0, 255, 0), 2
-                )
+            cv2.putText(
+                display_buf, name,
+                (left, top - 8),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.55, (0, 255, 0), 2
+            )
+        self.metrics.record("draw", time.perf_counter() - draw_start)
 
-                cv2.putText(
-                    frame, name,
-                    (left, top - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.7, (0, 255, 0), 2
-                )
+        with self.metrics.stage("display"):
+            self.display_frame(self.video_labels[index], display_buf)
+        self.metrics.count("frames_displayed")
 
-        self.display_frame(frame)
+    def update_status(self):
+        now = time.monotonic()
+        if now - self.last_status < STATUS_INTERVAL:
+            return
+        self.last_status = now
+
+        fps = self.metrics.rate("frames_displayed")
+        recog = self.metrics.rate("recognition_passes")
+        text = f"Status: Camera running | {fps:.1f} fps | recog {recog:.1f}/s"
+        gates = [r.motion_gate.state for r in self.recognizers
+                 if getattr(r, "motion_gate", None) is not None]
+        if gates:
+            text += f" | Motion gate: {', '.join(gates)}"
+        if self.service_url:
+            errors = {r.error for r in self.recognizers if r.error}
+            text += f" | Service: {', '.join(sorted(errors)) or 'ok'}"
+            stages = ["capture", "upload_encode", "service", "display"]
+        else:
+            stages = ["capture", "detect", "encode", "match", "display"]
+        if self.processes and self.pool is not None:
+            counters = self.pool.counters()
+            text += (f" | {self.processes} processes: "
+                     f"{counters.get('frames_processed', 0)} recognised, "
+                     f"{counters.get('frames_dropped', 0)} dropped")
+            stages = ["recognize", "pyramid", "display"]
+        elif len(self.feeds) > 1:
+            # Per camera: capture fps, recognition rate, frames waiting
+            cameras = []
+            for feed in self.feeds:
+                capture_fps, passes = feed.rates()
+                cameras.append(f"{feed.name} {capture_fps:.0f} fps, recog "
+                               f"{passes:.1f}/s, waiting {feed.pending}")
+            text += "\n" + " | ".join(cameras)
+        if self.scheduler is not None and not self.processes:
+            text += "\nScheduler: " + self.scheduler.summary()
+        latency = self.metrics.summary(stages)
+        if latency:
+            text += "\n" + latency
+
+        # Only touch the label when the text actually changes
+        if text != self.status_text:
+            self.status_text = text
+            self.status_label.setText(text)
 
     # ---------- DISPLAY ----------
-    def display_frame(self, frame):
-        frame = cv2.resize(
-            frame,
-            (DISPLAY_WIDTH, DISPLAY_HEIGHT),
-            interpolation=cv2.INTER_LINEAR
-        )
-
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb.shape
+    def display_frame(self, label, frame):
+        # `frame` is already display-sized and in the QImage's channel order;
+        # QImage wraps it without copying and the pixmap takes the one copy
+        h, w, ch = frame.shape
 
         img = QImage(
-            rgb.data,
+            frame.data,
             w,
             h,
             ch * w,
-            QImage.Format_RGB888
+            QImage.Format_BGR888 if NATIVE_BGR else QImage.Format_RGB888
         )
 
-        self.video_label.setPixmap(
+        label.setPixmap(
             QPixmap.fromImage(img)
         )
 
     # ---------- ATTENDANCE ----------
-    def mark_attendance(self, name):
-        now = datetime.now()
-        row = self.table.rowCount()
-        self.table.insertRow(row)
-
-        self.table.setItem(row, 0, QTableWidgetItem(name))
-        self.table.setItem(row, 1, QTableWidgetItem(today))
-        self.table.setItem(
-            row, 2,
-            QTableWidgetItem(now.strftime("%H:%M:%S"))
-        )
-
-        write_header = not os.path.exists(attendance_file)
-        with open(attendance_file, "a", newline="") as f:
-            writer = csv.writer(f)
-            if write_header:
-                writer.writerow(["Name", "Date", "Time"])
-            writer.writerow(
-                [name, today, now.strftime("%H:%M:%S")]
-            )
+    def add_attendance_rows(self, rows):
+        # One relayout for the whole batch instead of one per person
+        if not rows:
+            return
+        self.table.setUpdatesEnabled(False)
+        first = self.table.rowCount()
+        self.table.setRowCount(first + len(rows))
+        for offset, (name, date, clock) in enumerate(rows):
+            row = first + offset
+            self.table.setItem(row, 0, QTableWidgetItem(name))
+            self.table.setItem(row, 1, QTableWidgetItem(date))
+            self.table.setItem(row, 2, QTableWidgetItem(clock))
+        self.table.setUpdatesEnabled(True)
 
 
 # ---------- RUN ----------
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Face attendance kiosk")
+    parser.add_argument("--source", action="append", dest="sources",
+                        help="camera:N, replay:FILE.frec or file:VIDEO; repeat "
+                             "for several cameras")
+    parser.add_argument("--record", metavar="FILE.frec",
+                        help="save the session's raw frames for later replay "
+                             "(further cameras go to FILE.camN.frec)")
+    parser.add_argument("--record-codec", default="zlib",
+                        choices=("raw", "zlib", "jpeg"))
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="replay pacing; 0 = as fast as possible")
+    parser.add_argument("--lockstep", action="store_true",
+                        help="recognise every frame instead of dropping stale "
+                             "ones, at the fixed RESIZE_SCALE (deterministic "
+                             "replays)")
+    parser.add_argument("--autostart", action="store_true",
+                        help="start capturing without pressing Start Camera")
+    parser.add_argument("--exit-on-end", action="store_true",
+                        help="quit when a replay or video file runs out")
+    parser.add_argument("--service", metavar="URL", default=RECOGNITION_SERVICE_URL,
+                        help="recognise on a recognition_service.py at URL "
+                             "(e.g. http://127.0.0.1:8765) instead of locally")
+    parser.add_argument("--workers", type=int, default=RECOGNITION_WORKERS,
+                        help="recognition threads shared by all cameras")
+    parser.add_argument("--max-fps", type=float, nargs="+", metavar="FPS",
+                        default=MAX_RECOGNITION_FPS,
+                        help="cap recognition passes per second, one value for "
+                             "every camera or one per --source")
+    parser.add_argument("--processes", type=int, default=RECOGNITION_PROCESSES,
+                        metavar="N",
+                        help="capture in its own process and recognise in N "
+                             "processes (0 = threads in this process)")
+    # Anything we don't know is left for Qt (e.g. -platform offscreen)
+    return parser.parse_known_args(argv)
+
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = FaceAttendanceApp()
+    args, qt_args = parse_args(sys.argv[1:])
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = FaceAttendanceApp(
+        sources=args.sources,
+        record_path=args.record,
+        record_codec=args.record_codec,
+        replay_speed=args.replay_speed,
+        lockstep=args.lockstep,
+        exit_on_end=args.exit_on_end,
+        service_url=args.service,
+        processes=args.processes,
+        workers=args.workers,
+        max_fps=args.max_fps
+    )
     window.show()
+    if args.autostart:
+        window.start_camera()
     sys.exit(app.exec_())
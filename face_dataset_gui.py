@@ -5,6 +5,9 @@ import tkinter as tk
 from tkinter import messagebox
 import sys
 
+from capture_quality import SampleSelector
+from face_sidecar import padded_crop, write_sidecar
+
 # Configuration
 if getattr(sys, 'frozen', False):
     project_dir = os.path.expanduser("~/PycharmProjects/face_detection_project")
@@ -15,6 +18,19 @@ else:
 TOTAL_IMAGES = 20
 CAPTURE_INTERVAL = 1
 
+# "quality" keeps the best, non-repeating face of each window until
+# QUALITY_TARGET samples are in; "interval" saves the first face every
+# CAPTURE_INTERVAL seconds until TOTAL_IMAGES
+CAPTURE_MODE = "quality"
+QUALITY_TARGET = 10
+QUALITY_WINDOW = 0.5        # seconds of frames compared per kept sample
+QUALITY_MAX_FACES = 300     # then fall back to the best faces seen so far
+
+# Add captures to the recognition gallery while capturing (needs
+# face_recognition/dlib); otherwise run encode_faces.py afterwards. Off in
+# the app bundle, which ships without dlib.
+ENROLL_ON_CAPTURE = not getattr(sys, 'frozen', False)
+
 
 class CameraSelectionDialog:
     """Dialog to select which camera to use"""
@@ -481,22 +497,62 @@ class FaceDetectionApp:
                 print(f"  Warming up... {i}/30")
             time.sleep(0.05)
 
+        # Encodes accepted crops while we keep capturing
+        encoder = None
+        if ENROLL_ON_CAPTURE:
+            try:
+                # Only enrollment needs dlib; capturing itself is OpenCV only
+                from enrollment import CaptureEncoder
+            except ImportError as e:
+                print(f"[WARN] Not adding captures to the gallery ({e}); "
+                      f"run encode_faces.py afterwards")
+            else:
+                encoder = CaptureEncoder(DATASET_DIR)
+                encoder.start()
+
         print("\n✓ Camera ready!")
         print("✓ Opening camera window...\n")
         print("Instructions:")
         print("  - Position your face in the frame")
-        print("  - Camera will capture 10 images automatically")
+        quality_mode = CAPTURE_MODE == "quality"
+        target = QUALITY_TARGET if quality_mode else TOTAL_IMAGES
+        interval = QUALITY_WINDOW if quality_mode else CAPTURE_INTERVAL
+        # Only quality mode selects samples; it ends once enough are kept
+        selector = SampleSelector(target=QUALITY_TARGET,
+                                  max_evaluated=QUALITY_MAX_FACES) if quality_mode else None
+
+        print(f"  - Camera will capture {target} images automatically")
+        if quality_mode:
+            print("  - Turn your head a little and vary your expression")
         print("  - Press 'Q' to quit early\n")
 
         images_captured = 0
         last_capture_time = 0
         start_time = time.time()
 
+        def save_sample(source_frame, rect):
+            nonlocal images_captured
+            (x, y, w, h) = rect
+            # Keep a margin around the face and record where it is,
+            # so enrollment can encode it without detecting again
+            face_crop, box, frame_box = padded_crop(source_frame, x, y, w, h)
+            filename = f"{person_name}_{images_captured + 1}.jpg"
+            filepath = os.path.join(person_dir, filename)
+            cv2.imwrite(filepath, face_crop)
+            write_sidecar(filepath, box, frame_box,
+                          (source_frame.shape[1], source_frame.shape[0]))
+            if encoder is not None:
+                encoder.submit(person_name, filepath, source_frame, frame_box)
+            images_captured += 1
+            print(f"✓ Captured image {images_captured}/{target} - saved as {filename}")
+
         window_name = 'Face Capture - Press Q to quit'
         cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
 
         frame_count = 0
-        while images_captured < TOTAL_IMAGES:
+        cancelled = False
+        while not ((selector.done or selector.exhausted) if quality_mode
+                   else images_captured >= target):
             ret, frame = cap.read()
             frame_count += 1
 
@@ -506,6 +562,8 @@ class FaceDetectionApp:
 
             # Flip frame horizontally for mirror effect
             frame = cv2.flip(frame, 1)
+            # Crops come from this copy, without the overlays drawn below
+            clean_frame = frame.copy()
 
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             faces = face_cascade.detectMultiScale(gray, 1.3, 5)
@@ -517,27 +575,35 @@ class FaceDetectionApp:
                             cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
 
             # Status display
-            status_text = f"Captured: {images_captured}/{TOTAL_IMAGES}"
+            status_text = f"Captured: {images_captured}/{target}"
             cv2.putText(frame, status_text, (10, 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
 
             if len(faces) == 0:
                 cv2.putText(frame, "No face detected",
                             (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            elif quality_mode and selector.last_rejection:
+                # Which threshold the last window missed, so the person can fix it
+                cv2.putText(frame, f"Last rejected - {selector.last_rejection}",
+                            (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
 
             cv2.imshow(window_name, frame)
 
-            # Save every second
+            if quality_mode and len(faces) > 0:
+                # The largest face is the person being enrolled
+                selector.offer(clean_frame, gray, max(faces, key=lambda f: f[2] * f[3]))
+
+            # Save once per interval
             current_time = time.time()
-            if current_time - last_capture_time >= CAPTURE_INTERVAL:
-                if len(faces) > 0:
-                    (x, y, w, h) = faces[0]
-                    face_crop = frame[y:y + h, x:x + w]
-                    filename = f"{person_name}_{images_captured + 1}.jpg"
-                    filepath = os.path.join(person_dir, filename)
-                    cv2.imwrite(filepath, face_crop)
-                    images_captured += 1
-                    print(f"✓ Captured image {images_captured}/{TOTAL_IMAGES} - saved as {filename}")
+            if current_time - last_capture_time >= interval:
+                if quality_mode:
+                    candidate = selector.take()
+                    if candidate is not None:
+                        save_sample(candidate.frame, candidate.rect)
+                    elif selector.last_rejection:
+                        print(f"⚠ Rejected: {selector.last_rejection}")
+                elif len(faces) > 0:
+                    save_sample(clean_frame, faces[0])
                 else:
                     print(f"⚠ No face detected at frame {frame_count} - waiting...")
                 last_capture_time = current_time
@@ -546,6 +612,7 @@ class FaceDetectionApp:
             key = cv2.waitKey(1) & 0xFF
             if key == ord('q') or key == ord('Q'):
                 print("\n>>> User pressed Q - cancelling capture")
+                cancelled = True
                 break
 
             # Timeout after 60 seconds
@@ -553,6 +620,16 @@ class FaceDetectionApp:
                 print("\n>>> Timeout (60 seconds) reached")
                 break
 
+        if quality_mode and not selector.done and not cancelled:
+            # Thresholds not met in time: better samples than none at all
+            fallback = selector.fallback()
+            if fallback:
+                print(f"\n⚠ Quality thresholds not met after {selector.evaluated} faces "
+                      f"(last rejected - {selector.last_rejection}); "
+                      f"saving the best {len(fallback)} seen")
+            for candidate in fallback:
+                save_sample(candidate.frame, candidate.rect)
+
         print("\nCleaning up camera...")
         cap.release()
         cv2.destroyAllWindows()
@@ -561,11 +638,27 @@ class FaceDetectionApp:
         for _ in range(10):
             cv2.waitKey(1)
 
+        if quality_mode:
+            print(f"Sample selection: {selector.summary()}")
+
+        if encoder is not None:
+            print("Adding captures to the gallery...")
+            encoder.finish()
+
         print(f"\n{'=' * 50}")
         if images_captured > 0:
+            if encoder is None:
+                gallery_msg = "Run encode_faces.py to add them to the gallery"
+            elif encoder.error:
+                gallery_msg = f"Not added to the gallery:\n{encoder.error}"
+            else:
+                gallery_msg = (f"{encoder.committed} added to the gallery - "
+                               f"recognisable now, no re-encoding needed")
             success_msg = (
                 f"✓ Success!\n\n"
-                f"Captured {images_captured} images\n\n"
+                f"Captured {images_captured} images\n"
+                + (f"({selector.summary()})\n" if quality_mode else "")
+                + f"{gallery_msg}\n\n"
                 f"Saved to:\n{person_dir}/"
             )
             messagebox.showinfo("Capture Complete", success_msg)
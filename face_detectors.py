@@ -0,0 +1,128 @@
+"""Selectable face detection backends for live recognition.
+
+Every detector takes an RGB image and returns face_recognition-style
+(top, right, bottom, left) boxes in that image's pixel coordinates.
+
+    hog       face_recognition HOG on the whole image (previous behaviour)
+    cnn       face_recognition CNN on the whole image (slow without a GPU)
+    haar      OpenCV Haar cascade boxes only
+    haar+hog  Haar proposals, HOG confirms inside padded ROIs around them,
+              with a full HOG scan every `full_scan_interval` seconds
+"""
+import time
+
+import cv2
+import numpy as np
+import face_recognition
+
+from face_tracker import iou
+
+
+HAAR_CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+BACKENDS = ("hog", "cnn", "haar", "haar+hog")
+
+
+class DlibDetector:
+    def __init__(self, model="hog", upsample=1):
+        self.model = model
+        self.upsample = upsample
+
+    def detect(self, rgb, timestamp=None):
+        return face_recognition.face_locations(
+            rgb, number_of_times_to_upsample=self.upsample, model=self.model
+        )
+
+
+class HaarDetector:
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH, scale_factor=1.1,
+                 min_neighbors=4, min_size=(24, 24)):
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise RuntimeError(f"Could not load face cascade: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def proposals(self, rgb):
+        """Raw (x, y, w, h) cascade hits"""
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        gray = cv2.equalizeHist(gray)
+        return self.cascade.detectMultiScale(
+            gray, self.scale_factor, self.min_neighbors, minSize=self.min_size
+        )
+
+    def detect(self, rgb, timestamp=None):
+        return [(int(y), int(x + w), int(y + h), int(x))
+                for (x, y, w, h) in self.proposals(rgb)]
+
+
+class CascadeDetector:
+    """Cheap proposals first, the expensive detector only around them"""
+
+    def __init__(self, proposer, confirmer, roi_pad=0.4, full_scan_interval=5.0):
+        self.proposer = proposer
+        self.confirmer = confirmer
+        self.roi_pad = roi_pad
+        self.full_scan_interval = full_scan_interval
+        self.last_full_scan = None
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def _rois(self, proposals, shape):
+        h, w = shape[:2]
+        rois = []
+        for (x, y, bw, bh) in proposals:
+            px, py = int(bw * self.roi_pad), int(bh * self.roi_pad)
+            roi = [max(0, x - px), max(0, y - py),
+                   min(w, x + bw + px), min(h, y + bh + py)]
+
+            # Merge overlapping ROIs so a face is never confirmed twice
+            for other in rois:
+                if roi[0] < other[2] and other[0] < roi[2] \
+                        and roi[1] < other[3] and other[1] < roi[3]:
+                    other[0] = min(other[0], roi[0])
+                    other[1] = min(other[1], roi[1])
+                    other[2] = max(other[2], roi[2])
+                    other[3] = max(other[3], roi[3])
+                    break
+            else:
+                rois.append(roi)
+        return rois
+
+    def detect(self, rgb, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        # Periodic full scan catches faces the cascade misses (profile, blur)
+        if self.last_full_scan is None \
+                or timestamp - self.last_full_scan >= self.full_scan_interval:
+            self.last_full_scan = timestamp
+            self.full_scans += 1
+            return self.confirmer.detect(rgb, timestamp)
+
+        boxes = []
+        for x0, y0, x1, y1 in self._rois(self.proposer.proposals(rgb), rgb.shape):
+            self.roi_scans += 1
+            # dlib wants a contiguous buffer, not a strided view
+            roi = np.ascontiguousarray(rgb[y0:y1, x0:x1])
+            for top, right, bottom, left in self.confirmer.detect(roi, timestamp):
+                box = (top + y0, right + x0, bottom + y0, left + x0)
+                if all(iou(box, other) < 0.5 for other in boxes):
+                    boxes.append(box)
+        return boxes
+
+
+def make_detector(backend="hog", full_scan_interval=5.0, roi_pad=0.4):
+    if backend == "hog":
+        return DlibDetector("hog")
+    if backend == "cnn":
+        return DlibDetector("cnn")
+    if backend == "haar":
+        return HaarDetector()
+    if backend == "haar+hog":
+        return CascadeDetector(
+            HaarDetector(), DlibDetector("hog"),
+            roi_pad=roi_pad, full_scan_interval=full_scan_interval
+        )
+    raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS}")
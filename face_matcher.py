@@ -0,0 +1,206 @@
+import numpy as np
+
+from ann_index import DEFAULT_NPROBE
+from gallery import intern_names
+from quantization import dequantize
+
+
+DEFAULT_TOLERANCE = 0.6   # same cut-off face_recognition.compare_faces uses
+COMPACT_BLOCK = 16384     # float16/int8 rows widened to float32 per block
+
+
+class MatchResult:
+    """Best identity for one probe encoding"""
+
+    __slots__ = ("name", "label", "distance", "margin")
+
+    def __init__(self, name, label, distance, margin):
+        self.name = name
+        self.label = label
+        self.distance = distance
+        self.margin = margin
+
+    def __repr__(self):
+        return (f"MatchResult(name={self.name!r}, distance={self.distance:.3f}, "
+                f"margin={self.margin:.3f})")
+
+
+class GalleryMatcher:
+    """Nearest-neighbour matcher over all known encodings at once.
+
+    Encodings live in one contiguous float32 matrix with an integer label
+    per row, so every face in a frame is matched with a single matrix
+    product instead of a Python loop over compare_faces.
+
+    float16 and int8 (with per-dimension `scales`) galleries stay in
+    their compact form; distances are computed a block of rows at a
+    time, so memory and bandwidth shrink with the storage.
+
+    With an ann_index.IVFIndex attached, each face is only compared
+    with the rows of its `nprobe` nearest lists (exact distances), which
+    is what keeps very large galleries fast.
+    """
+
+    def __init__(self, embeddings, labels, label_names, tolerance=DEFAULT_TOLERANCE,
+                 build_id=None, sq_norms=None, index=None, nprobe=DEFAULT_NPROBE,
+                 scales=None):
+        embeddings = np.asarray(embeddings)
+        if embeddings.dtype not in (np.float16, np.int8):
+            embeddings = embeddings.astype(np.float32, copy=False)
+        self.embeddings = np.ascontiguousarray(embeddings)
+        self.scales = None if scales is None else np.asarray(scales, dtype=np.float32)
+        self.labels = np.ascontiguousarray(labels, dtype=np.int32)
+        self.label_names = list(label_names)
+        self.tolerance = tolerance
+        self.build_id = build_id
+        self.index = index
+        self.nprobe = nprobe
+
+        if self.embeddings.ndim != 2:
+            self.embeddings = self.embeddings.reshape(len(self.labels), -1)
+        if len(self.embeddings) != len(self.labels):
+            raise ValueError("embeddings and labels must have the same length")
+
+        # |g|^2 is constant per row, so compute it once
+        if sq_norms is None or len(sq_norms) != len(self.labels):
+            sq_norms = self._sq_norms(self.embeddings)
+        self.sq_norms = sq_norms
+
+    def _sq_norms(self, rows):
+        out = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), COMPACT_BLOCK):
+            block = dequantize(rows[start:start + COMPACT_BLOCK], self.scales)
+            out[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+        return out
+
+    def _dot(self, probes, rows=None):
+        """probes @ gallery.T, on the stored rows (or just `rows`)"""
+        embeddings = self.embeddings if rows is None else self.embeddings[rows]
+        if embeddings.dtype == np.float32:
+            return probes @ embeddings.T
+        if self.scales is not None:
+            # (p * s) . q == p . (q * s): scale the probe, not the gallery
+            probes = probes * self.scales
+        out = np.empty((len(probes), len(embeddings)), dtype=np.float32)
+        for start in range(0, len(embeddings), COMPACT_BLOCK):
+            block = embeddings[start:start + COMPACT_BLOCK].astype(np.float32)
+            out[:, start:start + len(block)] = probes @ block.T
+        return out
+
+    @classmethod
+    def from_encodings(cls, encodings, names, tolerance=DEFAULT_TOLERANCE):
+        """Build from the {"encodings": [...], "names": [...]} lists"""
+        labels, label_names = intern_names(names)
+        if len(encodings):
+            embeddings = np.asarray(encodings, dtype=np.float32)
+        else:
+            embeddings = np.empty((0, 128), dtype=np.float32)
+        return cls(embeddings, labels, label_names, tolerance)
+
+    @classmethod
+    def from_gallery(cls, gallery, tolerance=DEFAULT_TOLERANCE, previous=None,
+                     index=None, nprobe=DEFAULT_NPROBE):
+        """Build from a gallery.Gallery; mmap-backed arrays are used in place.
+
+        If `previous` was built from an earlier version of the same gallery
+        (see is_prefix_of), its row norms are reused and only the appended
+        rows are processed.
+        """
+        sq_norms = None
+        if previous is not None and previous.is_prefix_of(gallery):
+            tail = gallery.embeddings[len(previous):]
+            sq_norms = np.concatenate([previous.sq_norms, previous._sq_norms(tail)])
+        return cls(gallery.embeddings, gallery.labels, gallery.label_names, tolerance,
+                   build_id=gallery.build_id, sq_norms=sq_norms,
+                   index=index, nprobe=nprobe, scales=gallery.scales)
+
+    def is_prefix_of(self, gallery):
+        """True if `gallery` is this matcher's gallery with rows appended.
+
+        encode_faces.py keeps the build id only when a run adds rows after
+        the existing ones, so a matching build id means the first len(self)
+        rows, and their labels, are unchanged.
+        """
+        return (self.build_id is not None
+                and gallery.build_id == self.build_id
+                and len(gallery) >= len(self)
+                and gallery.dim == self.embeddings.shape[1]
+                and gallery.embeddings.dtype == self.embeddings.dtype
+                and (gallery.scales is None) == (self.scales is None)
+                and (self.scales is None or np.array_equal(gallery.scales, self.scales))
+                and gallery.label_names[:len(self.label_names)] == self.label_names)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def distances(self, probes):
+        """Euclidean distance matrix, shape (len(probes), len(gallery))"""
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.embeddings.shape[1])
+        p_sq = np.einsum("ij,ij->i", probes, probes)
+        d = self._dot(probes)
+        d *= -2.0
+        d += p_sq[:, None]
+        d += self.sq_norms[None, :]
+        np.maximum(d, 0.0, out=d)
+        return np.sqrt(d, out=d)
+
+    def match(self, probes):
+        """Match every probe in one batch.
+
+        Returns one MatchResult per probe. The margin is the gap between the
+        best distance and the closest row of a *different* person, so a
+        small margin means two enrolled people look alike.
+        """
+        probes = np.asarray(probes, dtype=np.float32)
+        if probes.size == 0:
+            return []
+        probes = probes.reshape(-1, self.embeddings.shape[1])
+
+        if len(self) == 0:
+            return [MatchResult("Unknown", -1, float("inf"), 0.0) for _ in probes]
+
+        if self.index is not None:
+            best_dist, best_label, runner_up = self._search_index(probes)
+        else:
+            d = self.distances(probes)
+            rows = np.arange(len(probes))
+            best_idx = d.argmin(axis=1)
+            best_dist = d[rows, best_idx]
+            best_label = self.labels[best_idx]
+
+            other = np.where(self.labels[None, :] == best_label[:, None], np.inf, d)
+            runner_up = other.min(axis=1)
+
+        results = []
+        for dist, label, second in zip(best_dist, best_label, runner_up):
+            dist = float(dist)
+            margin = float(second - dist) if np.isfinite(second) else float("inf")
+            if dist <= self.tolerance:
+                name = self.label_names[label]
+            else:
+                name = "Unknown"
+                label = -1
+            results.append(MatchResult(name, int(label), dist, margin))
+        return results
+
+    def _search_index(self, probes):
+        """best distance, label and other-person runner-up per probe, over
+        the rows the index shortlists"""
+        best_dist = np.full(len(probes), np.inf, dtype=np.float32)
+        best_label = np.full(len(probes), -1, dtype=np.int32)
+        runner_up = np.full(len(probes), np.inf, dtype=np.float32)
+        for i, probe in enumerate(probes):
+            rows = self.index.candidates(probe, self.nprobe, len(self))
+            if not len(rows):
+                continue
+            d = self.sq_norms[rows] - 2.0 * self._dot(probe[None, :], rows)[0] + probe @ probe
+            np.maximum(d, 0.0, out=d)
+            np.sqrt(d, out=d)
+            j = d.argmin()
+            labels = self.labels[rows]
+            best_dist[i] = d[j]
+            best_label[i] = labels[j]
+            others = d[labels != labels[j]]
+            if len(others):
+                runner_up[i] = others.min()
+        return best_dist, best_label, runner_up
@@ -0,0 +1,85 @@
+"""Face-box sidecars written next to captured dataset images.
+
+face_dataset_gui.py saves each capture as a padded crop plus
+`<image stem>.json`:
+
+    {"version": 1, "box": [top, right, bottom, left],
+     "frame_box": [top, right, bottom, left], "frame_size": [width, height],
+     "detector": "haar"}
+
+`box` is the face inside the saved image, `frame_box` the same face in
+the original camera frame. encode_faces.py hands `box` straight to
+face_encodings instead of running HOG detection on the crop again.
+"""
+import os
+import json
+
+
+SIDECAR_VERSION = 1
+SIDECAR_SUFFIX = ".json"
+CROP_PAD = 0.25     # fraction of the face size kept around it on each side
+
+
+def sidecar_path(image_path):
+    return os.path.splitext(image_path)[0] + SIDECAR_SUFFIX
+
+
+def padded_crop(frame, x, y, w, h, pad=CROP_PAD):
+    """Crop a detector's (x, y, w, h) face with margin.
+
+    Returns (crop, box in the crop, box in the frame); boxes are
+    (top, right, bottom, left) like face_recognition uses.
+    """
+    frame_h, frame_w = frame.shape[:2]
+    x0 = max(0, int(x - w * pad))
+    y0 = max(0, int(y - h * pad))
+    x1 = min(frame_w, int(x + w + w * pad))
+    y1 = min(frame_h, int(y + h + h * pad))
+    crop = frame[y0:y1, x0:x1]
+    frame_box = (max(0, int(y)), min(frame_w, int(x + w)),
+                 min(frame_h, int(y + h)), max(0, int(x)))
+    top, right, bottom, left = frame_box
+    box = (top - y0, right - x0, bottom - y0, left - x0)
+    return crop, box, frame_box
+
+
+def write_sidecar(image_path, box, frame_box=None, frame_size=None, detector="haar"):
+    data = {
+        "version": SIDECAR_VERSION,
+        "box": [int(v) for v in box],
+        "frame_box": [int(v) for v in frame_box] if frame_box is not None else None,
+        "frame_size": list(frame_size) if frame_size is not None else None,
+        "detector": detector,
+    }
+    with open(sidecar_path(image_path), "w") as f:
+        json.dump(data, f)
+
+
+def read_box(image_path, image_shape):
+    """Face box for an image from its sidecar, or None if there is no usable one"""
+    path = sidecar_path(image_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != SIDECAR_VERSION:
+            return None
+        top, right, bottom, left = (int(v) for v in data["box"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    h, w = image_shape[:2]
+    if not (0 <= top < bottom <= h and 0 <= left < right <= w):
+        # Image was edited or resized after capture
+        return None
+    return top, right, bottom, left
+
+
+def sidecar_signature(image_path):
+    """(size, mtime_ns) of the sidecar, or None, for change detection"""
+    try:
+        st = os.stat(sidecar_path(image_path))
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
@@ -0,0 +1,191 @@
+"""Lightweight IoU/centroid face tracker.
+
+Tracks carry their identity between recognition passes, so a face only
+goes back through the encoder when it is new, has moved noticeably since
+it was last encoded, or its identity confidence has decayed. Between
+passes, boxes are extrapolated with a smoothed per-track velocity so the
+overlay follows people on every displayed frame.
+"""
+import math
+import threading
+
+
+def iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top = max(a[0], b[0])
+    right = min(a[1], b[1])
+    bottom = min(a[2], b[2])
+    left = max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    if inter == 0:
+        return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return inter / float(area_a + area_b - inter)
+
+
+def _center(box):
+    top, right, bottom, left = box
+    return (left + right) / 2.0, (top + bottom) / 2.0
+
+
+def _width(box):
+    return max(1, box[1] - box[3])
+
+
+class Track:
+    __slots__ = ("track_id", "box", "velocity", "last_seen", "misses",
+                 "name", "label", "distance", "confidence",
+                 "encoded_at", "encoded_box")
+
+    def __init__(self, track_id, box, timestamp):
+        self.track_id = track_id
+        self.box = box
+        self.velocity = (0.0, 0.0, 0.0, 0.0)
+        self.last_seen = timestamp
+        self.misses = 0
+        self.name = "Unknown"
+        self.label = -1
+        self.distance = float("inf")
+        self.confidence = 0.0
+        self.encoded_at = None
+        self.encoded_box = None
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_center_shift=0.5, max_misses=3,
+                 drift_threshold=0.35, confidence_half_life=10.0,
+                 min_confidence=0.25, unknown_retry=1.0, max_predict=0.5,
+                 tolerance=0.6, confidence_margin=0.15):
+        self.iou_threshold = iou_threshold
+        self.max_center_shift = max_center_shift   # fraction of box width
+        self.max_misses = max_misses
+        self.drift_threshold = drift_threshold     # fraction of box width
+        self.confidence_half_life = confidence_half_life
+        self.min_confidence = min_confidence
+        self.unknown_retry = unknown_retry
+        self.max_predict = max_predict
+        self.tolerance = tolerance
+        # Matches up to tolerance - margin start fully trusted; same-person
+        # dlib distances are often 0.35-0.5, so a plain 1 - d/tolerance
+        # would leave many people below min_confidence from the start
+        self.confidence_margin = confidence_margin
+
+        self.lock = threading.Lock()
+        self.tracks = []
+        self._next_id = 1
+
+    # ---------- ASSOCIATION ----------
+    def _associate(self, boxes):
+        """Greedy best-first matching on IoU, centroid distance as tie-break"""
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            cx, cy = _center(track.box)
+            limit = self.max_center_shift * _width(track.box)
+            for bi, box in enumerate(boxes):
+                overlap = iou(track.box, box)
+                bx, by = _center(box)
+                shift = math.hypot(bx - cx, by - cy)
+                if overlap >= self.iou_threshold or shift <= limit:
+                    pairs.append((overlap, -shift, ti, bi))
+
+        pairs.sort(reverse=True)
+        matched_tracks = set()
+        matched_boxes = set()
+        matches = []
+        for _, _, ti, bi in pairs:
+            if ti in matched_tracks or bi in matched_boxes:
+                continue
+            matched_tracks.add(ti)
+            matched_boxes.add(bi)
+            matches.append((ti, bi))
+        return matches, matched_tracks, matched_boxes
+
+    def update(self, boxes, timestamp):
+        """Feed the boxes of one detection pass; returns the live tracks"""
+        with self.lock:
+            matches, matched_tracks, matched_boxes = self._associate(boxes)
+
+            for ti, bi in matches:
+                track = self.tracks[ti]
+                dt = timestamp - track.last_seen
+                if dt > 0:
+                    # Exponentially smoothed velocity, pixels per second
+                    track.velocity = tuple(
+                        0.5 * v + 0.5 * (new - old) / dt
+                        for v, new, old in zip(track.velocity, boxes[bi], track.box)
+                    )
+                track.box = tuple(boxes[bi])
+                track.last_seen = timestamp
+                track.misses = 0
+
+            survivors = []
+            for ti, track in enumerate(self.tracks):
+                if ti not in matched_tracks:
+                    track.misses += 1
+                    if track.misses > self.max_misses:
+                        continue
+                survivors.append(track)
+            self.tracks = survivors
+
+            for bi, box in enumerate(boxes):
+                if bi not in matched_boxes:
+                    self.tracks.append(Track(self._next_id, tuple(box), timestamp))
+                    self._next_id += 1
+
+            return [t for t in self.tracks if t.misses == 0]
+
+    # ---------- IDENTITY CACHE ----------
+    def current_confidence(self, track, timestamp):
+        if track.encoded_at is None:
+            return 0.0
+        age = timestamp - track.encoded_at
+        return track.confidence * 0.5 ** (age / self.confidence_half_life)
+
+    def initial_confidence(self, distance):
+        """1.0 up to tolerance - margin, falling to 0.5 at the tolerance"""
+        margin = max(self.confidence_margin, 1e-6)
+        excess = (distance - (self.tolerance - margin)) / margin
+        return 1.0 - 0.5 * min(1.0, max(0.0, excess))
+
+    def needs_encoding(self, track, timestamp):
+        if track.encoded_at is None:
+            return True
+
+        ex, ey = _center(track.encoded_box)
+        cx, cy = _center(track.box)
+        if math.hypot(cx - ex, cy - ey) > self.drift_threshold * _width(track.encoded_box):
+            return True
+
+        if track.label < 0:
+            return timestamp - track.encoded_at >= self.unknown_retry
+        return self.current_confidence(track, timestamp) < self.min_confidence
+
+    def set_identity(self, track, match, timestamp):
+        with self.lock:
+            track.encoded_at = timestamp
+            track.encoded_box = track.box
+            track.distance = match.distance
+            if match.label >= 0:
+                track.name = match.name
+                track.label = match.label
+                track.confidence = self.initial_confidence(match.distance)
+            else:
+                track.name = "Unknown"
+                track.label = -1
+                track.confidence = 0.0
+
+    # ---------- DISPLAY ----------
+    def predict(self, timestamp):
+        """[(track_id, box, name, known)] extrapolated to `timestamp`"""
+        with self.lock:
+            out = []
+            for track in self.tracks:
+                dt = min(max(0.0, timestamp - track.last_seen), self.max_predict)
+                box = tuple(int(c + v * dt) for c, v in zip(track.box, track.velocity))
+                out.append((track.track_id, box, track.name, track.label >= 0))
+            return out
+
+    def clear(self):
+        with self.lock:
+            self.tracks = []
@@ -0,0 +1,71 @@
+import cv2
+
+
+def fit_size(shape, box):
+    """Largest (width, height) with the aspect ratio of a frame of `shape`
+    that fits in `box`, so a display level is never stretched"""
+    h, w = shape[:2]
+    scale = min(box[0] / float(w), box[1] / float(h))
+    return max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+
+
+class FramePyramid:
+    """A captured frame plus its display-size copy, built once per frame.
+
+    The capture thread builds this, the GUI shows `display` as-is (BGR)
+    and the recognition worker downsizes from whichever level is closest
+    to its detection scale, so a frame is resized from full resolution
+    only once no matter how many consumers it has.
+    """
+
+    __slots__ = ("full", "display", "scale_x", "scale_y", "shared_scale")
+
+    def __init__(self, full, display_size=None):
+        self.full = full
+        h, w = full.shape[:2]
+        if display_size is None or display_size == (w, h):
+            self.display = full
+            self.scale_x = self.scale_y = 1.0
+        else:
+            self.display = cv2.resize(full, display_size, interpolation=cv2.INTER_LINEAR)
+            self.scale_x = display_size[0] / float(w)
+            self.scale_y = display_size[1] / float(h)
+
+        # The display level can only feed detection if it is not stretched
+        # (or enlarged: detecting on an upscaled copy only costs time)
+        if abs(self.scale_x - self.scale_y) < 0.01 and self.scale_x <= 1.0:
+            self.shared_scale = self.scale_x
+        else:
+            self.shared_scale = None
+
+    @classmethod
+    def from_level(cls, image, scale):
+        """A pyramid holding only a `scale`-sized copy of a frame that is
+        not at hand itself (e.g. an uploaded, already downscaled frame);
+        recognisers given it still work in full-frame coordinates"""
+        pyramid = cls.__new__(cls)
+        pyramid.full = None
+        pyramid.display = image
+        pyramid.scale_x = pyramid.scale_y = pyramid.shared_scale = scale
+        return pyramid
+
+    @property
+    def shape(self):
+        if self.full is None:
+            h, w = self.display.shape[:2]
+            return (int(round(h / self.scale_y)), int(round(w / self.scale_x))) \
+                + self.display.shape[2:]
+        return self.full.shape
+
+    def base_for(self, scale):
+        """(image, image_scale) of the smallest level at least `scale` large"""
+        if self.full is None or \
+                (self.shared_scale is not None and scale <= self.shared_scale):
+            return self.display, self.shared_scale
+        return self.full, 1.0
+
+    def to_display(self, box):
+        """Full-frame (top, right, bottom, left) box -> display pixels"""
+        top, right, bottom, left = box
+        return (int(top * self.scale_y), int(right * self.scale_x),
+                int(bottom * self.scale_y), int(left * self.scale_x))
@@ -0,0 +1,197 @@
+"""Fixed-size ring of frames in shared memory, for multi-process recognition.
+
+One capture process writes frames into the ring; recognition processes
+claim a slot, read it in place (no copy, no pickling) and release it. The
+ring never grows: when the writer needs a slot and none is free, the
+oldest frame nobody has claimed yet is overwritten and counted as
+dropped. Only when every slot is being read does the writer wait
+(back-pressure). With `lossless`, nothing is dropped: the writer waits for
+a free slot and readers take frames oldest first, for deterministic
+replays.
+
+Slot states, counters and the frames themselves all live in the shared
+block; a multiprocessing.Condition created by the parent before the
+processes start guards the state changes. The display copy in the parent
+takes no lock: each slot carries a sequence number that is odd while it
+is being written, so a copy that raced a write is detected and skipped.
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+FREE, WRITING, READY, READING = 0, 1, 2, 3
+
+# Header counters (int64)
+_WRITTEN, _DROPPED, _PROCESSED, _ENDED, _NEXT_ID = range(5)
+_HEADER_FIELDS = 8
+# Per-slot fields (int64)
+_STATE, _FRAME_ID, _SEQ = range(3)
+_SLOT_FIELDS = 4
+
+
+def _layout(slots, shape):
+    header = _HEADER_FIELDS * 8
+    meta = slots * _SLOT_FIELDS * 8
+    stamps = slots * 8
+    frames_offset = -(-(header + meta + stamps) // 64) * 64
+    return header, meta, stamps, frames_offset, frames_offset + slots * int(np.prod(shape))
+
+
+class FrameRing:
+    """`slots` uint8 frames of `shape` in one shared memory block.
+
+    Create it with create=True in the writing process and attach to it
+    by name (FrameRing(name=..., ...)) everywhere else; `cond` must be the
+    same multiprocessing.Condition in every process.
+    """
+
+    def __init__(self, shape, slots, cond, name=None, create=False, lossless=False):
+        self.shape = tuple(int(s) for s in shape)
+        self.slots = int(slots)
+        self.cond = cond
+        self.lossless = lossless
+        header, meta, stamps, frames_offset, size = _layout(self.slots, self.shape)
+
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.name = self.shm.name
+        buf = self.shm.buf
+        self.header = np.ndarray((_HEADER_FIELDS,), np.int64, buf, 0)
+        self.meta = np.ndarray((self.slots, _SLOT_FIELDS), np.int64, buf, header)
+        self.stamps = np.ndarray((self.slots,), np.float64, buf, header + meta)
+        self.frames = np.ndarray((self.slots,) + self.shape, np.uint8, buf, frames_offset)
+        if create:
+            self.header[:] = 0
+            self.meta[:] = 0
+            self.header[_NEXT_ID] = 1
+
+    # ---------- writer ----------
+    def _free_slot(self):
+        """A slot to write into, or None (caller holds the lock)"""
+        states = self.meta[:, _STATE]
+        free = np.flatnonzero(states == FREE)
+        if len(free):
+            return int(free[0])
+        if self.lossless:
+            return None
+        ready = np.flatnonzero(states == READY)
+        if not len(ready):
+            return None
+        # Nobody took the oldest waiting frame - it is stale now
+        slot = int(ready[self.meta[ready, _FRAME_ID].argmin()])
+        self.header[_DROPPED] += 1
+        return slot
+
+    def write(self, frame, timestamp, should_stop=None, timeout=0.1):
+        """Copy `frame` into the ring; returns its frame id, or None if
+        `should_stop()` turned true while waiting for a slot"""
+        with self.cond:
+            while True:
+                slot = self._free_slot()
+                if slot is not None:
+                    break
+                if should_stop is not None and should_stop():
+                    return None
+                self.cond.wait(timeout)
+            self.meta[slot, _STATE] = WRITING
+            self.meta[slot, _SEQ] += 1
+
+        np.copyto(self.frames[slot], frame)
+
+        with self.cond:
+            frame_id = int(self.header[_NEXT_ID])
+            self.header[_NEXT_ID] += 1
+            self.header[_WRITTEN] += 1
+            self.meta[slot, _FRAME_ID] = frame_id
+            self.stamps[slot] = timestamp
+            self.meta[slot, _SEQ] += 1
+            self.meta[slot, _STATE] = READY
+            self.cond.notify_all()
+        return frame_id
+
+    def mark_ended(self):
+        with self.cond:
+            self.header[_ENDED] = 1
+            self.cond.notify_all()
+
+    # ---------- readers ----------
+    def claim(self, timeout=0.5):
+        """(slot, frame_id, timestamp, frame view) of the next frame to
+        recognise, or None on timeout/end. The view is only valid until
+        release(slot)."""
+        with self.cond:
+            ready = self._ready()
+            if not len(ready) and not self.header[_ENDED]:
+                self.cond.wait(timeout)
+                ready = self._ready()
+            if not len(ready):
+                return None
+
+            ids = self.meta[ready, _FRAME_ID]
+            if self.lossless:
+                slot = int(ready[ids.argmin()])
+            else:
+                # Take the newest; older waiting frames are superseded
+                slot = int(ready[ids.argmax()])
+                for stale in ready[ids < ids.max()]:
+                    self.meta[stale, _STATE] = FREE
+                    self.header[_DROPPED] += 1
+            self.meta[slot, _STATE] = READING
+            frame_id = int(self.meta[slot, _FRAME_ID])
+            timestamp = float(self.stamps[slot])
+            self.cond.notify_all()
+        return slot, frame_id, timestamp, self.frames[slot]
+
+    def release(self, slot):
+        with self.cond:
+            self.meta[slot, _STATE] = FREE
+            self.header[_PROCESSED] += 1
+            self.cond.notify_all()
+
+    def _ready(self):
+        return np.flatnonzero(self.meta[:, _STATE] == READY)
+
+    def latest_copy(self, out, after_id=0):
+        """Copy the newest complete frame newer than `after_id` into `out`;
+        returns (frame_id, timestamp) or None. Takes no lock."""
+        states = self.meta[:, _STATE]
+        ids = np.where((states == READY) | (states == READING), self.meta[:, _FRAME_ID], 0)
+        slot = int(ids.argmax())
+        frame_id = int(ids[slot])
+        if frame_id <= after_id:
+            return None
+        seq = int(self.meta[slot, _SEQ])
+        if seq & 1:
+            return None
+        timestamp = float(self.stamps[slot])
+        np.copyto(out, self.frames[slot])
+        # Overwritten while we copied: skip it, the next tick gets a newer one
+        if int(self.meta[slot, _SEQ]) != seq or int(self.meta[slot, _FRAME_ID]) != frame_id:
+            return None
+        return frame_id, timestamp
+
+    # ---------- state ----------
+    @property
+    def ended(self):
+        return bool(self.header[_ENDED])
+
+    @property
+    def drained(self):
+        """The writer has ended and every frame has been taken"""
+        with self.cond:
+            states = self.meta[:, _STATE]
+            return bool(self.header[_ENDED]) and not ((states == READY) | (states == READING)).any()
+
+    def counters(self):
+        return {
+            "frames_written": int(self.header[_WRITTEN]),
+            "frames_dropped": int(self.header[_DROPPED]),
+            "frames_processed": int(self.header[_PROCESSED]),
+        }
+
+    def close(self, unlink=False):
+        # numpy views must go before the mapping can be closed
+        self.header = self.meta = self.stamps = self.frames = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
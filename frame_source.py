@@ -0,0 +1,254 @@
+"""Frame sources for the attendance app: camera, recorder and replayer.
+
+All sources look like a cv2.VideoCapture to the rest of the app
+(isOpened / read / release) and also expose `timestamp`, the capture
+time of the last frame in seconds. A replayed session reports the
+original timestamps, so tracking and motion gating behave exactly as
+they did live, even when replaying faster than real time.
+
+Recording format (.frec), little-endian:
+
+    header  b"FREC", u16 version, u8 codec, u8 reserved
+    frame   f64 timestamp, u32 height, u32 width, u8 channels,
+            u32 payload length, payload
+
+codec 0 stores raw pixels, 1 zlib-compressed pixels (lossless, default),
+2 JPEG (lossy but much smaller).
+
+    python face_attendance_qt.py --source camera:0 --record rush.frec
+    QT_QPA_PLATFORM=offscreen python face_attendance_qt.py \\
+        --source replay:rush.frec --replay-speed 0 --autostart --exit-on-end
+"""
+import sys
+import time
+import zlib
+import queue
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+
+MAGIC = b"FREC"
+FORMAT_VERSION = 1
+FILE_HEADER = "<4sHBB"
+FRAME_HEADER = "<dIIBI"
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_JPEG = 2
+CODECS = {"raw": CODEC_RAW, "zlib": CODEC_ZLIB, "jpeg": CODEC_JPEG}
+
+
+class CameraSource:
+    """A live camera; AVFoundation on macOS, the default backend elsewhere"""
+
+    def __init__(self, index=0, width=1280, height=720):
+        backend = cv2.CAP_AVFOUNDATION if sys.platform == "darwin" else cv2.CAP_ANY
+        self.cap = cv2.VideoCapture(index, backend)
+        if self.cap.isOpened():
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.timestamp = 0.0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        ret, frame = self.cap.read()
+        self.timestamp = time.monotonic()
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(CameraSource):
+    """A video file, timestamped by its own position"""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        self.timestamp = 0.0
+
+    def read(self):
+        ret, frame = self.cap.read()
+        self.timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        return ret, frame
+
+
+# -----------------------------
+# Recording
+# -----------------------------
+def encode_frame(frame, codec, jpeg_quality=90):
+    if codec == CODEC_RAW:
+        return frame.tobytes()
+    if codec == CODEC_ZLIB:
+        return zlib.compress(frame.tobytes(), 1)
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def decode_frame(payload, codec, height, width, channels):
+    if codec == CODEC_JPEG:
+        return cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+    if codec == CODEC_ZLIB:
+        payload = zlib.decompress(payload)
+    return np.frombuffer(payload, np.uint8).reshape(height, width, channels)
+
+
+class RecordingSource:
+    """Wraps another source and writes every frame it returns to a .frec file.
+
+    Compression and disk I/O happen on a writer thread; the bounded queue
+    applies back-pressure rather than silently dropping frames, so the
+    recording is complete.
+    """
+
+    def __init__(self, inner, path, codec="zlib", max_pending=64):
+        self.inner = inner
+        self.path = path
+        self.codec = CODECS[codec]
+        self.frames_written = 0
+        self.timestamp = 0.0
+        self._start = None
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._file = open(path, "wb")
+        self._file.write(struct.pack(FILE_HEADER, MAGIC, FORMAT_VERSION, self.codec, 0))
+        self._writer = threading.Thread(target=self._run, name="FrameRecorder", daemon=True)
+        self._writer.start()
+
+    def isOpened(self):
+        return self.inner.isOpened()
+
+    def read(self):
+        ret, frame = self.inner.read()
+        self.timestamp = getattr(self.inner, "timestamp", time.monotonic())
+        if ret:
+            if self._start is None:
+                self._start = self.timestamp
+            self._pending.put((self.timestamp - self._start, frame))
+        return ret, frame
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            ts, frame = item
+            if frame.ndim == 2:
+                frame = frame[:, :, None]
+            h, w, c = frame.shape
+            payload = encode_frame(np.ascontiguousarray(frame), self.codec)
+            self._file.write(struct.pack(FRAME_HEADER, ts, h, w, c, len(payload)))
+            self._file.write(payload)
+            self.frames_written += 1
+
+    def release(self):
+        self.inner.release()
+        if self._file is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._file.close()
+            self._file = None
+
+
+# -----------------------------
+# Replay
+# -----------------------------
+class ReplaySource:
+    """Plays a .frec recording back.
+
+    speed=1.0 paces frames at their original intervals, speed=2.0 twice as
+    fast, speed=0 as fast as the consumer reads.
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.timestamp = 0.0
+        self.frames_read = 0
+        self._file = open(path, "rb")
+        magic, version, codec, _ = struct.unpack(
+            FILE_HEADER, self._file.read(struct.calcsize(FILE_HEADER))
+        )
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._file.close()
+            raise ValueError(f"{path}: not a frame recording")
+        self.codec = codec
+        self._data_start = self._file.tell()
+        self._wall_start = None
+        self._loop_offset = 0.0
+
+    def isOpened(self):
+        return self._file is not None
+
+    def _next_record(self):
+        header = self._file.read(struct.calcsize(FRAME_HEADER))
+        if len(header) < struct.calcsize(FRAME_HEADER):
+            return None
+        ts, h, w, c, length = struct.unpack(FRAME_HEADER, header)
+        payload = self._file.read(length)
+        if len(payload) < length:
+            # Recording was cut off mid-frame
+            return None
+        return ts, decode_frame(payload, self.codec, h, w, c)
+
+    def read(self):
+        if self._file is None:
+            return False, None
+
+        record = self._next_record()
+        if record is None and self.loop and self.frames_read:
+            self._loop_offset = self.timestamp
+            self._file.seek(self._data_start)
+            record = self._next_record()
+        if record is None:
+            return False, None
+
+        ts, frame = record
+        self.timestamp = ts + self._loop_offset
+        self.frames_read += 1
+
+        if self.speed > 0:
+            now = time.monotonic()
+            if self._wall_start is None:
+                self._wall_start = now - self.timestamp / self.speed
+            delay = self._wall_start + self.timestamp / self.speed - now
+            if delay > 0:
+                time.sleep(delay)
+        return True, frame
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def open_source(spec, replay_speed=1.0, record_path=None, record_codec="zlib"):
+    """Build a source from "camera:N", "replay:PATH", "file:PATH" or a bare
+    camera index / .frec path / video path, optionally wrapped in a recorder"""
+    kind, _, value = spec.partition(":") if ":" in spec else ("", "", spec)
+    if not kind:
+        if value.isdigit():
+            kind = "camera"
+        elif value.endswith(".frec"):
+            kind = "replay"
+        else:
+            kind = "file"
+
+    if kind == "camera":
+        source = CameraSource(int(value or 0))
+    elif kind == "replay":
+        source = ReplaySource(value, speed=replay_speed)
+    elif kind == "file":
+        source = VideoFileSource(value)
+    else:
+        raise ValueError(f"Unknown frame source {spec!r}")
+
+    if record_path and source.isOpened():
+        source = RecordingSource(source, record_path, codec=record_codec)
+    return source
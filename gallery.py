@@ -0,0 +1,312 @@
+"""Binary face gallery format.
+
+Layout (little-endian):
+
+    header      64 bytes, see HEADER_FORMAT
+    name table  per name: u32 byte length + UTF-8 bytes
+    labels      int32[n_rows], index into the name table
+    scales      float32[dim], int8 galleries only
+    embeddings  float32, float16 or int8 [n_rows, dim], 64-byte aligned
+
+int8 rows are stored as round(x / scales) per dimension (see
+quantization.py). The embeddings block is contiguous, so the attendance app can mmap it
+read-only and hand it straight to the matcher without unpickling or
+copying.
+"""
+import os
+import sys
+import mmap
+import struct
+import pickle
+import argparse
+import contextlib
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:     # Windows: writers are not expected to overlap there
+    fcntl = None
+
+
+MAGIC = b"FGAL"
+FORMAT_VERSION = 1
+
+# magic, version, dtype code, reserved, dim, n_rows, n_names, build id,
+# names offset, labels offset, embeddings offset, scales offset (0 = none;
+# this used to be header padding, so older float32 files read unchanged)
+HEADER_FORMAT = "<4sHBBIQI8sQQQQ"
+HEADER_SIZE = 64
+
+DTYPE_FLOAT32 = 1
+DTYPE_FLOAT16 = 2
+DTYPE_INT8 = 3
+DTYPES = {DTYPE_FLOAT32: np.float32, DTYPE_FLOAT16: np.float16, DTYPE_INT8: np.int8}
+DTYPE_CODES = {np.dtype(dtype): code for code, dtype in DTYPES.items()}
+
+EMBEDDING_ALIGN = 64
+
+
+class GalleryFormatError(ValueError):
+    pass
+
+
+class Gallery:
+    """Embeddings, integer labels and the interned name table"""
+
+    def __init__(self, embeddings, labels, label_names, build_id=None, source=None,
+                 scales=None):
+        self.embeddings = embeddings
+        self.labels = labels
+        self.label_names = list(label_names)
+        self.build_id = build_id if build_id is not None else os.urandom(8)
+        self.source = source
+        self.scales = scales
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1]
+
+    @property
+    def precision(self):
+        return np.dtype(self.embeddings.dtype).name
+
+    @property
+    def names(self):
+        """Per-row names, like the old pickle's "names" list"""
+        return [self.label_names[label] for label in self.labels]
+
+    def close(self):
+        if self._mmap is not None:
+            self.embeddings = self.labels = self.scales = None
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A matcher still holds views into the map; it is released
+                # once those arrays are garbage collected
+                pass
+            self._mmap = None
+
+
+def intern_names(names):
+    """Map per-row names to (int32 labels, unique names in first-seen order)"""
+    label_names = []
+    index = {}
+    labels = np.empty(len(names), dtype=np.int32)
+    for i, name in enumerate(names):
+        if name not in index:
+            index[name] = len(label_names)
+            label_names.append(name)
+        labels[i] = index[name]
+    return labels, label_names
+
+
+def from_encodings(encodings, names):
+    labels, label_names = intern_names(names)
+    if len(encodings):
+        embeddings = np.asarray(encodings, dtype=np.float32)
+    else:
+        embeddings = np.empty((0, 128), dtype=np.float32)
+    return Gallery(embeddings, labels, label_names)
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def save_gallery(path, gallery):
+    """Write `gallery` to `path` atomically (temp file + rename)"""
+    embeddings = np.asarray(gallery.embeddings)
+    if embeddings.dtype not in DTYPE_CODES:
+        embeddings = embeddings.astype(np.float32)
+    embeddings = np.ascontiguousarray(embeddings)
+    dtype_code = DTYPE_CODES[embeddings.dtype]
+    labels = np.ascontiguousarray(gallery.labels, dtype="<i4")
+    n_rows, dim = embeddings.shape
+    if len(labels) != n_rows:
+        raise GalleryFormatError("embeddings and labels must have the same length")
+    scales = b""
+    if dtype_code == DTYPE_INT8:
+        if gallery.scales is None:
+            raise GalleryFormatError("int8 galleries need per-dimension scales")
+        scales = np.asarray(gallery.scales, dtype="<f4").tobytes()
+
+    name_table = b"".join(
+        struct.pack("<I", len(encoded)) + encoded
+        for encoded in (name.encode("utf-8") for name in gallery.label_names)
+    )
+
+    names_offset = HEADER_SIZE
+    labels_offset = _align(names_offset + len(name_table), 8)
+    scales_offset = _align(labels_offset + labels.nbytes, 8) if scales else 0
+    embeddings_offset = _align(
+        (scales_offset + len(scales)) if scales else labels_offset + labels.nbytes,
+        EMBEDDING_ALIGN
+    )
+
+    header = struct.pack(
+        HEADER_FORMAT, MAGIC, FORMAT_VERSION, dtype_code, 0,
+        dim, n_rows, len(gallery.label_names), gallery.build_id,
+        names_offset, labels_offset, embeddings_offset, scales_offset,
+    ).ljust(HEADER_SIZE, b"\0")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(name_table)
+        f.write(b"\0" * (labels_offset - names_offset - len(name_table)))
+        f.write(labels.tobytes())
+        offset = labels_offset + labels.nbytes
+        if scales:
+            f.write(b"\0" * (scales_offset - offset))
+            f.write(scales)
+            offset = scales_offset + len(scales)
+        f.write(b"\0" * (embeddings_offset - offset))
+        f.write(embeddings.astype(embeddings.dtype.newbyteorder("<"), copy=False).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_gallery(path, use_mmap=True):
+    """Open a gallery file; with use_mmap the arrays are read-only views"""
+    with open(path, "rb") as f:
+        if use_mmap:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+
+    try:
+        gallery = _parse(buf, path)
+    except Exception:
+        if use_mmap:
+            buf.close()
+        raise
+
+    if use_mmap:
+        gallery._mmap = buf
+    return gallery
+
+
+def _parse(buf, path):
+    if len(buf) < HEADER_SIZE:
+        raise GalleryFormatError(f"{path}: file too small")
+
+    (magic, version, dtype_code, _, dim, n_rows, n_names, build_id,
+     names_offset, labels_offset, embeddings_offset,
+     scales_offset) = struct.unpack_from(HEADER_FORMAT, buf, 0)
+
+    if magic != MAGIC:
+        raise GalleryFormatError(f"{path}: not a gallery file")
+    if version != FORMAT_VERSION:
+        raise GalleryFormatError(f"{path}: unsupported gallery version {version}")
+    if dtype_code not in DTYPES:
+        raise GalleryFormatError(f"{path}: unknown embedding dtype {dtype_code}")
+
+    dtype = np.dtype(DTYPES[dtype_code]).newbyteorder("<")
+    if embeddings_offset + n_rows * dim * dtype.itemsize > len(buf):
+        raise GalleryFormatError(f"{path}: truncated gallery file")
+
+    label_names = []
+    offset = names_offset
+    for _ in range(n_names):
+        (length,) = struct.unpack_from("<I", buf, offset)
+        offset += 4
+        label_names.append(bytes(buf[offset:offset + length]).decode("utf-8"))
+        offset += length
+
+    labels = np.frombuffer(buf, dtype="<i4", count=n_rows, offset=labels_offset)
+    embeddings = np.frombuffer(
+        buf, dtype=dtype, count=n_rows * dim, offset=embeddings_offset
+    ).reshape(n_rows, dim)
+
+    if n_rows and (labels.min() < 0 or labels.max() >= n_names):
+        raise GalleryFormatError(f"{path}: label out of range")
+
+    scales = None
+    if dtype_code == DTYPE_INT8:
+        if not scales_offset:
+            raise GalleryFormatError(f"{path}: int8 gallery without scales")
+        scales = np.frombuffer(buf, dtype="<f4", count=dim, offset=scales_offset)
+
+    return Gallery(embeddings, labels, label_names, build_id=build_id, source=path,
+                   scales=scales)
+
+
+@contextlib.contextmanager
+def locked(directory):
+    """Exclusive lock held while rewriting the gallery and manifest in `directory`"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# -----------------------------
+# Legacy pickle support
+# -----------------------------
+def convert_pickle(pickle_path, gallery_path):
+    """One-shot conversion of a {"encodings", "names"} pickle"""
+    # Only ever run this on pickles produced by our own encode_faces.py
+    with open(pickle_path, "rb") as f:
+        data = pickle.load(f)
+    gallery = from_encodings(data["encodings"], data["names"])
+    save_gallery(gallery_path, gallery)
+    return gallery
+
+
+def open_gallery(gallery_path, legacy_pickle_path=None):
+    """Load a gallery, converting the legacy pickle on first use"""
+    if not os.path.exists(gallery_path) and legacy_pickle_path \
+            and os.path.exists(legacy_pickle_path):
+        print(f"[INFO] Converting {legacy_pickle_path} -> {gallery_path}")
+        try:
+            convert_pickle(legacy_pickle_path, gallery_path)
+        except OSError as e:
+            # Read-only install (e.g. a frozen app bundle): use it from memory
+            print(f"[WARN] Could not write converted gallery: {e}")
+            with open(legacy_pickle_path, "rb") as f:
+                data = pickle.load(f)
+            return from_encodings(data["encodings"], data["names"])
+    return load_gallery(gallery_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face gallery tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="convert a legacy encodings pickle")
+    p.add_argument("pickle_path")
+    p.add_argument("gallery_path")
+
+    p = sub.add_parser("info", help="print a gallery summary")
+    p.add_argument("gallery_path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        gallery = convert_pickle(args.pickle_path, args.gallery_path)
+        print(f"[INFO] Wrote {len(gallery)} encodings for "
+              f"{len(gallery.label_names)} people to {args.gallery_path}")
+    elif args.command == "info":
+        gallery = load_gallery(args.gallery_path)
+        print(f"Build id:   {gallery.build_id.hex()}")
+        print(f"Encodings:  {len(gallery)} x {gallery.dim} ({gallery.precision})")
+        print(f"People:     {len(gallery.label_names)}")
+        counts = np.bincount(gallery.labels, minlength=len(gallery.label_names))
+        for name, count in zip(gallery.label_names, counts):
+            print(f"  {name}: {count}")
+        gallery.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
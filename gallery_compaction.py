@@ -0,0 +1,131 @@
+"""Shrink the gallery without losing coverage.
+
+Every live match scans every gallery row, so rows that add nothing cost
+time on every recognition pass. Compaction works per person on the rows
+encode_faces.py is about to write:
+
+- near-duplicates (closer than `dedup_threshold` to a row already kept)
+  are dropped, first row wins, so re-running it on an already compacted
+  gallery plus new rows keeps the existing rows in place;
+- outliers, rows that sit closer to another person's centroid than to
+  their own person's, are reported (and dropped with drop_outliers);
+- with `prototypes`, each person is reduced to at most that many medoids.
+
+The manifest keeps every encoding, so compaction can be changed or
+undone on the next run without re-encoding.
+"""
+import numpy as np
+
+
+def _pairwise(a, b):
+    d = (a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2.0 * (a @ b.T)
+    return np.sqrt(np.maximum(d, 0.0))
+
+
+def dedupe(vectors, threshold):
+    """Indices of `vectors` to keep, dropping rows near an earlier kept one"""
+    keep = []
+    if not len(vectors):
+        return keep
+    d = _pairwise(vectors, vectors)
+    for i in range(len(vectors)):
+        if not keep or d[i, keep].min() >= threshold:
+            keep.append(i)
+    return keep
+
+
+def medoids(vectors, k, iterations=10):
+    """Indices of k medoids (farthest-point start, then alternate assign/update)"""
+    n = len(vectors)
+    if n <= k:
+        return list(range(n))
+    d = _pairwise(vectors, vectors)
+
+    # Start from the most central row, then repeatedly the farthest one
+    chosen = [int(d.sum(1).argmin())]
+    while len(chosen) < k:
+        chosen.append(int(d[:, chosen].min(1).argmax()))
+
+    for _ in range(iterations):
+        assign = d[:, chosen].argmin(1)
+        updated = []
+        for c in range(k):
+            members = np.flatnonzero(assign == c)
+            if not len(members):
+                updated.append(chosen[c])
+                continue
+            within = d[np.ix_(members, members)].sum(1)
+            updated.append(int(members[within.argmin()]))
+        if updated == chosen:
+            break
+        chosen = updated
+    return sorted(set(chosen))
+
+
+def find_outliers(vectors, labels):
+    """[(row, own_distance, other_distance, other_label)] for rows closer to
+    another person's centroid than to their own person's centroid"""
+    people = np.unique(labels)
+    if len(people) < 2:
+        return []
+    sums = np.stack([vectors[labels == label].sum(0) for label in people])
+    counts = np.array([(labels == label).sum() for label in people])
+    centroids = sums / counts[:, None]
+
+    outliers = []
+    for i, label in enumerate(people):
+        if counts[i] < 2:
+            continue
+        rows = np.flatnonzero(labels == label)
+        own = vectors[rows]
+        # Leave the row itself out of its own centroid so it cannot pull it
+        own_centroids = (sums[i][None, :] - own) / (counts[i] - 1)
+        own_dist = np.linalg.norm(own - own_centroids, axis=1)
+
+        others = np.flatnonzero(people != label)
+        d = _pairwise(own, centroids[others])
+        nearest = d.argmin(1)
+        other_dist = d[np.arange(len(rows)), nearest]
+        for j in np.flatnonzero(other_dist < own_dist):
+            outliers.append((int(rows[j]), float(own_dist[j]), float(other_dist[j]),
+                             int(people[others[nearest[j]]])))
+    return outliers
+
+
+def compact(vectors, labels, dedup_threshold=0.2, prototypes=0, drop_outliers=False):
+    """Rows to keep, in their original order, and a report of what changed.
+
+    `vectors` is (n, dim), `labels` an int per row. The report maps
+    "people" -> {label: {"before", "after", "duplicates"}} and lists
+    "outliers" as (row, own_distance, other_distance, other_label).
+    """
+    vectors = np.asarray(vectors, dtype=np.float64).reshape(len(labels), -1)
+    labels = np.asarray(labels)
+
+    outliers = find_outliers(vectors, labels)
+    dropped = {row for row, _, _, _ in outliers} if drop_outliers else set()
+
+    keep = []
+    people = {}
+    for label in np.unique(labels):
+        rows = [r for r in np.flatnonzero(labels == label) if r not in dropped]
+        unique = [rows[i] for i in dedupe(vectors[rows], dedup_threshold)] \
+            if dedup_threshold > 0 else rows
+        kept = unique
+        if prototypes and len(unique) > prototypes:
+            kept = [unique[i] for i in medoids(vectors[unique], prototypes)]
+        keep.extend(kept)
+        people[int(label)] = {
+            "before": int((labels == label).sum()),
+            "after": len(kept),
+            "duplicates": len(rows) - len(unique),
+        }
+
+    report = {
+        "rows_before": len(labels),
+        "rows_after": len(keep),
+        "people": people,
+        "outliers": outliers,
+        "outliers_dropped": len(dropped),
+    }
+    return sorted(keep), report
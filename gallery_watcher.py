@@ -0,0 +1,92 @@
+import os
+import time
+import threading
+
+from ann_index import load_for
+from face_matcher import GalleryMatcher
+from gallery import load_gallery
+
+
+class GalleryWatcher(threading.Thread):
+    """Reloads the gallery file when encode_faces.py rewrites it.
+
+    Polls the file's size/mtime/inode, loads a changed file on this thread
+    and hands `on_reload(gallery, matcher, appended)` a ready matcher, so
+    the recognition loop only has to swap one reference. When the new file
+    just appends rows to the one the current matcher was built from,
+    `appended` is the number of new rows and only those are processed;
+    otherwise it is None and the matcher was rebuilt from scratch.
+    With `index_path`, a rebuilt ANN index is picked up the same way.
+    """
+
+    def __init__(self, path, matcher, on_reload, interval=2.0, metrics=None,
+                 index_path=None):
+        super().__init__(name="GalleryWatcher", daemon=True)
+        self.path = path
+        self.index_path = index_path
+        self.matcher = matcher
+        self.on_reload = on_reload
+        self.interval = interval
+        self.metrics = metrics
+        self.reloads = 0
+        self._signature = self._full_signature()
+        self._stop_event = threading.Event()
+
+    def _stat(self, path=None):
+        try:
+            st = os.stat(path or self.path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def _full_signature(self):
+        index = self._stat(self.index_path) if self.index_path else None
+        return self._stat(), index
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            signature = self._full_signature()
+            if signature[0] is None or signature == self._signature:
+                continue
+            self._signature = signature
+            self.reload()
+
+    def reload(self):
+        start = time.perf_counter()
+        try:
+            gallery = load_gallery(self.path)
+        except (OSError, ValueError) as e:
+            # Keep matching against the current gallery
+            print(f"[WARN] Gallery reload failed: {e}")
+            return False
+
+        previous = self.matcher
+        appended = None
+        if previous.is_prefix_of(gallery):
+            appended = len(gallery) - len(previous)
+        index = load_for(gallery, self.index_path) if self.index_path else None
+        matcher = GalleryMatcher.from_gallery(
+            gallery, tolerance=previous.tolerance, previous=previous,
+            index=index, nprobe=previous.nprobe
+        )
+        elapsed = time.perf_counter() - start
+
+        self.matcher = matcher
+        self.reloads += 1
+        if self.metrics is not None:
+            self.metrics.record("gallery_reload", elapsed)
+            self.metrics.count("gallery_reloads")
+
+        kind = f"+{appended} rows" if appended is not None else "full rebuild"
+        size_mb = (self._stat() or (0,))[0] / (1024 * 1024)
+        if index is not None:
+            kind += f", ANN index {index.n_lists} lists"
+        print(f"[INFO] Gallery reloaded ({kind}): {len(gallery)} encodings, "
+              f"{len(gallery.label_names)} people, {size_mb:.1f} MB "
+              f"in {elapsed * 1000:.1f} ms")
+
+        self.on_reload(gallery, matcher, appended)
+        return True
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,98 @@
+"""Cheap motion gate in front of face detection.
+
+Frames are shrunk to a small grayscale thumbnail and compared against a
+running-average background. While nothing changes, detection is skipped
+altogether; when something does, only the padded bounding box of the
+changed pixels is handed on to the detector.
+
+The caller may pass different pyramid levels of its frames from one
+call to the next (the detection scale changes); regions are kept as
+fractions of the frame and returned in the pixels of the frame passed.
+"""
+import time
+
+import cv2
+
+
+class MotionGate:
+    IDLE = "idle"
+    MOTION = "motion"
+
+    def __init__(self, width=160, threshold=25, min_area=0.002,
+                 learning_rate=0.05, hold_time=1.0, pad=0.25):
+        self.width = width
+        self.threshold = threshold      # per-pixel grey-level change
+        self.min_area = min_area        # fraction of the thumbnail that must change
+        self.learning_rate = learning_rate
+        self.hold_time = hold_time      # stay open this long after motion stops
+        self.pad = pad                  # ROI padding, fraction of ROI size
+
+        self.background = None
+        self.state = self.IDLE
+        self.last_motion = None
+        self.last_region = None      # (x0, y0, x1, y1) as fractions of the frame
+        self.motion_ratio = 0.0
+
+    def reset(self):
+        self.background = None
+        self.state = self.IDLE
+        self.last_motion = None
+        self.last_region = None
+
+    def update(self, frame, timestamp=None):
+        """Returns (moving, region) with region = (x0, y0, x1, y1) or None"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        h, w = frame.shape[:2]
+        if self.background is not None:
+            # Same thumbnail whichever pyramid level the frame comes from
+            thumb_h, thumb_w = self.background.shape
+        else:
+            thumb_w, thumb_h = self.width, max(1, int(h * self.width / float(w)))
+        thumb = cv2.resize(frame, (thumb_w, thumb_h), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        if self.background is None:
+            # First frame: assume something is there until we have a baseline
+            self.background = gray.astype("float32")
+            self.state = self.MOTION
+            self.last_motion = timestamp
+            self.last_region = None
+            return True, None
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, None, iterations=2)
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        changed = cv2.countNonZero(mask)
+        self.motion_ratio = changed / float(mask.size)
+
+        if self.motion_ratio >= self.min_area:
+            x, y, bw, bh = cv2.boundingRect(cv2.findNonZero(mask))
+            px, py = int(bw * self.pad), int(bh * self.pad)
+            self.last_region = (
+                max(0.0, (x - px) / float(thumb_w)),
+                max(0.0, (y - py) / float(thumb_h)),
+                min(1.0, (x + bw + px) / float(thumb_w)),
+                min(1.0, (y + bh + py) / float(thumb_h)),
+            )
+            self.last_motion = timestamp
+            self.state = self.MOTION
+            return True, self._region_in(w, h)
+
+        if self.last_motion is not None and timestamp - self.last_motion <= self.hold_time:
+            self.state = self.MOTION
+            return True, self._region_in(w, h)
+
+        self.state = self.IDLE
+        return False, None
+
+    def _region_in(self, w, h):
+        """last_region in the pixels of a w x h frame"""
+        if self.last_region is None:
+            return None
+        x0, y0, x1, y1 = self.last_region
+        return int(x0 * w), int(y0 * h), int(x1 * w), int(y1 * h)
@@ -0,0 +1,295 @@
+"""Multi-process capture and recognition for the attendance app.
+
+The thread pipeline (video_pipeline.py) keeps recognition on one core:
+dlib holds the GIL for the whole detect/encode pass. Here a capture
+process writes frames into a frame_ring.FrameRing, `workers` recognition
+processes each claim frames from it and recognise them in place, and
+only small result records come back to the parent over a queue. The
+parent, which runs the GUI, just copies the newest frame out of the ring
+for display.
+
+ProcessPipeline offers the FrameGrabber and RecognitionPool methods the
+app uses (latest, results, ended, stop, join), so it can stand in for
+both.
+"""
+import time
+import queue
+import threading
+import multiprocessing
+
+import cv2
+import numpy as np
+
+from detection import Detection
+from frame_pyramid import FramePyramid, fit_size
+from frame_ring import FrameRing
+from frame_source import open_source
+from stage_metrics import StageMetrics
+
+
+DEFAULT_SLOTS = 4
+STARTUP_TIMEOUT = 10.0   # seconds for the capture process to deliver its first frame
+
+# Spawned, not forked: forking a process that runs Qt and threads is unsafe
+_context = multiprocessing.get_context("spawn")
+
+
+def _capture_main(source, slots, lossless, cond, info, stop_event):
+    try:
+        cap = open_source(
+            source["spec"], replay_speed=source["replay_speed"],
+            record_path=source["record_path"], record_codec=source["record_codec"]
+        )
+    except (OSError, ValueError) as e:
+        info.put(("error", str(e)))
+        return
+    if not cap.isOpened():
+        info.put(("error", f"could not open {source['spec']}"))
+        return
+
+    ret, frame = cap.read()
+    if not ret:
+        cap.release()
+        info.put(("error", "source has no frames"))
+        return
+
+    ring = FrameRing(frame.shape, slots, cond, create=True, lossless=lossless)
+    info.put(("ring", ring.name, frame.shape))
+    try:
+        while ret and not stop_event.is_set():
+            # Sources that know their capture time (replays) report it
+            timestamp = cap.timestamp if hasattr(cap, "timestamp") else time.monotonic()
+            if frame.shape != ring.shape:
+                # Keep the slot size fixed if a source changes resolution
+                frame = cv2.resize(frame, (ring.shape[1], ring.shape[0]))
+            if ring.write(frame, timestamp, should_stop=stop_event.is_set) is None:
+                break
+            ret, frame = cap.read()
+        ring.mark_ended()
+        cap.release()
+        # Readers may still hold slots; the block goes when the parent says so
+        stop_event.wait()
+    finally:
+        ring.close(unlink=True)
+
+
+def build_recognizer(options):
+    """FaceRecognizer for a recognition process (imports dlib here, not in
+    the parent); returns (recognizer, gallery watcher or None)"""
+    from ann_index import load_for
+    from face_detectors import make_detector
+    from face_matcher import GalleryMatcher
+    from face_tracker import FaceTracker
+    from gallery import open_gallery
+    from gallery_watcher import GalleryWatcher
+    from motion_gate import MotionGate
+    from recognition import FaceRecognizer
+
+    gallery = open_gallery(options["gallery"], options.get("legacy_gallery"))
+    matcher = GalleryMatcher.from_gallery(
+        gallery, tolerance=options["tolerance"],
+        index=load_for(gallery, options["index_path"]), nprobe=options["nprobe"]
+    )
+    recognizer = FaceRecognizer(
+        matcher, resize_scale=options["resize_scale"],
+        detector=make_detector(options["detector"],
+                               full_scan_interval=options["full_scan_interval"]),
+        tracker=FaceTracker(confidence_half_life=options["identity_half_life"],
+                            tolerance=options["tolerance"])
+        if options["tracking"] else None,
+        motion_gate=MotionGate(**options["motion_gate"])
+        if options["motion_gate"] is not None else None,
+    )
+
+    watcher = None
+    if options["reload_interval"]:
+        state = {"gallery": gallery}
+
+        def on_reload(new_gallery, new_matcher, appended):
+            recognizer.swap_matcher(new_matcher, labels_changed=appended is None)
+            old_gallery, state["gallery"] = state["gallery"], new_gallery
+            old_gallery.close()
+
+        watcher = GalleryWatcher(
+            options["gallery"], matcher, on_reload,
+            interval=options["reload_interval"], index_path=options["index_path"]
+        )
+        watcher.start()
+    return recognizer, watcher
+
+
+def _recognition_main(index, ring_info, cond, lossless, options, results, stop_event):
+    cv2.setNumThreads(1)
+    recognizer, watcher = build_recognizer(options)
+    name, shape, slots = ring_info
+    ring = FrameRing(shape, slots, cond, name=name, lossless=lossless)
+    try:
+        while not stop_event.is_set():
+            claimed = ring.claim()
+            if claimed is None:
+                if ring.ended:
+                    break
+                continue
+            slot, frame_id, timestamp, frame = claimed
+            start = time.perf_counter()
+            try:
+                detections = recognizer.recognize(frame, timestamp)
+            finally:
+                ring.release(slot)
+            results.put((
+                frame_id, index, time.perf_counter() - start,
+                [(d.box, d.name, d.label, d.distance, d.track_id) for d in detections],
+            ))
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        ring.close()
+
+
+class ProcessPipeline:
+    """Capture process + `workers` recognition processes around a FrameRing.
+
+    Use it where the app uses a FrameGrabber and a RecognitionPool:
+    latest() returns the newest frame as a FramePyramid, results() the
+    newest recognition result, and `on_result(frame_id, detections)` is
+    called for every result on a parent thread.
+    """
+
+    def __init__(self, source, options, workers=2, slots=DEFAULT_SLOTS,
+                 display_size=None, lossless=False, metrics=None, on_result=None):
+        self.source = source
+        self.options = options
+        self.workers = max(1, workers)
+        # Every worker can hold one slot; keep at least one for the writer
+        self.slots = max(slots, self.workers + 1)
+        self.display_size = display_size
+        self.lossless = lossless
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.on_result = on_result
+
+        self.cond = _context.Condition()
+        self.stop_event = _context.Event()
+        self.results_queue = _context.Queue()
+        self.ring = None
+        self.processes = []
+        self.lock = threading.Lock()
+        self.result_frame_id = 0
+        self.detections = []
+        self._frame = None
+        self._frame_id = 0
+        self._timestamp = 0.0
+        self._buffers = None
+        self._back = 0
+        self._drain_thread = None
+        self._stopped = False
+
+    def start(self):
+        """Start the processes; raises OSError if the source cannot be opened"""
+        info = _context.Queue()
+        capture = _context.Process(
+            target=_capture_main, name="FrameCapture", daemon=True,
+            args=(self.source, self.slots, self.lossless, self.cond, info,
+                  self.stop_event)
+        )
+        capture.start()
+        self.processes.append(capture)
+        try:
+            message = info.get(timeout=STARTUP_TIMEOUT)
+        except queue.Empty:
+            message = ("error", "no frame from the source")
+        if message[0] == "error":
+            self.stop()
+            self.join(timeout=2.0)
+            raise OSError(message[1])
+
+        _, name, shape = message
+        self.ring = FrameRing(shape, self.slots, self.cond, name=name,
+                              lossless=self.lossless)
+        # Display copies alternate between two buffers: a copy never
+        # overwrites the frame handed out by the previous latest()
+        self._buffers = [np.empty(shape, dtype=np.uint8) for _ in range(2)]
+        self._back = 0
+        if self.display_size is not None:
+            self.display_size = fit_size(shape, self.display_size)
+        for index in range(self.workers):
+            process = _context.Process(
+                target=_recognition_main, name=f"Recognition-{index}", daemon=True,
+                args=(index, (name, shape, self.slots), self.cond, self.lossless,
+                      self.options, self.results_queue, self.stop_event)
+            )
+            process.start()
+            self.processes.append(process)
+
+        self._drain_thread = threading.Thread(
+            target=self._drain, name="ResultDrain", daemon=True
+        )
+        self._drain_thread.start()
+
+    def _drain(self):
+        while not self.stop_event.is_set():
+            try:
+                frame_id, worker, seconds, faces = self.results_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            detections = [Detection(*face) for face in faces]
+            with self.lock:
+                # Workers finish out of order; never show an older result
+                if frame_id > self.result_frame_id:
+                    self.result_frame_id = frame_id
+                    self.detections = detections
+            self.metrics.record("recognize", seconds)
+            self.metrics.count("recognition_passes")
+            self.metrics.count(f"recognition_passes_worker{worker}")
+            if self.on_result is not None:
+                self.on_result(frame_id, detections)
+
+    # ---------- FrameGrabber side ----------
+    def latest(self):
+        """(frame_id, pyramid, timestamp) of the newest frame, non-blocking"""
+        if self.ring is not None:
+            frame = self._buffers[self._back]
+            copied = self.ring.latest_copy(frame, self._frame_id)
+            if copied is not None:
+                self._back ^= 1
+                self._frame_id, self._timestamp = copied
+                with self.metrics.stage("pyramid"):
+                    self._frame = FramePyramid(frame, self.display_size)
+        return self._frame_id, self._frame, self._timestamp
+
+    @property
+    def ended(self):
+        if self.ring is None:
+            return False
+        if self.ring.drained:
+            return True
+        # A dead recognition process would otherwise leave us waiting forever
+        return not any(p.is_alive() for p in self.processes[1:])
+
+    # ---------- RecognitionPool side ----------
+    def results(self):
+        with self.lock:
+            return self.result_frame_id, self.detections
+
+    def counters(self):
+        return self.ring.counters() if self.ring is not None else {}
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for process in self.processes:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            process.join(remaining)
+            if process.is_alive():
+                process.terminate()
+        if self._drain_thread is not None:
+            self._drain_thread.join(timeout)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
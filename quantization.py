@@ -0,0 +1,89 @@
+"""Reduced-precision gallery storage and its accuracy check.
+
+float16 halves a float32 gallery; int8 quarters it, storing each
+dimension as round(x / scale) with one float32 scale per dimension
+(max |x| / 127 over the gallery). Matching reads the compact rows
+directly (see GalleryMatcher); `evaluate` measures what the precision
+loss does to recognition against the float64 encodings in the manifest.
+"""
+import numpy as np
+
+
+PRECISIONS = ("float32", "float16", "int8")
+EVAL_BLOCK_ELEMENTS = 1 << 21   # probe x gallery distances held per block in evaluate
+
+
+def quantize(embeddings, precision, scales=None):
+    """(stored array, scales or None); int8 reuses `scales` when given so
+    rows appended to a gallery stay comparable with the existing ones"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if precision == "float32":
+        return embeddings, None
+    if precision == "float16":
+        return embeddings.astype(np.float16), None
+    if precision != "int8":
+        raise ValueError(f"Unknown precision {precision!r}")
+
+    if scales is None:
+        peak = np.abs(embeddings).max(axis=0) if len(embeddings) else \
+            np.ones(embeddings.shape[1], dtype=np.float32)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+    q = np.rint(embeddings / scales)
+    return np.clip(q, -127, 127).astype(np.int8), np.asarray(scales, dtype=np.float32)
+
+
+def dequantize(stored, scales=None):
+    out = np.asarray(stored, dtype=np.float32)
+    if scales is not None:
+        out = out * scales
+    return out
+
+
+def evaluate(reference, labels, matcher, tolerance, max_queries=2000, seed=0):
+    """Compare `matcher` (reduced precision) with exact float64 matching.
+
+    Every sampled gallery row is used as a probe against all other rows
+    (its own row excluded), the way a new photo of an enrolled person
+    would be. Reports how often the top-1 identity and the accept/reject
+    decision at `tolerance` change, and the distance error.
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    labels = np.asarray(labels)
+    n = len(reference)
+    if n < 2:
+        return None
+    rng = np.random.default_rng(seed)
+    queries = np.arange(n) if n <= max_queries else np.sort(rng.choice(n, max_queries, replace=False))
+
+    # Memory stays bounded by the block, not queries x gallery rows
+    block = max(1, min(256, EVAL_BLOCK_ELEMENTS // n))
+    norms = (reference ** 2).sum(1)
+    top1_changed = decisions_changed = 0
+    error_sum = error_max = 0.0
+    for start in range(0, len(queries), block):
+        q = queries[start:start + block]
+        probes = reference[q]
+        exact = np.sqrt(np.maximum(
+            norms[q][:, None] + norms[None, :] - 2.0 * probes @ reference.T, 0.0))
+        approx = matcher.distances(probes.astype(np.float32)).astype(np.float64)
+        error = np.abs(approx - exact)
+        error_sum += float(error.sum())
+        error_max = max(error_max, float(error.max()))
+
+        rows = np.arange(len(q))
+        exact[rows, q] = np.inf
+        approx[rows, q] = np.inf
+        best_exact = exact.argmin(1)
+        best_approx = approx.argmin(1)
+        top1_changed += int((labels[best_exact] != labels[best_approx]).sum())
+        decisions_changed += int(((exact[rows, best_exact] <= tolerance)
+                                  != (approx[rows, best_approx] <= tolerance)).sum())
+
+    return {
+        "queries": int(len(queries)),
+        "top1_changed": top1_changed,
+        "decisions_changed": decisions_changed,
+        "mean_abs_error": error_sum / (len(queries) * n),
+        "max_abs_error": error_max,
+        "bytes_per_row": int(matcher.embeddings.dtype.itemsize * matcher.embeddings.shape[1]),
+    }
@@ -0,0 +1,179 @@
+import time
+
+import cv2
+import face_recognition
+
+from detection import Detection
+from face_detectors import DlibDetector
+from frame_pyramid import FramePyramid
+from stage_metrics import StageMetrics
+
+
+def union_region(region, boxes, shape, pad=0.25):
+    """Grow an (x0, y0, x1, y1) region to cover padded face boxes"""
+    h, w = shape[:2]
+    x0, y0, x1, y1 = region if region is not None else (w, h, 0, 0)
+    for top, right, bottom, left in boxes:
+        px = int((right - left) * pad)
+        py = int((bottom - top) * pad)
+        x0 = min(x0, left - px)
+        y0 = min(y0, top - py)
+        x1 = max(x1, right + px)
+        y1 = max(y1, bottom + py)
+    return max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+
+
+class FaceRecognizer:
+    """detect -> encode -> match on one BGR frame.
+
+    With a FaceTracker attached, only faces whose track needs it are sent
+    to the encoder; the others keep their cached identity. With a
+    MotionGate attached, static frames skip detection entirely and moving
+    ones are only scanned inside the motion region. With a `batcher`
+    (recognition_service.IdentifyBatcher), faces are encoded and matched
+    together with other recognisers' faces instead of on this thread.
+    """
+
+    def __init__(self, matcher, resize_scale=0.5, detector=None, tracker=None,
+                 motion_gate=None, metrics=None, batcher=None):
+        self.matcher = matcher
+        self.resize_scale = resize_scale
+        self.detector = detector if detector is not None else DlibDetector("hog")
+        self.tracker = tracker
+        self.motion_gate = motion_gate
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.batcher = batcher
+        self.last_pass_skipped = False   # the motion gate skipped the last pass
+        self._next_matcher = None
+
+    def swap_matcher(self, matcher, labels_changed=True):
+        """Use `matcher` from the next recognize() call on (any thread).
+
+        With labels_changed, cached track identities are dropped too, since
+        their labels may point at different people in the new gallery.
+        """
+        self._next_matcher = (matcher, labels_changed)
+
+    def recognize(self, frame, timestamp=None):
+        """`frame` is a BGR array or a FramePyramid; boxes are full-frame"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self._next_matcher is not None:
+            # Swap between passes so one pass never mixes two galleries
+            (self.matcher, labels_changed), self._next_matcher = self._next_matcher, None
+            if labels_changed and self.tracker is not None:
+                self.tracker.clear()
+        metrics = self.metrics
+        scale = self.resize_scale
+        self.last_pass_skipped = False
+
+        # Start from the smallest already-resized level that is big enough
+        if isinstance(frame, FramePyramid):
+            base, base_scale = frame.base_for(scale)
+        else:
+            base, base_scale = frame, 1.0
+
+        region = None
+        if self.motion_gate is not None:
+            with metrics.stage("motion"):
+                moving, region = self.motion_gate.update(base, timestamp)
+            if not moving:
+                metrics.count("passes_skipped")
+                self.last_pass_skipped = True
+                return self._cached_detections()
+            if region is not None and self.tracker is not None:
+                # Keep still faces inside the scan so their tracks survive
+                region = union_region(
+                    region,
+                    [tuple(int(c * base_scale) for c in t.box) for t in self.tracker.tracks],
+                    base.shape
+                )
+
+        if region is None:
+            bx0, by0 = 0, 0
+            view = base
+        else:
+            bx0, by0, bx1, by1 = region
+            if bx1 - bx0 < 2 or by1 - by0 < 2:
+                return self._cached_detections()
+            view = base[by0:by1, bx0:bx1]
+
+        # Full-frame position of the view's top-left corner
+        offset = (bx0 / base_scale, by0 / base_scale)
+
+        with metrics.stage("resize"):
+            fx = scale / base_scale
+            small = view if fx == 1.0 else cv2.resize(view, (0, 0), fx=fx, fy=fx)
+        with metrics.stage("convert"):
+            rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+
+        with metrics.stage("detect"):
+            locations = self.detector.detect(rgb_small, timestamp)
+        metrics.count("faces_detected", len(locations))
+
+        # Scale back to full-frame coordinates
+        x0, y0 = offset
+        boxes = [
+            (int(top / scale + y0), int(right / scale + x0),
+             int(bottom / scale + y0), int(left / scale + x0))
+            for (top, right, bottom, left) in locations
+        ]
+
+        if self.tracker is not None:
+            return self._recognize_tracked(rgb_small, offset, boxes, timestamp)
+
+        if not locations:
+            return []
+
+        matches = self._identify(rgb_small, locations)
+
+        return [
+            Detection(box, match.name, match.label, match.distance)
+            for match, box in zip(matches, boxes)
+        ]
+
+    def _identify(self, rgb_small, locations):
+        """One MatchResult per face location in `rgb_small`"""
+        metrics = self.metrics
+        if self.batcher is not None:
+            with metrics.stage("identify"):
+                matches = self.batcher.identify(rgb_small, locations)
+            metrics.count("faces_encoded", len(matches))
+            return matches
+
+        with metrics.stage("encode"):
+            encodings = face_recognition.face_encodings(rgb_small, locations)
+        metrics.count("faces_encoded", len(encodings))
+
+        # One batched distance computation for every face in the frame
+        with metrics.stage("match"):
+            return self.matcher.match(encodings)
+
+    def _cached_detections(self):
+        if self.tracker is None:
+            return []
+        return [
+            Detection(t.box, t.name, t.label, t.distance, t.track_id)
+            for t in self.tracker.tracks
+        ]
+
+    def _recognize_tracked(self, rgb_small, offset, boxes, timestamp):
+        scale = self.resize_scale
+        x0, y0 = offset
+        tracks = self.tracker.update(boxes, timestamp)
+
+        stale = [t for t in tracks if self.tracker.needs_encoding(t, timestamp)]
+        if stale:
+            stale_locations = [
+                (int((t.box[0] - y0) * scale), int((t.box[1] - x0) * scale),
+                 int((t.box[2] - y0) * scale), int((t.box[3] - x0) * scale))
+                for t in stale
+            ]
+            matches = self._identify(rgb_small, stale_locations)
+            for track, match in zip(stale, matches):
+                self.tracker.set_identity(track, match, timestamp)
+
+        return [
+            Detection(t.box, t.name, t.label, t.distance, t.track_id)
+            for t in tracks
+        ]
@@ -0,0 +1,166 @@
+"""Thin client for recognition_service.py.
+
+RemoteRecognizer has FaceRecognizer's recognize() interface, so the
+attendance app's recognition threads drive it unchanged; it uploads a
+downscaled JPEG of each frame together with its scale and gets
+full-frame Detections back. The service tracks in full-frame coordinates
+too, so its tracks survive the upload scale changing between frames (as
+adaptive_scheduler.py does). It does not import dlib or face_recognition.
+Requests go over one kept-alive HTTP connection per recogniser, so a
+frame costs no TCP handshake.
+"""
+import json
+import time
+import uuid
+import threading
+from http.client import HTTPConnection, HTTPException
+from urllib.parse import urlencode, urlsplit
+
+import cv2
+
+from detection import Detection
+from frame_pyramid import FramePyramid
+from stage_metrics import StageMetrics
+
+
+ERROR_LOG_INTERVAL = 10.0   # seconds between repeated "service unreachable" warnings
+
+
+class ServiceError(Exception):
+    pass
+
+
+class RemoteRecognizer:
+    """Recognises frames on a shared recognition service.
+
+    Frames are uploaded at `upload_scale` (the detection scale a local
+    FaceRecognizer would use), so the service detects on them as-is.
+    While the service is unreachable recognize() returns no faces and
+    `error` holds the reason.
+    """
+
+    def __init__(self, url, upload_scale=0.5, jpeg_quality=80, timeout=2.0,
+                 metrics=None, client_id=None):
+        self.url = url.rstrip("/")
+        parts = urlsplit(self.url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError(f"not an http:// service URL: {url}")
+        self._host = parts.hostname
+        self._port = parts.port or 80
+        self._prefix = parts.path
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self.upload_scale = upload_scale
+        self.jpeg_quality = jpeg_quality
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.client_id = client_id or uuid.uuid4().hex[:12]
+        self.error = None
+        self._last_logged = 0.0
+
+    @property
+    def resize_scale(self):
+        # Same knob as FaceRecognizer's, so schedulers can drive either
+        return self.upload_scale
+
+    @resize_scale.setter
+    def resize_scale(self, scale):
+        self.upload_scale = scale
+
+    def _post(self, path, params, body=b""):
+        target = f"{self._prefix}{path}?{urlencode(dict(params, client=self.client_id))}"
+        with self._conn_lock:
+            try:
+                reply = self._request(target, body)
+            except (HTTPException, OSError, ValueError) as e:
+                self._close()
+                self._failed(e)
+                raise ServiceError(str(e)) from e
+        self.error = None
+        return reply
+
+    def _request(self, target, body):
+        # The service may have dropped an idle connection; a reused one
+        # gets one retry on a fresh connection
+        for attempt in range(2):
+            fresh = self._conn is None
+            if fresh:
+                self._conn = HTTPConnection(self._host, self._port, timeout=self.timeout)
+            try:
+                self._conn.request("POST", target, body=body,
+                                   headers={"Content-Type": "image/jpeg"})
+                response = self._conn.getresponse()
+                data = response.read()
+            except (HTTPException, ConnectionError):
+                self._close()
+                if fresh or attempt:
+                    raise
+                continue
+            if response.status != 200:
+                raise ValueError(f"HTTP {response.status} {response.reason}")
+            return json.loads(data.decode("utf-8"))
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self):
+        """Close the connection to the service"""
+        with self._conn_lock:
+            self._close()
+
+    def _failed(self, e):
+        self.error = str(getattr(e, "reason", e))
+        self.metrics.count("service_errors")
+        now = time.monotonic()
+        if now - self._last_logged >= ERROR_LOG_INTERVAL:
+            self._last_logged = now
+            print(f"[WARN] Recognition service {self.url}: {self.error}")
+
+    def _encode(self, image):
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ServiceError("JPEG encoding failed")
+        return jpeg.tobytes()
+
+    def reset(self):
+        """Drop this client's tracks on the service (new capture session)"""
+        try:
+            self._post("/reset", {})
+        except ServiceError:
+            pass
+
+    def recognize(self, frame, timestamp=None):
+        """`frame` is a BGR array or a FramePyramid; boxes are full-frame"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        scale = self.upload_scale
+        if isinstance(frame, FramePyramid):
+            base, base_scale = frame.base_for(scale)
+        else:
+            base, base_scale = frame, 1.0
+
+        with self.metrics.stage("upload_encode"):
+            fx = scale / base_scale
+            small = base if fx == 1.0 else cv2.resize(base, (0, 0), fx=fx, fy=fx)
+            body = self._encode(small)
+
+        try:
+            with self.metrics.stage("service"):
+                reply = self._post(
+                    "/recognize", {"ts": f"{timestamp:.4f}", "upload": f"{scale:.4f}"}, body
+                )
+        except ServiceError:
+            return []
+        self.metrics.record("service_server", reply.get("server_ms", 0.0) / 1000.0)
+
+        detections = []
+        for face in reply["faces"]:
+            box = tuple(face["box"])
+            distance = face["distance"] if face["distance"] is not None else float("inf")
+            detections.append(
+                Detection(box, face["name"], face["label"], distance, face["track_id"])
+            )
+        self.metrics.count("faces_detected", len(detections))
+        return detections
@@ -0,0 +1,466 @@
+"""Local recognition service shared by several kiosks.
+
+Loads the gallery and the dlib models once and serves recognition over
+HTTP on localhost, so one machine can recognise for several entrance
+cameras while each kiosk (face_attendance_qt.py --service URL) only
+captures and draws.
+
+    POST /recognize?client=ID&ts=SECONDS&upload=SCALE
+                                           JPEG frame, downscaled by SCALE ->
+                                           faces with full-frame boxes
+    POST /recognize?client=ID&mode=crop    JPEG face crop -> its identity
+    POST /reset?client=ID                  forget the client's tracks
+    GET  /health                           gallery size, clients
+    GET  /metrics                          Prometheus text
+
+Frames are recognised on the request's thread with one FaceRecognizer per
+client (its own detector, tracker and motion gate). Clients may change
+their upload scale from frame to frame; tracks are kept in full-frame
+coordinates, so they survive the change. Faces that need an
+identity go to one IdentifyBatcher, which collects them from every client
+for a few milliseconds and encodes and matches them in one pass.
+
+    python recognition_service.py --port 8765
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+import face_recognition
+
+from ann_index import DEFAULT_NPROBE, index_path, load_for
+from face_detectors import BACKENDS, make_detector
+from face_matcher import GalleryMatcher, DEFAULT_TOLERANCE
+from face_tracker import FaceTracker
+from frame_pyramid import FramePyramid
+from gallery import open_gallery
+from gallery_watcher import GalleryWatcher
+from motion_gate import MotionGate
+from recognition import FaceRecognizer
+from stage_metrics import StageMetrics, format_prometheus
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GALLERY_PATH = os.path.join(BASE_DIR, "encodings", "face_gallery.fgal")
+LEGACY_ENCODINGS_PATH = os.path.join(BASE_DIR, "encodings", "face_encodings.pickle")
+
+DEFAULT_PORT = 8765
+MAX_BATCH_FACES = 64        # faces encoded and matched in one pass
+MAX_BATCH_WAIT = 0.005      # seconds to wait for other clients' faces
+CLIENT_IDLE_TIMEOUT = 60.0  # seconds before an idle client's state is dropped
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+
+class _Job:
+    __slots__ = ("rgb", "locations", "done", "matches", "error")
+
+    def __init__(self, rgb, locations):
+        self.rgb = rgb
+        self.locations = locations
+        self.done = threading.Event()
+        self.matches = None
+        self.error = None
+
+
+class IdentifyBatcher(threading.Thread):
+    """Encodes and matches faces from concurrent requests together.
+
+    identify() queues (image, face locations) and blocks until its
+    matches are ready. The batch thread waits up to `max_wait` for more
+    jobs (up to `max_batch` faces), encodes them back to back and matches
+    every encoding of the batch with one GalleryMatcher.match call.
+    """
+
+    def __init__(self, matcher, max_batch=MAX_BATCH_FACES, max_wait=MAX_BATCH_WAIT,
+                 metrics=None):
+        super().__init__(name="IdentifyBatcher", daemon=True)
+        self.matcher = matcher
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.cond = threading.Condition()
+        self._jobs = []
+        self._stop_event = threading.Event()
+
+    def swap_matcher(self, matcher):
+        # Read once per batch, so a batch never mixes two galleries
+        self.matcher = matcher
+
+    def identify(self, rgb, locations):
+        """One MatchResult per face location, from the next batch"""
+        if not locations:
+            return []
+        job = _Job(rgb, list(locations))
+        with self.cond:
+            if self._stop_event.is_set():
+                raise RuntimeError("recognition service stopped")
+            self._jobs.append(job)
+            self.cond.notify_all()
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.matches
+
+    def _take(self):
+        """The next batch of jobs; [] once stopped"""
+        with self.cond:
+            self.cond.wait_for(lambda: self._jobs or self._stop_event.is_set())
+            deadline = time.monotonic() + self.max_wait
+            while not self._stop_event.is_set():
+                faces = sum(len(job.locations) for job in self._jobs)
+                remaining = deadline - time.monotonic()
+                if faces >= self.max_batch or remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+
+            batch, faces = [], 0
+            while self._jobs and (not batch or faces + len(self._jobs[0].locations)
+                                  <= self.max_batch):
+                job = self._jobs.pop(0)
+                batch.append(job)
+                faces += len(job.locations)
+            return batch
+
+    def run(self):
+        while not self._stop_event.is_set():
+            batch = self._take()
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch):
+        matcher = self.matcher
+        try:
+            with self.metrics.stage("encode"):
+                # dlib's CPU encoder has no cross-image batch call; what
+                # the batch saves is per-request matching and thread hops
+                encodings = [
+                    encoding
+                    for job in batch
+                    for encoding in face_recognition.face_encodings(job.rgb, job.locations)
+                ]
+            with self.metrics.stage("match"):
+                matches = matcher.match(encodings)
+        except Exception as e:
+            for job in batch:
+                job.error = e
+                job.done.set()
+            return
+
+        self.metrics.count("batches")
+        self.metrics.count("batched_faces", len(encodings))
+        start = 0
+        for job in batch:
+            job.matches = matches[start:start + len(job.locations)]
+            start += len(job.locations)
+            job.done.set()
+
+    def stop(self):
+        self._stop_event.set()
+        with self.cond:
+            jobs, self._jobs = self._jobs, []
+            self.cond.notify_all()
+        # Release anyone still waiting
+        for job in jobs:
+            job.error = RuntimeError("recognition service stopped")
+            job.done.set()
+
+
+class _Client:
+    __slots__ = ("recognizer", "lock", "last_seen")
+
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+
+
+class RecognitionService:
+    """Gallery, batcher and per-client recognisers behind the HTTP handler"""
+
+    def __init__(self, gallery, options, metrics=None):
+        self.options = options
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.gallery = gallery
+        self.matcher = GalleryMatcher.from_gallery(
+            gallery, tolerance=options["tolerance"],
+            index=load_for(gallery, options["index_path"]), nprobe=options["nprobe"]
+        )
+        self.batcher = IdentifyBatcher(
+            self.matcher, max_batch=options["max_batch"],
+            max_wait=options["max_wait"], metrics=self.metrics
+        )
+        self.lock = threading.Lock()
+        self.clients = {}
+
+        self.watcher = None
+        if options["reload_interval"]:
+            self.watcher = GalleryWatcher(
+                options["gallery"], self.matcher, self.on_gallery_reload,
+                interval=options["reload_interval"], metrics=self.metrics,
+                index_path=options["index_path"]
+            )
+
+    def start(self):
+        self.batcher.start()
+        if self.watcher is not None:
+            self.watcher.start()
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.batcher.stop()
+        self.gallery.close()
+
+    def on_gallery_reload(self, gallery, matcher, appended):
+        self.batcher.swap_matcher(matcher)
+        with self.lock:
+            clients = list(self.clients.values())
+            old_gallery, self.gallery = self.gallery, gallery
+            self.matcher = matcher
+        for client in clients:
+            client.recognizer.swap_matcher(matcher, labels_changed=appended is None)
+        old_gallery.close()
+
+    def _new_recognizer(self):
+        options = self.options
+        return FaceRecognizer(
+            self.matcher, resize_scale=options["scale"],
+            detector=make_detector(options["detector"]),
+            tracker=FaceTracker(tolerance=options["tolerance"])
+            if options["tracking"] else None,
+            motion_gate=MotionGate() if options["motion_gate"] else None,
+            metrics=self.metrics,
+            batcher=self.batcher
+        )
+
+    def client(self, client_id):
+        now = time.monotonic()
+        with self.lock:
+            client = self.clients.get(client_id)
+            if client is None:
+                # Forget kiosks that went away instead of keeping their tracks
+                for stale_id in [cid for cid, c in self.clients.items()
+                                 if now - c.last_seen > CLIENT_IDLE_TIMEOUT]:
+                    del self.clients[stale_id]
+                client = self.clients[client_id] = _Client(self._new_recognizer())
+                self.metrics.count("clients_connected")
+            client.last_seen = now
+            return client
+
+    def reset(self, client_id):
+        with self.lock:
+            self.clients.pop(client_id, None)
+
+    def recognize_frame(self, client_id, frame, timestamp, upload_scale=1.0):
+        """`frame` is the client's frame downscaled by `upload_scale`;
+        boxes are in the client's full-frame coordinates"""
+        client = self.client(client_id)
+        # A client's tracker and gate expect its frames in order, one at a time
+        with client.lock:
+            recognizer = client.recognizer
+            recognizer.resize_scale = upload_scale * self.options["scale"]
+            return recognizer.recognize(
+                FramePyramid.from_level(frame, upload_scale), timestamp
+            )
+
+    def recognize_crop(self, crop):
+        """The whole image is one face"""
+        h, w = crop.shape[:2]
+        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        box = (0, w, h, 0)
+        return box, self.batcher.identify(rgb, [box])[0]
+
+    def health(self):
+        with self.lock:
+            return {
+                "status": "ok",
+                "encodings": len(self.matcher),
+                "people": len(self.matcher.label_names),
+                "clients": len(self.clients),
+            }
+
+
+def _face_record(box, name, label, distance, track_id=None):
+    return {
+        "box": [int(c) for c in box],
+        "name": name,
+        "label": int(label),
+        "distance": round(float(distance), 4) if np.isfinite(distance) else None,
+        "track_id": track_id,
+    }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "FaceRecognitionService/1"
+    protocol_version = "HTTP/1.1"   # keep-alive: one connection per recogniser
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        """The request body, or None if it is missing or too large. An
+        unread body would be parsed as the next keep-alive request, so
+        the connection is closed after the reply in that case."""
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length == 0:
+            return None
+        if length < 0 or length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return None
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send(200, self.service.health())
+        elif path == "/metrics":
+            text = format_prometheus(self.service.metrics.snapshot())
+            self._send(200, text.encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        client_id = query.get("client", self.client_address[0])
+
+        if url.path == "/reset":
+            self._read_body()
+            self.service.reset(client_id)
+            self._send(200, {"status": "ok"})
+            return
+        if url.path != "/recognize":
+            self.close_connection = True    # body left unread
+            self._send(404, {"error": "not found"})
+            return
+
+        start = time.perf_counter()
+        body = self._read_body()
+        image = None
+        if body is not None:
+            image = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            self._send(400, {"error": "body must be a JPEG image"})
+            return
+
+        try:
+            if query.get("mode", "frame") == "crop":
+                box, match = self.service.recognize_crop(image)
+                faces = [_face_record(box, match.name, match.label, match.distance)]
+            else:
+                timestamp = float(query["ts"]) if "ts" in query else None
+                upload_scale = float(query.get("upload", 1.0))
+                if not 0.0 < upload_scale <= 1.0:
+                    raise ValueError("upload must be in (0, 1]")
+                detections = self.service.recognize_frame(
+                    client_id, image, timestamp, upload_scale
+                )
+                faces = [
+                    _face_record(d.box, d.name, d.label, d.distance, d.track_id)
+                    for d in detections
+                ]
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+            return
+
+        elapsed = time.perf_counter() - start
+        self.service.metrics.record("request", elapsed)
+        self.service.metrics.count("requests")
+        self._send(200, {"faces": faces, "server_ms": round(elapsed * 1000.0, 2)})
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared face recognition service")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="interface to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--gallery", default=GALLERY_PATH)
+    parser.add_argument("--detector", default="hog", choices=BACKENDS,
+                        help="haar+hog is faster, but check its recall on "
+                             "your cameras first")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="detection scale of the uploaded frames (clients "
+                             "already downscale them)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE,
+                        help="ANN lists searched per face, if the gallery has an index")
+    parser.add_argument("--no-tracking", action="store_true",
+                        help="encode every face on every frame")
+    parser.add_argument("--no-motion-gate", action="store_true",
+                        help="run detection on static frames too")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_FACES,
+                        help="faces encoded and matched per pass")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_BATCH_WAIT * 1000.0,
+                        help="how long a pass waits for other clients' faces")
+    parser.add_argument("--reload-interval", type=float, default=2.0,
+                        help="seconds between gallery checks (0 to disable)")
+    args = parser.parse_args(argv)
+
+    options = {
+        "gallery": args.gallery,
+        "index_path": index_path(args.gallery),
+        "scale": args.scale,
+        "detector": args.detector,
+        "tolerance": args.tolerance,
+        "nprobe": args.nprobe,
+        "tracking": not args.no_tracking,
+        "motion_gate": not args.no_motion_gate,
+        "max_batch": max(1, args.max_batch),
+        "max_wait": max(0.0, args.max_wait_ms / 1000.0),
+        "reload_interval": args.reload_interval,
+    }
+    legacy = LEGACY_ENCODINGS_PATH if args.gallery == GALLERY_PATH else None
+    gallery = open_gallery(args.gallery, legacy)
+
+    service = RecognitionService(gallery, options)
+    server = ServiceServer((args.host, args.port), service)
+    service.start()
+    print(f"[INFO] Serving {len(gallery)} encodings of {len(gallery.label_names)} people "
+          f"on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""Headless recognition over recorded video files and image folders.
+
+Runs the same detect -> encode -> match pipeline as the attendance app,
+without a camera or a display, as fast as the CPU allows. Inputs are
+spread over a process pool, one input per task.
+
+Output is JSON lines: one {"type": "frame"} record per processed frame
+and one {"type": "attendance"} record per person the first time they are
+seen in an input. With --attendance-dir, those people are also marked in
+the usual attendance CSV (deduplicated across all inputs).
+
+    python recognize_offline.py footage/*.mp4 snapshots/ -o results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime, timedelta
+
+import cv2
+
+from ann_index import DEFAULT_NPROBE, index_path, load_for
+from attendance_store import AttendanceStore
+from face_detectors import BACKENDS, make_detector
+from face_matcher import GalleryMatcher, DEFAULT_TOLERANCE
+from face_tracker import FaceTracker
+from gallery import open_gallery
+from recognition import FaceRecognizer
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GALLERY_PATH = os.path.join(BASE_DIR, "encodings", "face_gallery.fgal")
+LEGACY_ENCODINGS_PATH = os.path.join(BASE_DIR, "encodings", "face_encodings.pickle")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# -----------------------------
+# Inputs
+# -----------------------------
+def iter_frames(path, frame_step=1):
+    """Yield (frame_index, time_s, bgr) from a video file or an image folder"""
+    if os.path.isdir(path):
+        images = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for index, image_name in enumerate(images):
+            image = cv2.imread(os.path.join(path, image_name))
+            if image is not None:
+                yield index, None, image
+        return
+
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        image = cv2.imread(path)
+        if image is not None:
+            yield 0, None, image
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    index = 0
+    try:
+        while True:
+            # grab() skips decoding frames we are not going to look at
+            if index % frame_step:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            time_s = index / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield index, time_s, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+_worker = {}
+
+
+def _init_worker(options):
+    cv2.setNumThreads(1)
+    gallery = open_gallery(options["gallery"], options.get("legacy_gallery"))
+    _worker["matcher"] = GalleryMatcher.from_gallery(
+        gallery, tolerance=options["tolerance"],
+        index=load_for(gallery, index_path(options["gallery"])), nprobe=options["nprobe"]
+    )
+    _worker["gallery"] = gallery
+    _worker["options"] = options
+
+
+def _process_input(job):
+    """Recognise one input, writing frame records to a part file"""
+    index, path, part_path = job
+    options = _worker["options"]
+    is_video = not os.path.isdir(path) and not path.lower().endswith(IMAGE_EXTENSIONS)
+
+    recognizer = FaceRecognizer(
+        _worker["matcher"],
+        resize_scale=options["scale"],
+        detector=make_detector(options["detector"]),
+        # Only consecutive video frames benefit from tracking
+        tracker=FaceTracker(tolerance=options["tolerance"])
+        if is_video and options["tracking"] else None,
+    )
+
+    first_seen = {}
+    frames = 0
+    error = None
+    start = time.perf_counter()
+    with open(part_path, "w") as out:
+        try:
+            frames = _recognize_frames(recognizer, path, options, out, first_seen)
+        except (IOError, cv2.error) as e:
+            error = str(e)
+
+    return {
+        "index": index,
+        "source": path,
+        "frames": frames,
+        "seconds": time.perf_counter() - start,
+        "first_seen": first_seen,
+        "error": error,
+        "counters": recognizer.metrics.snapshot()["counters"],
+    }
+
+
+def _recognize_frames(recognizer, path, options, out, first_seen):
+    frames = 0
+    for frame_index, time_s, frame in iter_frames(path, options["frame_step"]):
+        detections = recognizer.recognize(frame, time_s)
+        frames += 1
+
+        faces = []
+        for det in detections:
+            faces.append({
+                "box": list(det.box),
+                "name": det.name,
+                "distance": round(float(det.distance), 4)
+                if det.distance != float("inf") else None,
+                "track_id": det.track_id,
+            })
+            if det.known and det.name not in first_seen:
+                first_seen[det.name] = (frame_index, time_s)
+
+        out.write(json.dumps({
+            "type": "frame", "source": path, "frame": frame_index,
+            "time_s": time_s, "faces": faces,
+        }) + "\n")
+    return frames
+
+
+# -----------------------------
+# Main
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recognise faces in recorded footage")
+    parser.add_argument("inputs", nargs="+", help="video files, images or image folders")
+    parser.add_argument("-o", "--output", help="JSON lines output (default: stdout)")
+    parser.add_argument("--gallery", default=GALLERY_PATH)
+    parser.add_argument("--attendance-dir",
+                        help="also mark recognised people in this attendance folder")
+    parser.add_argument("--start-time",
+                        help="ISO time the footage starts at, for attendance rows "
+                             "(default: now)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="parallel inputs (default: one per CPU core)")
+    parser.add_argument("--frame-step", type=int, default=1,
+                        help="only process every Nth video frame")
+    parser.add_argument("--scale", type=float, default=0.5,
+                        help="detection resize scale (RESIZE_SCALE)")
+    parser.add_argument("--detector", default="hog", choices=BACKENDS)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE,
+                        help="ANN lists searched per face, if the gallery has an index")
+    parser.add_argument("--no-tracking", action="store_true",
+                        help="encode every face on every frame")
+    args = parser.parse_args(argv)
+
+    options = {
+        "gallery": args.gallery,
+        "legacy_gallery": LEGACY_ENCODINGS_PATH if args.gallery == GALLERY_PATH else None,
+        "scale": args.scale,
+        "detector": args.detector,
+        "tolerance": args.tolerance,
+        "nprobe": args.nprobe,
+        "tracking": not args.no_tracking,
+        "frame_step": max(1, args.frame_step),
+    }
+    workers = min(args.workers or os.cpu_count() or 1, len(args.inputs))
+
+    # Convert a legacy pickle once here rather than racing in every worker
+    open_gallery(options["gallery"], options["legacy_gallery"]).close()
+
+    part_dir = tempfile.mkdtemp(prefix="recognize_offline_")
+    jobs = [
+        (i, path, os.path.join(part_dir, f"{i}.jsonl"))
+        for i, path in enumerate(args.inputs)
+    ]
+
+    start = time.perf_counter()
+    summaries = []
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(options,)) as pool:
+        for summary in pool.imap_unordered(_process_input, jobs):
+            if summary["error"]:
+                print(f"[WARN] {summary['source']}: {summary['error']}", file=sys.stderr)
+            rate = summary["frames"] / summary["seconds"] if summary["seconds"] else 0.0
+            print(f"[INFO] {summary['source']}: {summary['frames']} frames, "
+                  f"{rate:.1f} frames/s", file=sys.stderr)
+            summaries.append(summary)
+    summaries.sort(key=lambda s: s["index"])
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        # Merge part files in input order so output is deterministic
+        for _, _, part_path in jobs:
+            with open(part_path) as part:
+                for line in part:
+                    out.write(line)
+            os.remove(part_path)
+
+        attendance = []
+        for summary in summaries:
+            for name, (frame_index, time_s) in sorted(
+                    summary["first_seen"].items(), key=lambda item: item[1][0]):
+                record = {
+                    "type": "attendance", "source": summary["source"],
+                    "name": name, "frame": frame_index, "time_s": time_s,
+                }
+                out.write(json.dumps(record) + "\n")
+                attendance.append(record)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        os.rmdir(part_dir)
+
+    if args.attendance_dir:
+        base_time = datetime.fromisoformat(args.start_time) if args.start_time else datetime.now()
+        store = AttendanceStore(args.attendance_dir)
+        marked = 0
+        for record in sorted(attendance, key=lambda r: r["time_s"] or 0.0):
+            when = base_time + timedelta(seconds=record["time_s"] or 0.0)
+            if store.mark(record["name"], when) is not None:
+                marked += 1
+        store.close()
+        print(f"[INFO] Marked {marked} people in {args.attendance_dir}", file=sys.stderr)
+
+    total_frames = sum(s["frames"] for s in summaries)
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] {total_frames} frames from {len(summaries)} inputs in {elapsed:.1f}s "
+          f"({total_frames / elapsed if elapsed else 0.0:.1f} frames/s, "
+          f"{workers} worker(s))", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,8 @@ OPTIONS = {
     'argv_emulation': False,
     'packages': ['numpy', 'cv2', 'tkinter'],
     'includes': ['cv2', 'tkinter'],
+    # Capture-time enrollment (dlib) is off in the bundle; keep it out
+    'excludes': ['enrollment', 'encode_faces', 'face_recognition', 'dlib'],
     'plist': {
         'CFBundleName': 'Face Detection',
         'NSCameraUsageDescription': 'This app needs camera access for face detection',
@@ -0,0 +1,174 @@
+"""Per-stage latency counters for the recognition loop.
+
+Each stage keeps a rolling window of recent durations (for p50/p95/p99)
+plus lifetime counters. All methods are thread-safe: the capture thread,
+the recognition worker and the GUI thread all record into one instance.
+"""
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+PERCENTILES = (50, 95, 99)
+
+
+class StageStats:
+    __slots__ = ("window", "count", "total")
+
+    def __init__(self, window):
+        self.window = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+
+class StageMetrics:
+    def __init__(self, window=512):
+        self.window = window
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.started = time.monotonic()
+        self._rate_marks = {}
+
+    def record(self, name, seconds):
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats(self.window)
+            stats.window.append(seconds)
+            stats.count += 1
+            stats.total += seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def rate(self, name):
+        """Events per second of counter `name` since the previous call"""
+        now = time.monotonic()
+        with self.lock:
+            value = self.counters.get(name, 0)
+            last_time, last_value = self._rate_marks.get(name, (self.started, 0))
+            self._rate_marks[name] = (now, value)
+        elapsed = now - last_time
+        return (value - last_value) / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        """{stage: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}} plus counters"""
+        with self.lock:
+            items = [(name, list(s.window), s.count, s.total)
+                     for name, s in self.stages.items()]
+            counters = dict(self.counters)
+
+        stages = {}
+        for name, window, count, total in items:
+            entry = {"count": count, "mean_ms": 1000.0 * total / count if count else 0.0}
+            if window:
+                values = np.percentile(np.asarray(window), PERCENTILES) * 1000.0
+                for p, value in zip(PERCENTILES, values):
+                    entry[f"p{p}_ms"] = float(value)
+            stages[name] = entry
+        return {"stages": stages, "counters": counters}
+
+    def summary(self, names):
+        """Compact 'name p50/p95 ms' readout for the status bar"""
+        snap = self.snapshot()["stages"]
+        parts = []
+        for name in names:
+            entry = snap.get(name)
+            if entry and "p50_ms" in entry:
+                parts.append(f"{name} {entry['p50_ms']:.0f}/{entry['p95_ms']:.0f}ms")
+        return " | ".join(parts)
+
+
+# -----------------------------
+# Snapshot files
+# -----------------------------
+def write_csv(path, snapshot, timestamp):
+    write_header = not os.path.exists(path)
+    with open(path, "a") as f:
+        if write_header:
+            f.write("timestamp,stage,count,mean_ms,p50_ms,p95_ms,p99_ms\n")
+        for name, entry in sorted(snapshot["stages"].items()):
+            f.write(
+                f"{timestamp:.3f},{name},{entry['count']},{entry['mean_ms']:.3f},"
+                f"{entry.get('p50_ms', 0):.3f},{entry.get('p95_ms', 0):.3f},"
+                f"{entry.get('p99_ms', 0):.3f}\n"
+            )
+        for name, value in sorted(snapshot["counters"].items()):
+            f.write(f"{timestamp:.3f},{name},{value},,,,\n")
+
+
+def format_prometheus(snapshot):
+    """Prometheus text exposition of a StageMetrics snapshot"""
+    lines = [
+        "# TYPE face_attendance_stage_seconds summary",
+    ]
+    for name, entry in sorted(snapshot["stages"].items()):
+        for p in PERCENTILES:
+            key = f"p{p}_ms"
+            if key in entry:
+                lines.append(
+                    f'face_attendance_stage_seconds{{stage="{name}",quantile="0.{p}"}} '
+                    f"{entry[key] / 1000.0:.6f}"
+                )
+        lines.append(f'face_attendance_stage_seconds_count{{stage="{name}"}} {entry["count"]}')
+        lines.append(
+            f'face_attendance_stage_seconds_sum{{stage="{name}"}} '
+            f"{entry['mean_ms'] * entry['count'] / 1000.0:.6f}"
+        )
+    lines.append("# TYPE face_attendance_events_total counter")
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f'face_attendance_events_total{{event="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, snapshot, timestamp):
+    text = format_prometheus(snapshot)
+
+    # Scrapers read the file whole, so swap it in atomically
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class MetricsFileWriter(threading.Thread):
+    """Writes a snapshot every `interval` seconds as CSV rows or Prometheus text"""
+
+    def __init__(self, metrics, path, fmt="csv", interval=10.0):
+        super().__init__(name="MetricsFileWriter", daemon=True)
+        if fmt not in ("csv", "prometheus"):
+            raise ValueError(f"Unknown metrics format {fmt!r}")
+        self.metrics = metrics
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def write_once(self):
+        writer = write_csv if self.fmt == "csv" else write_prometheus
+        try:
+            writer(self.path, self.metrics.snapshot(), time.time())
+        except OSError as e:
+            print(f"[WARN] Could not write metrics to {self.path}: {e}")
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write_once()
+        self.write_once()
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from attendance_store import AttendanceStore, attendance_path, read_rows
+
+
+def test_back_dated_rows_alternating_days_mark_once(tmp_path):
+    # A long flush interval keeps the rows pending while dates alternate
+    store = AttendanceStore(str(tmp_path), flush_interval=60.0)
+    day1 = datetime(2026, 3, 1, 9, 0, 0)
+    day2 = datetime(2026, 3, 2, 9, 0, 0)
+    try:
+        assert store.mark("alice", day1) is not None
+        assert store.mark("bob", day2) is not None
+        assert store.mark("alice", day1.replace(minute=5)) is None
+        assert store.mark("bob", day2.replace(minute=5)) is None
+        assert store.is_marked("bob")
+    finally:
+        store.close()
+    assert [row[0] for row in read_rows(attendance_path(str(tmp_path), "2026-03-01"))] == ["alice"]
+    assert [row[0] for row in read_rows(attendance_path(str(tmp_path), "2026-03-02"))] == ["bob"]
+
+
+def test_restart_keeps_todays_marks(tmp_path):
+    store = AttendanceStore(str(tmp_path), flush_interval=0.01)
+    store.mark("alice")
+    store.close()
+    store = AttendanceStore(str(tmp_path), flush_interval=0.01)
+    try:
+        assert store.is_marked("alice")
+        assert store.mark("alice") is None
+    finally:
+        store.close()
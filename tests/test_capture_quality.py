@@ -0,0 +1,34 @@
+import numpy as np
+
+from capture_quality import SampleSelector
+
+
+def _offer_windows(selector, seed=0):
+    rng = np.random.default_rng(seed)
+    while not (selector.done or selector.exhausted):
+        frame = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+        selector.offer(frame, frame[..., 0].copy(), (50, 50, 100, 100))
+        selector.take()
+
+
+def test_unreachable_threshold_falls_back_to_best_seen():
+    # A 100 px face in a 320 px frame can never reach min_size=0.9
+    selector = SampleSelector(target=3, min_size=0.9, max_evaluated=20)
+    _offer_windows(selector)
+    assert selector.exhausted
+    assert selector.kept == []
+    assert selector.last_rejection.startswith("small: size 0.31 < 0.90")
+
+    added = selector.fallback()
+    assert len(added) == 3
+    assert selector.done and not selector.exhausted
+    assert selector.below_threshold == 3
+    assert "3 below thresholds" in selector.summary()
+
+
+def test_met_thresholds_finish_before_the_fallback():
+    selector = SampleSelector(target=3, min_sharpness=0.0, min_size=0.0,
+                              min_symmetry=0.0, min_hash_distance=0, max_evaluated=20)
+    _offer_windows(selector)
+    assert selector.done and selector.evaluated == 3
+    assert selector.fallback() == []
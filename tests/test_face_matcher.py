@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex
+from face_matcher import GalleryMatcher
+from gallery import Gallery, intern_names
+from quantization import evaluate, quantize
+
+
+def face_distance(face_encodings, face_to_compare):
+    """face_recognition.face_distance, which the matcher replaced"""
+    if len(face_encodings) == 0:
+        return np.empty(0)
+    return np.linalg.norm(face_encodings - face_to_compare, axis=1)
+
+
+def clustered_gallery(people=50, per_person=5, dim=128, seed=0):
+    """dlib-like encodings: one centre per person, samples spread around it"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0, 0.1, (people, dim))
+    labels = np.repeat(np.arange(people), per_person)
+    encodings = centres[labels] + rng.normal(0, 0.02, (len(labels), dim))
+    names = [f"person_{label}" for label in labels]
+    return encodings, names
+
+
+def test_distances_match_face_distance():
+    encodings, names = clustered_gallery()
+    matcher = GalleryMatcher.from_encodings(encodings, names)
+    probes = encodings[::7] + 0.01
+    d = matcher.distances(probes)
+    for probe, row in zip(probes, d):
+        np.testing.assert_allclose(row, face_distance(encodings, probe), atol=1e-5)
+
+
+def test_match_agrees_with_compare_faces_loop():
+    encodings, names = clustered_gallery()
+    matcher = GalleryMatcher.from_encodings(encodings, names)
+    rng = np.random.default_rng(1)
+    # Half the probes are enrolled people, half are strangers
+    probes = np.concatenate([encodings[::10] + rng.normal(0, 0.02, (25, 128)),
+                             rng.normal(0, 0.1, (25, 128))])
+    for probe, result in zip(probes, matcher.match(probes)):
+        distances = face_distance(encodings, probe)
+        best = int(distances.argmin())
+        assert result.distance == pytest.approx(distances[best], abs=1e-5)
+        expected = names[best] if distances[best] <= matcher.tolerance else "Unknown"
+        assert result.name == expected
+        others = distances[np.array(names) != names[best]]
+        assert result.margin == pytest.approx(others.min() - distances[best], abs=1e-5)
+
+
+def test_empty_gallery_matches_nobody():
+    matcher = GalleryMatcher.from_encodings([], [])
+    (result,) = matcher.match(np.zeros((1, 128)))
+    assert result.name == "Unknown" and result.label == -1
+
+
+@pytest.mark.parametrize("precision, atol", [("float16", 2e-3), ("int8", 2e-2)])
+def test_reduced_precision_stays_close(precision, atol):
+    encodings, names = clustered_gallery()
+    labels, label_names = intern_names(names)
+    stored, scales = quantize(encodings, precision)
+    matcher = GalleryMatcher(stored, labels, label_names, scales=scales)
+    assert matcher.embeddings.dtype == stored.dtype
+
+    probes = encodings[::5]
+    exact = np.stack([face_distance(encodings, p) for p in probes])
+    np.testing.assert_allclose(matcher.distances(probes), exact, atol=atol)
+
+    # The guardrail encode_faces.py applies before keeping a precision
+    report = evaluate(encodings, labels, matcher, matcher.tolerance)
+    assert report["queries"] == len(encodings)
+    assert report["top1_changed"] == 0
+    assert report["decisions_changed"] == 0
+
+
+def test_ivf_index_recall_floor():
+    encodings, names = clustered_gallery(people=400, per_person=5)
+    labels, label_names = intern_names(names)
+    gallery = Gallery(encodings.astype(np.float32), labels, label_names)
+    exact = GalleryMatcher.from_gallery(gallery)
+    index = IVFIndex.build(gallery.embeddings, gallery.build_id)
+    assert index.covers(gallery)
+    ann = GalleryMatcher.from_gallery(gallery, index=index, nprobe=8)
+
+    rng = np.random.default_rng(2)
+    probes = encodings[::4] + rng.normal(0, 0.02, (500, 128))
+    expected = [r.name for r in exact.match(probes)]
+    found = [r.name for r in ann.match(probes)]
+    recall = np.mean([a == b for a, b in zip(expected, found)])
+    assert recall >= 0.95
@@ -0,0 +1,83 @@
+import pytest
+
+from face_matcher import MatchResult
+from face_tracker import FaceTracker
+
+
+BOX = (100, 300, 300, 100)
+
+
+def tracked(tracker, distance, timestamp=0.0, label=0):
+    (track,) = tracker.update([BOX], timestamp)
+    assert tracker.needs_encoding(track, timestamp)
+    name = "alice" if label >= 0 else "Unknown"
+    tracker.set_identity(track, MatchResult(name, label, distance, 0.2), timestamp)
+    return track
+
+
+def encodes(tracker, track, passes, interval=0.1, start=0.0):
+    """How many of `passes` stationary passes would re-encode the face"""
+    count = 0
+    for i in range(1, passes + 1):
+        timestamp = start + i * interval
+        (track,) = tracker.update([BOX], timestamp)
+        if tracker.needs_encoding(track, timestamp):
+            tracker.set_identity(track, MatchResult("alice", 0, 0.3, 0.2), timestamp)
+            count += 1
+    return count
+
+
+@pytest.mark.parametrize("distance", [0.3, 0.46, 0.55])
+def test_accepted_match_is_cached_for_a_still_face(distance):
+    tracker = FaceTracker(tolerance=0.6)
+    track = tracked(tracker, distance)
+    assert encodes(tracker, track, 50) == 0
+
+
+def test_initial_confidence_is_calibrated_to_the_tolerance():
+    tracker = FaceTracker(tolerance=0.6, confidence_margin=0.15)
+    assert tracker.initial_confidence(0.3) == 1.0
+    assert tracker.initial_confidence(0.45) == pytest.approx(1.0)
+    assert tracker.initial_confidence(0.6) == pytest.approx(0.5)
+    assert tracker.initial_confidence(0.52) < tracker.initial_confidence(0.47)
+
+
+def test_confidence_decays_to_a_re_encode():
+    tracker = FaceTracker(tolerance=0.6, confidence_half_life=10.0, min_confidence=0.25)
+    track = tracked(tracker, 0.3)
+    # 1.0 -> 0.25 takes two half-lives
+    assert not tracker.needs_encoding(track, 19.0)
+    assert tracker.needs_encoding(track, 21.0)
+
+
+def test_marginal_match_is_rechecked_sooner():
+    tracker = FaceTracker(tolerance=0.6, confidence_half_life=10.0, min_confidence=0.25)
+    strong = tracked(tracker, 0.3)
+    tracker.clear()
+    weak = tracked(tracker, 0.59)
+    assert tracker.needs_encoding(weak, 15.0)
+    assert not tracker.needs_encoding(strong, 15.0)
+
+
+def test_unknown_face_is_retried_after_unknown_retry():
+    tracker = FaceTracker(unknown_retry=1.0)
+    track = tracked(tracker, 0.8, label=-1)
+    assert not tracker.needs_encoding(track, 0.5)
+    assert tracker.needs_encoding(track, 1.0)
+
+
+def test_drift_forces_a_re_encode():
+    tracker = FaceTracker(drift_threshold=0.35)
+    track = tracked(tracker, 0.3)
+    moved = (100, 380, 300, 180)    # centre moved 0.4 box widths
+    (track,) = tracker.update([moved], 0.1)
+    assert tracker.needs_encoding(track, 0.1)
+
+
+def test_association_keeps_the_track_id_of_a_moving_face():
+    tracker = FaceTracker()
+    (first,) = tracker.update([BOX], 0.0)
+    (second,) = tracker.update([(110, 320, 310, 120)], 0.1)
+    assert second.track_id == first.track_id
+    far = tracker.update([(100, 900, 300, 700)], 0.2)
+    assert [t.track_id for t in far] != [first.track_id]
@@ -0,0 +1,81 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from frame_ring import _FRAME_ID, _SEQ, FrameRing
+
+
+SHAPE = (4, 6, 3)
+
+
+@pytest.fixture
+def make_ring():
+    rings = []
+
+    def make(slots=3, lossless=False):
+        ring = FrameRing(SHAPE, slots, multiprocessing.Condition(), create=True,
+                         lossless=lossless)
+        rings.append(ring)
+        return ring
+
+    yield make
+    for ring in rings:
+        ring.close(unlink=True)
+
+
+def _frame(value):
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+def test_reader_takes_newest_and_drops_the_rest(make_ring):
+    ring = make_ring()
+    for i in range(1, 4):
+        ring.write(_frame(i), float(i))
+    slot, frame_id, timestamp, view = ring.claim(timeout=0)
+    assert (frame_id, timestamp) == (3, 3.0)
+    assert (view == 3).all()
+    ring.release(slot)
+    assert ring.counters() == {"frames_written": 3, "frames_dropped": 2,
+                               "frames_processed": 1}
+
+
+def test_writer_overwrites_oldest_unclaimed_frame(make_ring):
+    ring = make_ring(slots=2)
+    ring.write(_frame(1), 1.0)
+    ring.write(_frame(2), 2.0)
+    ring.write(_frame(3), 3.0)
+    assert ring.counters()["frames_dropped"] == 1
+    ids = sorted(int(i) for i in ring.meta[:, _FRAME_ID])
+    assert ids == [2, 3]
+
+
+def test_lossless_ring_keeps_order_and_waits(make_ring):
+    ring = make_ring(slots=2, lossless=True)
+    ring.write(_frame(1), 1.0)
+    ring.write(_frame(2), 2.0)
+    # Full: the writer gives up only because should_stop says so
+    assert ring.write(_frame(3), 3.0, should_stop=lambda: True, timeout=0.01) is None
+    ring.mark_ended()
+    seen = []
+    while not ring.drained:
+        slot, frame_id, _, view = ring.claim(timeout=0)
+        seen.append((frame_id, int(view[0, 0, 0])))
+        ring.release(slot)
+    assert seen == [(1, 1), (2, 2)]
+    assert ring.counters()["frames_dropped"] == 0
+
+
+def test_latest_copy_skips_torn_reads(make_ring):
+    ring = make_ring()
+    out = np.zeros(SHAPE, dtype=np.uint8)
+    assert ring.latest_copy(out) is None
+    ring.write(_frame(7), 7.0)
+    assert ring.latest_copy(out) == (1, 7.0)
+    assert (out == 7).all()
+    assert ring.latest_copy(out, after_id=1) is None
+
+    # An odd sequence number means the writer is mid-copy
+    slot = int(np.flatnonzero(ring.meta[:, _FRAME_ID] == 1)[0])
+    ring.meta[slot, _SEQ] += 1
+    assert ring.latest_copy(out) is None
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from face_matcher import GalleryMatcher
+from gallery import (Gallery, GalleryFormatError, from_encodings, intern_names,
+                     load_gallery, save_gallery)
+from quantization import quantize
+
+
+NAMES = ["alice", "bob", "alice", "chloé", "bob"]
+
+
+def _encodings(n, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.1, (n, 128)).astype(np.float32)
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+@pytest.mark.parametrize("precision", ["float32", "float16", "int8"])
+def test_round_trip(tmp_path, precision, use_mmap):
+    labels, label_names = intern_names(NAMES)
+    stored, scales = quantize(_encodings(len(NAMES)), precision)
+    original = Gallery(stored, labels, label_names, scales=scales)
+    path = str(tmp_path / "face_gallery.fgal")
+    save_gallery(path, original)
+
+    loaded = load_gallery(path, use_mmap=use_mmap)
+    try:
+        assert loaded.precision == precision
+        assert loaded.build_id == original.build_id
+        assert loaded.label_names == ["alice", "bob", "chloé"]
+        assert loaded.names == NAMES
+        np.testing.assert_array_equal(loaded.labels, labels)
+        np.testing.assert_array_equal(loaded.embeddings, stored)
+        if scales is None:
+            assert loaded.scales is None
+        else:
+            np.testing.assert_array_equal(loaded.scales, scales)
+        if use_mmap:
+            # Rows start 64-byte aligned, so the mapped view is used without a copy
+            assert loaded.embeddings.ctypes.data % 64 == 0
+    finally:
+        loaded.close()
+
+
+def test_empty_gallery_round_trip(tmp_path):
+    path = str(tmp_path / "face_gallery.fgal")
+    save_gallery(path, from_encodings([], []))
+    loaded = load_gallery(path)
+    assert len(loaded) == 0 and loaded.dim == 128
+    loaded.close()
+
+
+def test_appended_gallery_reloads_as_prefix(tmp_path):
+    path = str(tmp_path / "face_gallery.fgal")
+    first = from_encodings(_encodings(5), NAMES)
+    save_gallery(path, first)
+    before = load_gallery(path)
+    matcher = GalleryMatcher.from_gallery(before)
+
+    # What an incremental encode_faces.py run writes: same build id, rows added
+    names = NAMES + ["dan", "alice"]
+    labels, label_names = intern_names(names)
+    embeddings = np.concatenate([first.embeddings, _encodings(2, seed=1)])
+    save_gallery(path, Gallery(embeddings, labels, label_names, build_id=first.build_id))
+    after = load_gallery(path)
+
+    assert matcher.is_prefix_of(after)
+    reloaded = GalleryMatcher.from_gallery(after, previous=matcher)
+    fresh = GalleryMatcher.from_gallery(after)
+    np.testing.assert_allclose(reloaded.sq_norms, fresh.sq_norms, rtol=1e-6)
+    assert [r.name for r in reloaded.match(embeddings)] == names
+
+    # A rebuild gets a new build id and must not be treated as a prefix
+    save_gallery(path, Gallery(embeddings, labels, label_names))
+    rebuilt = load_gallery(path)
+    assert not matcher.is_prefix_of(rebuilt)
+    for gallery in (before, after, rebuilt):
+        gallery.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "face_gallery.fgal"
+    path.write_bytes(b"not a gallery" * 10)
+    with pytest.raises(GalleryFormatError):
+        load_gallery(str(path))
+
+
+def test_int8_needs_scales(tmp_path):
+    stored, _ = quantize(_encodings(2), "int8")
+    with pytest.raises(GalleryFormatError):
+        save_gallery(str(tmp_path / "g.fgal"), Gallery(stored, [0, 1], ["a", "b"]))
@@ -0,0 +1,272 @@
+"""Capture and recognition threads for the attendance app.
+
+The capture thread only ever keeps the newest frame; a recognition
+thread picks up whatever is newest when it becomes free. The GUI thread
+reads both without waiting on either, so display runs at camera rate no
+matter how long a recognition pass takes.
+
+Each camera has its own capture thread; a RecognitionPool shares a fixed
+number of recognition threads between all cameras (one camera is just
+the simplest case), round-robin.
+"""
+import time
+import threading
+
+from frame_pyramid import FramePyramid, fit_size
+from stage_metrics import StageMetrics
+
+
+class FrameGrabber(threading.Thread):
+    """Reads a capture device continuously, keeping only the latest frame.
+
+    Frames are published as FramePyramids; with `display_size` set, the
+    display-resolution copy is made here rather than on the GUI thread,
+    as large as fits in `display_size` without stretching the frame.
+    With `lockstep`, the next frame is only read once the recognition
+    worker has taken the previous one, so a replay is recognised frame
+    for frame the same way every run. `on_frame()` is called after each
+    new frame is published.
+    """
+
+    def __init__(self, cap, metrics=None, display_size=None, lockstep=False,
+                 on_frame=None):
+        super().__init__(name="FrameGrabber", daemon=True)
+        self.cap = cap
+        self.display_size = display_size
+        self._fitted = None     # (frame shape, display size fitted to it)
+        self.lockstep = lockstep
+        self.on_frame = on_frame
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.cond = threading.Condition()
+        self.frame = None
+        self.frame_id = 0
+        self.timestamp = 0.0
+        self.dropped = 0
+        self.ended = False
+        self._consumed_id = 0
+        self._worker_id = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.lockstep:
+                with self.cond:
+                    self.cond.wait_for(
+                        lambda: self._worker_id >= self.frame_id
+                        or self._stop_event.is_set()
+                    )
+            with self.metrics.stage("capture"):
+                ret, frame = self.cap.read()
+            if not ret:
+                with self.cond:
+                    self.ended = True
+                    self.cond.notify_all()
+                if self.on_frame is not None:
+                    self.on_frame()
+                return
+
+            with self.metrics.stage("pyramid"):
+                frame = FramePyramid(frame, self._display_size_for(frame.shape))
+
+            with self.cond:
+                # Nobody took the previous frame - it is stale now
+                if self.frame_id > self._consumed_id:
+                    self.dropped += 1
+                    self.metrics.count("frames_dropped")
+                self.frame = frame
+                self.frame_id += 1
+                # Sources that know their capture time (replays) report it
+                if hasattr(self.cap, "timestamp"):
+                    self.timestamp = self.cap.timestamp
+                else:
+                    self.timestamp = time.monotonic()
+                self.cond.notify_all()
+            self.metrics.count("frames_captured")
+            if self.on_frame is not None:
+                self.on_frame()
+
+    def _display_size_for(self, shape):
+        if self.display_size is None:
+            return None
+        if self._fitted is None or self._fitted[0] != shape:
+            self._fitted = (shape, fit_size(shape, self.display_size))
+        return self._fitted[1]
+
+    def latest(self):
+        """(frame_id, pyramid, timestamp) of the newest frame, non-blocking"""
+        with self.cond:
+            self._consumed_id = self.frame_id
+            return self.frame_id, self.frame, self.timestamp
+
+    def wait_newer(self, frame_id, timeout=0.5):
+        """Block until a frame newer than `frame_id` exists; None on timeout/end"""
+        with self.cond:
+            self.cond.wait_for(
+                lambda: self.frame_id > frame_id or self.ended
+                or self._stop_event.is_set(),
+                timeout,
+            )
+            if self.frame_id <= frame_id:
+                return None
+            self._worker_id = self.frame_id
+            self.cond.notify_all()
+            return self.frame_id, self.frame, self.timestamp
+
+    def stop(self):
+        self._stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+
+
+class CameraFeed:
+    """One camera's grabber and recogniser plus its share of a RecognitionPool.
+
+    `max_fps` caps how often this camera is recognised (None: as often as
+    a worker is free). The recogniser is only ever used by one pool
+    thread at a time, so its tracker and motion gate see frames in order.
+    """
+
+    def __init__(self, name, grabber, recognizer, max_fps=None):
+        self.name = name
+        self.grabber = grabber
+        self.recognizer = recognizer
+        self.max_fps = max_fps
+        self.lock = threading.Lock()
+        self.result_frame_id = 0
+        self.detections = []
+        self.passes = 0
+        self.last_duration = 0.0
+        # Scheduling state, guarded by the pool's condition
+        self.busy = False
+        self.taken_id = 0
+        self.last_start = float("-inf")
+        self._rate_mark = (time.monotonic(), 0, 0)
+
+    @property
+    def pending(self):
+        """Frames captured since recognition last took one from this camera"""
+        return max(0, self.grabber.frame_id - self.taken_id)
+
+    def results(self):
+        with self.lock:
+            return self.result_frame_id, self.detections
+
+    def rates(self):
+        """(capture fps, recognition passes/s) since the previous call"""
+        now = time.monotonic()
+        frames, passes = self.grabber.frame_id, self.passes
+        last_time, last_frames, last_passes = self._rate_mark
+        self._rate_mark = (now, frames, passes)
+        elapsed = now - last_time
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (frames - last_frames) / elapsed, (passes - last_passes) / elapsed
+
+
+class RecognitionPool:
+    """`workers` recognition threads shared by several CameraFeeds.
+
+    A free worker takes the next camera, in round-robin order, that has a
+    new frame, is not already being recognised and is not over its
+    max_fps, so one busy camera cannot starve the others. Results are
+    published per feed; `on_result(feed, frame_id, detections)` is called
+    from the worker thread. With a `scheduler`
+    (adaptive_scheduler.AdaptiveScheduler), each feed's scale and max_fps
+    are re-decided after every pass.
+    """
+
+    def __init__(self, feeds, workers=1, on_result=None, scheduler=None):
+        self.feeds = list(feeds)
+        self.on_result = on_result
+        self.scheduler = scheduler
+        self.cond = threading.Condition()
+        self._next = 0
+        self._stop_event = threading.Event()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"RecognitionPool-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for feed in self.feeds:
+            feed.grabber.on_frame = self.wake
+        if scheduler is not None:
+            scheduler.attach(self.feeds, len(self.threads))
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+    def _pick(self, now):
+        """(feed, None) to recognise next, or (None, seconds until a capped
+        camera is due); caller holds the condition"""
+        n = len(self.feeds)
+        due_in = None
+        for k in range(n):
+            index = (self._next + k) % n
+            feed = self.feeds[index]
+            if feed.busy or feed.grabber.frame_id <= feed.taken_id:
+                continue
+            if feed.max_fps:
+                due = feed.last_start + 1.0 / feed.max_fps
+                if now < due:
+                    due_in = due - now if due_in is None else min(due_in, due - now)
+                    continue
+            self._next = (index + 1) % n
+            return feed, None
+        return None, due_in
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self.cond:
+                feed, due_in = self._pick(time.monotonic())
+                if feed is None:
+                    if all(f.grabber.ended for f in self.feeds):
+                        return
+                    self.cond.wait(due_in if due_in is not None else 0.5)
+                    continue
+                feed.busy = True
+                feed.last_start = time.monotonic()
+
+            try:
+                latest = feed.grabber.wait_newer(feed.taken_id, timeout=0)
+                if latest is not None:
+                    self._recognize(feed, *latest)
+            finally:
+                with self.cond:
+                    feed.busy = False
+                    self.cond.notify_all()
+
+    def _recognize(self, feed, frame_id, frame, timestamp):
+        feed.taken_id = frame_id
+        recognizer = feed.recognizer
+        start = time.perf_counter()
+        detections = recognizer.recognize(frame, timestamp)
+        duration = time.perf_counter() - start
+
+        with feed.lock:
+            feed.result_frame_id = frame_id
+            feed.detections = detections
+            feed.passes += 1
+            feed.last_duration = duration
+        recognizer.metrics.record("recognize", duration)
+        recognizer.metrics.count("recognition_passes")
+        if self.scheduler is not None:
+            self.scheduler.observe(feed, duration, detections)
+
+        if self.on_result is not None:
+            self.on_result(feed, frame_id, detections)
+
+    @property
+    def ended(self):
+        return all(feed.grabber.ended for feed in self.feeds)
+
+    def stop(self):
+        self._stop_event.set()
+        self.wake()
+
+    def join(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)